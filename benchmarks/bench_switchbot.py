@@ -0,0 +1,263 @@
+"""
+Benchmark of the Switchbot operations against simulated bots (see switchbotpy.switchbot_sim).
+
+Reports the latency percentiles of press, get_settings, set_timers, get_timers (of the
+timers set before) and Scanner.scan, broken down into the phases adapter start, connect, subscribe, write and
+notification wait, as well as the throughput of a fleet at different concurrency levels.
+Run it as a module from the root of the repository (to import switchbotpy from there):
+
+    python -m benchmarks.bench_switchbot --latency-ms 30 --output base.json
+    python -m benchmarks.bench_switchbot --latency-ms 30 --session --compare base.json
+"""
+
+import argparse
+import json
+import logging
+import platform
+import statistics
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+import pygatt
+
+from switchbotpy import Bot, Fleet, Scanner, StandardTimer, Action
+from switchbotpy.switchbot_sim import SimulatedSwitchbot, SimulatedTransport
+from switchbotpy.switchbot_transport import Connection, Transport
+
+PHASES = ['start', 'connect', 'subscribe', 'write', 'notify']
+
+
+class PhaseRecorder(object):
+    """accumulates the time spent in each phase of the current operation"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.phases = {phase: 0.0 for phase in PHASES}
+        self.write_end = None
+
+    def add(self, phase: str, duration: float):
+        with self._lock:
+            self.phases[phase] += duration
+
+    def reset(self) -> Dict[str, float]:
+        with self._lock:
+            phases = self.phases
+            self.phases = {phase: 0.0 for phase in PHASES}
+            return phases
+
+
+class TimingConnection(Connection):
+    """measures subscribe, write and the wait for the notification of the wrapped connection"""
+
+    def __init__(self, connection: Connection, recorder: PhaseRecorder):
+        self.connection = connection
+        self.recorder = recorder
+
+    def subscribe(self, uuid, callback=None, indication=False, wait_for_response=True):
+        def timed_callback(handle, value):
+            if self.recorder.write_end is not None:
+                self.recorder.add('notify', time.perf_counter() - self.recorder.write_end)
+                self.recorder.write_end = None
+            callback(handle, value)
+
+        t_start = time.perf_counter()
+        self.connection.subscribe(uuid, callback=timed_callback if callback else None,
+                                  indication=indication, wait_for_response=wait_for_response)
+        self.recorder.add('subscribe', time.perf_counter() - t_start)
+
+    def char_write_handle(self, handle, value, wait_for_response=True, timeout=30):
+        t_start = time.perf_counter()
+        self.connection.char_write_handle(handle=handle, value=value,
+                                          wait_for_response=wait_for_response, timeout=timeout)
+        self.recorder.write_end = time.perf_counter()
+        self.recorder.add('write', self.recorder.write_end - t_start)
+
+    def disconnect(self):
+        self.connection.disconnect()
+
+
+class TimingTransport(Transport):
+    """measures adapter start and connect of the wrapped transport"""
+
+    def __init__(self, transport: Transport, recorder: PhaseRecorder):
+        self.transport = transport
+        self.recorder = recorder
+
+    def start(self):
+        t_start = time.perf_counter()
+        self.transport.start()
+        self.recorder.add('start', time.perf_counter() - t_start)
+
+    def stop(self):
+        self.transport.stop()
+
+    def scan(self, timeout=10):
+        return self.transport.scan(timeout=timeout)
+
+    def connect(self, address, timeout=5, address_type=pygatt.BLEAddressType.public):
+        t_start = time.perf_counter()
+        connection = self.transport.connect(address, timeout=timeout, address_type=address_type)
+        self.recorder.add('connect', time.perf_counter() - t_start)
+        return TimingConnection(connection, self.recorder)
+
+    def discover_characteristics(self, device):
+        t_start = time.perf_counter()
+        characteristics = self.transport.discover_characteristics(device.connection)
+        self.recorder.add('subscribe', time.perf_counter() - t_start)
+        return characteristics
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """p50, p90, p99, mean and max of the samples (in ms)"""
+    ordered = sorted(samples)
+    def pct(p):
+        return 1000 * ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+    return {'p50': pct(50), 'p90': pct(90), 'p99': pct(99),
+            'mean': 1000 * statistics.mean(ordered), 'max': 1000 * ordered[-1]}
+
+
+def simulated_bot(mac: str, config) -> SimulatedSwitchbot:
+    return SimulatedSwitchbot(mac=mac, latency_sec=config.latency_ms / 1000,
+                              connect_latency_sec=config.connect_latency_ms / 1000,
+                              busy_probability=config.busy_probability, seed=config.seed)
+
+
+def bench_operation(name: str, operation: Callable[[], Any], recorder: PhaseRecorder,
+                    iterations: int) -> Dict[str, Any]:
+    totals = []
+    phases = {phase: [] for phase in PHASES}
+    errors = 0
+    recorder.reset()
+    for _ in range(iterations):
+        t_start = time.perf_counter()
+        try:
+            operation()
+        except Exception: # pylint: disable=broad-except
+            errors += 1
+        totals.append(time.perf_counter() - t_start)
+        for phase, duration in recorder.reset().items():
+            phases[phase].append(duration)
+
+    result = {'total': percentiles(totals),
+              'phases': {phase: percentiles(samples) for phase, samples in phases.items()},
+              'errors': errors}
+    print("  %-12s p50 %8.2f ms  p90 %8.2f ms  p99 %8.2f ms  (%s)" % (
+        name, result['total']['p50'], result['total']['p90'], result['total']['p99'],
+        ", ".join("%s %.2f" % (phase, result['phases'][phase]['p50']) for phase in PHASES)))
+    return result
+
+
+def bench_operations(config) -> Dict[str, Any]:
+    print("operations (%d iterations, session: %s):" % (config.iterations, config.session))
+    sim = simulated_bot("AA:BB:CC:DD:EE:00", config)
+    recorder = PhaseRecorder()
+    transport = SimulatedTransport([sim], start_latency_sec=config.start_latency_ms / 1000)
+    bot = Bot(bot_id=0, mac=sim.mac, name="bench", adapter=TimingTransport(transport, recorder))
+
+    timers = [StandardTimer(action=Action.press, enabled=True, weekdays=[1, 3, 5],
+                            hour=7, min=i) for i in range(3)]
+    # get_timers reads the timers written by set_timers (on an empty bot it stops after one read)
+    operations = {'press': bot.press,
+                  'get_settings': bot.get_settings,
+                  'set_timers': lambda: bot.set_timers(timers),
+                  'get_timers': bot.get_timers}
+
+    results = {}
+    if config.session:
+        bot.open()
+    try:
+        for name, operation in operations.items():
+            results[name] = bench_operation(name, operation, recorder, config.iterations)
+    finally:
+        bot.close()
+
+    sims = [simulated_bot("AA:BB:CC:DD:EF:%02X" % i, config) for i in range(config.bots)]
+    scanner = Scanner(adapter=TimingTransport(SimulatedTransport(sims), recorder))
+    results['scan'] = bench_operation('scan', scanner.scan, recorder,
+                                      max(1, config.iterations // 10))
+    return results
+
+
+def bench_fleet(config) -> Dict[str, Any]:
+    print("fleet press (%d bots):" % config.bots)
+    sims = [simulated_bot("AA:BB:CC:DD:F0:%02X" % i, config) for i in range(config.bots)]
+    results = {}
+    for concurrency in config.concurrency:
+        fleet = Fleet([(sim.mac, None) for sim in sims], max_workers=concurrency,
+                      per_adapter_limit=concurrency,
+                      adapter_factory=lambda hci_device: SimulatedTransport(sims))
+        t_start = time.perf_counter()
+        fleet_results = list(fleet.press())
+        duration = time.perf_counter() - t_start
+        ok = sum(1 for result in fleet_results if result.ok)
+        results[str(concurrency)] = {'duration_sec': duration, 'ok': ok,
+                                     'errors': len(fleet_results) - ok,
+                                     'ops_per_sec': len(fleet_results) / duration}
+        print("  concurrency %3d: %8.2f ops/s (%d errors)" % (
+            concurrency, results[str(concurrency)]['ops_per_sec'],
+            results[str(concurrency)]['errors']))
+    return results
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any]):
+    """print the change of every metric relative to the baseline run"""
+    def change(new, old):
+        return "%+7.1f%%" % (100 * (new - old) / old) if old else "    n/a"
+
+    print("compared to baseline (latency: lower is better, throughput: higher is better):")
+    for name, result in results['operations'].items():
+        old = baseline.get('operations', {}).get(name)
+        if old is None:
+            continue
+        print("  %-12s p50 %s  p90 %s  p99 %s" % (
+            name, *(change(result['total'][p], old['total'][p]) for p in ('p50', 'p90', 'p99'))))
+    for concurrency, result in results['fleet'].items():
+        old = baseline.get('fleet', {}).get(concurrency)
+        if old is None:
+            continue
+        print("  concurrency %3s: %s" % (concurrency,
+                                         change(result['ops_per_sec'], old['ops_per_sec'])))
+
+
+def main(config):
+    """run the benchmark"""
+
+    logging.getLogger('switchbot').setLevel(logging.CRITICAL)
+
+    results = {'config': vars(config),
+               'platform': {'python': sys.version.split()[0], 'machine': platform.machine()},
+               'time': time.time(),
+               'operations': bench_operations(config),
+               'fleet': bench_fleet(config)}
+
+    if config.output:
+        with open(config.output, 'w') as file:
+            json.dump(results, file, indent=2)
+    if config.compare:
+        with open(config.compare, 'r') as file:
+            compare(results, json.load(file))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency-ms", type=float, default=20,
+                        help="delay between a write and its notification")
+    parser.add_argument("--connect-latency-ms", type=float, default=100, help="duration of a connect")
+    parser.add_argument("--start-latency-ms", type=float, default=50,
+                        help="duration of the adapter start")
+    parser.add_argument("--busy-probability", type=float, default=0.0,
+                        help="probability that the bot replies busy")
+    parser.add_argument("--iterations", type=int, default=50, help="iterations per operation")
+    parser.add_argument("--bots", type=int, default=16, help="number of bots (fleet and scan)")
+    parser.add_argument("--concurrency", type=int, nargs='+', default=[1, 2, 4, 8, 16],
+                        help="concurrency levels of the fleet")
+    parser.add_argument("--session", action='store_true',
+                        help="reuse one connection for all operations")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the simulated bots")
+    parser.add_argument("--output", help="write the results as json to this file")
+    parser.add_argument("--compare", help="compare the results to this json file")
+    args = parser.parse_args()
+
+    main(config=args)
@@ -0,0 +1,128 @@
+"""
+Micro-benchmark of the timer codec (switchbotpy.switchbot_timer): encoding, decoding and
+bulk encoding / decoding of timer records, compared to the previous byte-by-byte codec
+(kept below as reference, also used by tests/test_timer_codec.py). Before timing, the results
+of both codecs are checked to be equal for all combinations of weekdays, enabled flag and action.
+Run it as a module from the root of the repository (to import switchbotpy from there):
+
+    python -m benchmarks.bench_timer_codec --records 100000
+"""
+
+import argparse
+import itertools
+import timeit
+
+from switchbotpy.switchbot_timer import (TIMER_RECORD, Action, StandardTimer, decode_timers,
+                                         encode_timers, parse_timer_cmd)
+
+
+# reference: the previous codec (concatenation of one-byte bytes objects)
+
+def _ref_to_byte(value):
+    return value.to_bytes(1, byteorder='big')
+
+def _ref_weekdays_to_byte(weekdays):
+    val = 0
+    for day in weekdays:
+        val += 2 ** (day-1)
+    if val == 0:
+        val = 128
+    return _ref_to_byte(val)
+
+def _ref_byte_to_weekdays(val):
+    return [day + 1 for day in range(7) if val & (1 << day)]
+
+def ref_to_cmd(timer, idx, num_timer):
+    cmd = _ref_to_byte(idx*16+3) + _ref_to_byte(num_timer) + b'\x00'
+    repeat = _ref_weekdays_to_byte(timer.weekdays)
+    cmd += repeat if timer.enabled else b'\x00'
+    cmd += _ref_to_byte(timer.hour) + _ref_to_byte(timer.min)
+    mode_b = _ref_to_byte(timer.mode.value)
+    if not timer.enabled:
+        mode_b = _ref_to_byte(ord(mode_b) | (ord(repeat) & 240))
+    cmd += mode_b
+    action_b = _ref_to_byte(timer.action.value)
+    if not timer.enabled:
+        action_b = _ref_to_byte(ord(action_b) | ((ord(repeat) & 15) << 4))
+    cmd += action_b
+    cmd += _ref_to_byte(timer.interval_timer_sum) + _ref_to_byte(timer.interval_hour)
+    cmd += _ref_to_byte(timer.interval_min)
+    return cmd
+
+def ref_parse(val):
+    num_timer = val[1]
+    weekdays = _ref_byte_to_weekdays(val[3])
+    enabled = val[3] != 0
+    if not enabled:
+        weekdays = _ref_byte_to_weekdays((val[6] & 240) | ((val[7] & 240) >> 4))
+    if not enabled and not any(val[4:6]) and not any(val[8:11]):
+        return None, num_timer
+    return StandardTimer(enabled=enabled, weekdays=weekdays, hour=val[4], min=val[5],
+                         action=Action(val[7] & 15)), num_timer
+
+
+def all_timers():
+    """standard timers with every combination of weekdays, enabled and action"""
+    for n_days in range(8):
+        for weekdays in itertools.combinations(range(1, 8), n_days):
+            for enabled in (True, False):
+                for action in Action:
+                    yield StandardTimer(enabled=enabled, weekdays=list(weekdays), hour=23,
+                                        min=59, action=action)
+
+
+def check_equal():
+    n_checked = 0
+    for timer in all_timers():
+        for num_timer in range(1, 6):
+            for idx in range(num_timer):
+                cmd = timer.to_cmd(idx=idx, num_timer=num_timer)
+                assert cmd == ref_to_cmd(timer, idx, num_timer), (timer.to_dict(), idx)
+                parsed, parsed_num = parse_timer_cmd(cmd)
+                ref, ref_num = ref_parse(cmd)
+                assert parsed_num == ref_num and parsed.to_dict() == ref.to_dict(), timer.to_dict()
+                n_checked += 1
+    print("codec matches the reference for %d records" % n_checked)
+
+
+def main(config):
+    """run the benchmark"""
+
+    check_equal()
+
+    timers = [StandardTimer(enabled=i % 3 != 0, weekdays=[1 + i % 7, 1 + (i + 3) % 7],
+                            hour=i % 24, min=i % 60, action=Action(i % 3))
+              for i in range(5)]
+    n_bots = config.records // len(timers)
+    cmds = [timer.to_cmd(idx=i, num_timer=len(timers)) for i, timer in enumerate(timers)]
+    buffer = bytearray(n_bots * len(timers) * TIMER_RECORD.size)
+
+    def encode_bulk():
+        for bot in range(n_bots):
+            encode_timers(timers, buffer=buffer, offset=bot * len(timers) * TIMER_RECORD.size)
+
+    cases = {
+        'encode (reference)': lambda: [ref_to_cmd(timer, i, len(timers))
+                                       for _ in range(n_bots) for i, timer in enumerate(timers)],
+        'encode (to_cmd)': lambda: [timer.to_cmd(idx=i, num_timer=len(timers))
+                                    for _ in range(n_bots) for i, timer in enumerate(timers)],
+        'encode (bulk)': encode_bulk,
+        'decode (reference)': lambda: [ref_parse(cmd) for _ in range(n_bots) for cmd in cmds],
+        'decode (parse_timer_cmd)': lambda: [parse_timer_cmd(cmd)
+                                             for _ in range(n_bots) for cmd in cmds],
+        'decode (bulk)': lambda: decode_timers(buffer),
+    }
+
+    n_records = n_bots * len(timers)
+    for name, func in cases.items():
+        duration = min(timeit.repeat(func, number=1, repeat=config.repeat))
+        print("%-26s %8.1f ns/record" % (name, 1e9 * duration / n_records))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=100000, help="number of timer records")
+    parser.add_argument("--repeat", type=int, default=5, help="repetitions (the best is reported)")
+    args = parser.parse_args()
+
+    main(config=args)
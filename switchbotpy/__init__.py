@@ -1,3 +1,14 @@
-from switchbotpy.switchbot import Scanner, Bot
+from switchbotpy.switchbot import Scanner, Bot, BotSnapshot
+from switchbotpy.switchbot_async import AsyncScanner, AsyncBot
 from switchbotpy.switchbot_timer import StandardTimer, Action, Mode
-from switchbotpy.switchbot_util import SwitchbotError, ActionStatus
\ No newline at end of file
+from switchbotpy.switchbot_util import SwitchbotError, ActionStatus
+from switchbotpy.switchbot_fleet import Fleet, FleetResult
+from switchbotpy.switchbot_advertisement import BotStatus, PresenceMonitor
+from switchbotpy.switchbot_metrics import InMemoryMetrics, prometheus_text
+from switchbotpy.switchbot_retry import RetryPolicy, CircuitBreaker
+from switchbotpy.switchbot_pool import AdapterPool, default_pool
+from switchbotpy.switchbot_schedule import ScheduleIndex, Fire
+from switchbotpy.switchbot_reconcile import Reconciler, DesiredState
+from switchbotpy.switchbot_coalesce import Coalescer
+from switchbotpy.switchbot_priority import Priority
+from switchbotpy.switchbot_poller import Poller, ChangeEvent, Change
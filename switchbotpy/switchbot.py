@@ -8,19 +8,39 @@ Scan and control Switchbots via BLE:
 All operations support using a predefined password (configured via the official Switchbot App)
 """
 
+import copy
+import json
 import logging
+import queue
 import re
+import threading
 import time
-import zlib
 from binascii import hexlify
-from typing import Any, Dict, List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Tuple
 from uuid import UUID
 
 import pygatt
 
-from switchbotpy.switchbot_timer import BaseTimer, delete_timer_cmd, parse_timer_cmd
-from switchbotpy.switchbot_util import (ActionStatus, SwitchbotError, handle_notification,
-                            notification_queue)
+from switchbotpy.switchbot_advertisement import (BotStatus, HcidumpAdvertisementSource,
+                                                decode_advertisement)
+from switchbotpy.switchbot_cache import IdentificationCache, ReadCache, Verdict
+from switchbotpy.switchbot_coalesce import Coalescer
+from switchbotpy.switchbot_cmd import (CMD_HANDLE, check_status, clear_timer_cmd, get_timer_cmd,
+                                      hold_time_cmd, mode_cmd, opcode, parse_settings,
+                                      press_cmd, set_timer_cmd, settings_cmd, switch_cmd,
+                                      timestamp_cmd)
+from switchbotpy.switchbot_metrics import NULL_METRICS, Metrics
+from switchbotpy.switchbot_pool import AdapterPool
+from switchbotpy.switchbot_priority import Priority, PriorityLock
+from switchbotpy.switchbot_timer import BaseTimer, diff_timers, parse_timer_cmd
+from switchbotpy.switchbot_transport import gatttool_transport
+from switchbotpy.switchbot_retry import CircuitBreaker, RetryPolicy
+from switchbotpy.switchbot_rtt import RttEstimator
+from switchbotpy.switchbot_util import (ActionStatus, CircuitOpenError, NotificationChannel,
+                                       NotificationTimeout, SwitchbotError, WriteError,
+                                       password_crc)
 
 
 logging.basicConfig()
@@ -29,19 +49,44 @@ LOG = logging.getLogger('switchbot')
 class Scanner(object):
     """ Switchbot Scanner class to scan for available switchbots (might require root privileges)"""
 
-    def __init__(self):
-        self.adapter = pygatt.GATTToolBackend()
+    def __init__(self, adapter=None, advertisement_source=None,
+                 identification_cache: IdentificationCache = None,
+                 adapter_factory: Callable[[], Any] = None, max_workers: int = 1,
+                 metrics: Metrics = None, pool: AdapterPool = None):
+        """
+        identification_cache: remembers which devices are switchbots across scans
+        adapter_factory: creates the additional adapters to identify up to
+                         max_workers unknown devices concurrently
+        metrics: sink for the scan metrics (see switchbot_metrics)
+        pool: borrow the adapters from the pool instead (see switchbot_pool)
+        """
+        if adapter_factory is None:
+            adapter_factory = gatttool_transport
+        if adapter is None and pool is None:
+            adapter = adapter_factory()
+        self.adapter = adapter
+        self.pool = pool
+        if advertisement_source is None:
+            advertisement_source = HcidumpAdvertisementSource()
+        self.advertisement_source = advertisement_source
+        self.identification_cache = identification_cache
+        self.adapter_factory = adapter_factory
+        self.max_workers = max_workers
+        self.metrics = metrics if metrics is not None else NULL_METRICS
 
     def scan(self, known_dict=None) -> List[str]:
         """Scan for available switchbots"""
         LOG.info("scanning for bots")
-        try:
-            self.adapter.start()
-            devices = self.adapter.scan()
-        finally:
-            self.adapter.stop()
+        t_start = time.perf_counter()
+        with self._adapter() as adapter:
+            try:
+                adapter.start()
+                devices = adapter.scan()
+            finally:
+                adapter.stop()
 
         switchbots = []
+        unknown = []
 
         for device in devices:
             if known_dict is not None and device['address'] is not None:
@@ -49,37 +94,178 @@ class Scanner(object):
                 # -> don't need to check characteristics to know if device is a switchbot
                 if device['address'] in known_dict:
                     switchbots.append(device['address'])
-            elif self._is_switchbot(mac=device['address']):
+            else:
                  # mac of device is unknown
                  # -> check characteristics to know if device is a switchbot
-                switchbots.append(device['address'])
+                unknown.append(device['address'])
+
+        verdicts = self._identify_all(macs=unknown)
+        switchbots += [mac for mac in unknown if verdicts[mac] is Verdict.switchbot]
 
+        if self.metrics.enabled:
+            self._record_scan('scan', time.perf_counter() - t_start,
+                              n_seen=len(devices), n_switchbots=len(switchbots))
         return switchbots
 
+    def scan_status(self, timeout: float = 5) -> Dict[str, BotStatus]:
+        """
+        Listen for advertisements and decode the status of all switchbots in range
+        (battery, mode, state, rssi) without connecting to them
+        """
+        LOG.info("scanning for bot status")
+        t_start = time.perf_counter()
+        status = {}
+        seen = set()
+        for advertisement in self.advertisement_source.listen(timeout=timeout):
+            seen.add(advertisement.mac)
+            bot_status = decode_advertisement(advertisement)
+            if bot_status is not None:
+                status[bot_status.mac] = bot_status
+
+        if self.metrics.enabled:
+            self._record_scan('status', time.perf_counter() - t_start,
+                              n_seen=len(seen), n_switchbots=len(status))
+        return status
+
+    def scan_iter(self, timeout: float = 10) -> Iterator[BotStatus]:
+        """
+        Yield the switchbots (recognized by their advertisements) as soon as they are seen,
+        every bot is yielded once
+        """
+        LOG.info("streaming scan for bots")
+        seen = set()
+        for advertisement in self.advertisement_source.listen(timeout=timeout):
+            bot_status = decode_advertisement(advertisement)
+            if bot_status is not None and bot_status.mac not in seen:
+                seen.add(bot_status.mac)
+                yield bot_status
+
+    def find(self, macs: Iterable[str], timeout: float = 10) -> Dict[str, BotStatus]:
+        """
+        Look for the given switchbots and return as soon as all of them have been seen
+        (or with the ones found so far when the timeout expires)
+        """
+        wanted = {mac.upper() for mac in macs}
+        LOG.info("looking for %d bots", len(wanted))
+        found = {}
+        if not wanted:
+            return found
+
+        for bot_status in self.scan_iter(timeout=timeout):
+            if bot_status.mac in wanted:
+                found[bot_status.mac] = bot_status
+                if len(found) == len(wanted):
+                    break
+
+        LOG.info("found %d of %d bots", len(found), len(wanted))
+        return found
+
+    def _record_scan(self, kind: str, duration: float, n_seen: int, n_switchbots: int):
+        self.metrics.observe('switchbot_scan_seconds', duration, labels={'kind': kind})
+        self.metrics.set('switchbot_scan_devices', n_seen, labels={'kind': kind + '_seen'})
+        self.metrics.set('switchbot_scan_devices', n_switchbots,
+                         labels={'kind': kind + '_switchbots'})
+
+    def _identify_all(self, macs: List[str]) -> Dict[str, Verdict]:
+        """identify the devices, using the cache and probing the misses concurrently"""
+        verdicts = {}
+        misses = []
+        for mac in macs:
+            verdict = None
+            if self.identification_cache is not None and mac is not None:
+                verdict = self.identification_cache.get(mac)
+            if verdict is None:
+                misses.append(mac)
+            else:
+                verdicts[mac] = verdict
+
+        LOG.info("identify devices: %d cached, %d to probe", len(verdicts), len(misses))
+
+        n_workers = max(1, min(self.max_workers, len(misses)))
+        # every adapter holds at most one connection => one adapter per worker
+        adapters = queue.Queue()
+        if self.pool is None:
+            adapters.put(self.adapter)
+            for _ in range(n_workers - 1):
+                adapters.put(self.adapter_factory())
+
+        def probe(mac):
+            if self.pool is not None:
+                with self.pool.adapter() as adapter:
+                    return mac, self._identify(mac=mac, adapter=adapter)
+            adapter = adapters.get()
+            try:
+                return mac, self._identify(mac=mac, adapter=adapter)
+            finally:
+                adapters.put(adapter)
+
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            for mac, verdict in executor.map(probe, misses):
+                verdicts[mac] = verdict
+                if self.identification_cache is not None and mac is not None:
+                    self.identification_cache.put(mac, verdict)
+
+        if self.identification_cache is not None and misses:
+            self.identification_cache.save()
+
+        return verdicts
+
     def _is_switchbot(self, mac: str) -> bool:
+        with self._adapter() as adapter:
+            return self._identify(mac=mac, adapter=adapter) is Verdict.switchbot
+
+    @contextmanager
+    def _adapter(self):
+        """an adapter for exclusive use: borrowed from the pool or the own adapter"""
+        if self.pool is None:
+            yield self.adapter
+        else:
+            with self.pool.adapter() as adapter:
+                yield adapter
+
+    def _identify(self, mac: str, adapter) -> Verdict:
         try:
-            self.adapter.start()
-            device = self.adapter.connect(mac, address_type=pygatt.BLEAddressType.random)
-            characteristics = self.adapter.discover_characteristics(device)
+            adapter.start()
+            device = adapter.connect(mac, address_type=pygatt.BLEAddressType.random)
+            characteristics = adapter.discover_characteristics(device)
             device.disconnect()
 
             uuid1 = UUID("{cba20002-224d-11e6-9fb8-0002a5d5c51b}")
             uuid2 = UUID("{cba20003-224d-11e6-9fb8-0002a5d5c51b}")
 
-            is_switchbot = uuid1 in characteristics.keys() and  uuid2 in characteristics.keys()
+            if uuid1 in characteristics.keys() and  uuid2 in characteristics.keys():
+                verdict = Verdict.switchbot
+            else:
+                verdict = Verdict.other
         except pygatt.exceptions.NotConnectedError:
             # e.g. if device uses different addressing
-            is_switchbot = False
+            verdict = Verdict.unreachable
         finally:
-            self.adapter.stop()
+            adapter.stop()
+
+        return verdict
+
 
-        return is_switchbot
+def _sleep_until(deadline: float, spin_sec: float = 0.002):
+    """wait until the monotonic time deadline: sleep and spin for the last spin_sec (sleep is coarse)"""
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        if remaining > spin_sec:
+            time.sleep(remaining - spin_sec)
 
 
 class Bot(object):
     """Switchbot class to control the bot."""
 
-    def __init__(self, bot_id: int, mac: str, name: str):
+    def __init__(self, bot_id: int, mac: str, name: str, adapter=None, metrics: Metrics = None,
+                 pool: AdapterPool = None):
+        """
+        adapter: the BLE adapter of the bot (default: gatttool)
+        metrics: sink for the metrics of the bot (see switchbot_metrics)
+        pool: borrow adapters and warm connections from the pool instead (see switchbot_pool)
+        """
 
         if not re.match(r"[0-9A-F]{2}(?:[-:][0-9A-F]{2}){5}$", mac):
             raise ValueError("Illegal Mac Address: ", mac)
@@ -88,13 +274,135 @@ class Bot(object):
         self.mac = mac
         self.name = name
 
-        self.adapter = pygatt.GATTToolBackend()
+        if adapter is None and pool is None:
+            adapter = gatttool_transport()
+        self.adapter = adapter
+        self.pool = pool
+        self._lease = None
         self.device = None
         self.password = None
         self.notification_activated = False
+        self._channel = None
+        self.cache = None
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+        self.retry_policy = None
+        self.circuit_breaker = None
+        self.rtt = None
+        self.coalescer = None
+
+        # session state (see open() / close())
+        self.idle_timeout_sec = None
+        self._session_open = False
+        self._session_depth = 0
+        self._session_owner = None # thread running a command
+        self._session_lock = PriorityLock(metrics=self.metrics)
+        self._suspended = 0 # commands that yielded the bot to commands of a higher priority
+        self._uninterruptible = 0 # running multi-step writes (do not yield the bot)
+        self._adapter_running = False
+        self._idle_timer = None
+        self._idle_generation = 0
 
         LOG.info("create bot: id=%d mac=%s name=%s", self.bot_id, self.mac, self.name)
 
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self, idle_timeout_sec: float = None):
+        """Open a session: start the adapter, connect and subscribe once and keep the
+        connection for all following commands until close() is called.
+        If idle_timeout_sec is set, the connection is dropped after being idle for that long
+        and transparently re-established by the next command.
+        """
+        LOG.info("open session: idle timeout=%s sec", str(idle_timeout_sec))
+        with self._session_lock:
+            self.idle_timeout_sec = idle_timeout_sec
+            # a failed connect leaves no session open (__exit__ is not called then)
+            self._ensure_connected()
+            self._session_open = True
+            self._arm_idle_timer()
+
+    def close(self):
+        """Close the session and disconnect from the Switchbot."""
+        LOG.info("close session")
+        with self._session_lock:
+            self._cancel_idle_timer()
+            self._session_open = False
+            self._disconnect(reusable=True)
+
+    def enable_cache(self, settings_ttl_sec: float = 60, timers_ttl_sec: float = 300):
+        """
+        Serve get_settings() and get_timers() from memory until the values expire.
+        The writes of this bot update or invalidate the cached values (see cache.stats()).
+        """
+        LOG.info("enable cache: settings ttl=%s sec timers ttl=%s sec",
+                 str(settings_ttl_sec), str(timers_ttl_sec))
+        self.cache = ReadCache(settings_ttl_sec=settings_ttl_sec, timers_ttl_sec=timers_ttl_sec)
+
+    def enable_retry(self, policy: RetryPolicy = None):
+        """
+        Retry failed commands (e.g. bot busy, no notification) according to the policy,
+        over the same connection if it is still usable. The deadline of the policy applies
+        to each command (e.g. to every round-trip of set_timers() or of a batch).
+        """
+        LOG.info("enable retry")
+        self.retry_policy = policy if policy is not None else RetryPolicy()
+
+    def enable_circuit_breaker(self, failure_threshold: int = 3, reset_timeout_sec: float = 30):
+        """
+        Fail fast with CircuitOpenError after failure_threshold consecutive commands failed
+        to reach the bot, until a probe after reset_timeout_sec succeeds (see CircuitBreaker).
+        Commands that the bot answered (even with an error status) do not count as failures.
+        """
+        LOG.info("enable circuit breaker: threshold=%d reset timeout=%s sec",
+                 failure_threshold, str(reset_timeout_sec))
+        self.circuit_breaker = CircuitBreaker(failure_threshold=failure_threshold,
+                                              reset_timeout_sec=reset_timeout_sec)
+
+    def enable_coalescing(self, coalescer: Coalescer = None):
+        """
+        Share the round-trip of identical reads (get_settings(), get_timers()) that are issued
+        concurrently and collapse queued switch() calls to the latest state (see Coalescer).
+        Pass the same coalescer to all Bot instances of a mac address to coalesce across them.
+        """
+        LOG.info("enable coalescing")
+        self.coalescer = coalescer if coalescer is not None else Coalescer(metrics=self.metrics)
+
+    def enable_adaptive_timeout(self, min_timeout_sec: float = 0.5, max_timeout_sec: float = 10,
+                                initial_timeout_sec: float = 5):
+        """
+        Wait for notifications as long as the round trip times observed for this bot suggest
+        (per command, within the bounds) instead of a fixed timeout (5 sec or the timeout
+        of the retry policy). The learned estimates are available via rtt.stats().
+        """
+        LOG.info("enable adaptive timeout: min=%s sec max=%s sec",
+                 str(min_timeout_sec), str(max_timeout_sec))
+        self.rtt = RttEstimator(min_timeout_sec=min_timeout_sec, max_timeout_sec=max_timeout_sec,
+                                initial_timeout_sec=initial_timeout_sec)
+
+    def priority(self, priority: Priority):
+        """
+        The commands of the current thread have the priority within the context, e.g.,
+            with bot.priority(Priority.interactive):
+                bot.press()
+        Commands wait for the bot in the order of their priority and commands of a lower
+        priority yield the bot to them between their round-trips (except for writes that
+        take several round-trips: set_timers(), sync_timers() and set_mode()).
+        """
+        return self._session_lock.priority(priority)
+
+    def queue_stats(self) -> Dict[str, Any]:
+        """the number of commands waiting for the bot and their wait times per priority"""
+        return self._session_lock.stats()
+
+    @property
+    def connected(self) -> bool:
+        """True if the bot is currently connected and subscribed to notifications."""
+        return self.notification_activated
+
     def press(self):
         """Press the Switchbot in the standard mode (non dual state mode):
             1. Extend arm
@@ -102,21 +410,9 @@ class Bot(object):
             3. Retract arm
         """
         LOG.info("press bot")
-        try:
-            self.adapter.start()
-            self._connect()
-            self._activate_notifications()
-
-            if self.password:
-                cmd = b'\x57\x11' + self.password
-            else:
-                cmd = b'\x57\x01'
-
-            value = self._write_cmd_and_wait_for_notification(handle=0x16, cmd=cmd)
-            self._handle_switchbot_status_msg(value=value)
-
-        finally:
-            self.adapter.stop()
+        with self._session(operation='press'):
+            cmd = press_cmd(password=self.password)
+            self._command(cmd, idempotent=False)
 
 
     def switch(self, switch_on: bool):
@@ -125,27 +421,40 @@ class Bot(object):
         """
 
         LOG.info("switch bot on=%s", str(switch_on))
-        try:
-            self.adapter.start()
-            self._connect()
-            self._activate_notifications()
-
-            if self.password:
-                cmd = b'\x57\x11' + self.password
-            else:
-                cmd = b'\x57\x01'
-
-            if switch_on:
-                cmd += b'\x01'
-            else: # off
-                cmd += b'\x02'
-
-            value = self._write_cmd_and_wait_for_notification(handle=0x16, cmd=cmd)
-            self._handle_switchbot_status_msg(value=value)
+        if self._coalescing():
+            self.coalescer.write_latest(self.mac, ('switch',), switch_on, self._switch)
+        else:
+            self._switch(switch_on)
+
+        if self.cache is not None:
+            self.cache.invalidate('settings')
+
+    def _switch(self, switch_on: bool):
+        with self._session(operation='switch'):
+            cmd = switch_cmd(switch_on=switch_on, password=self.password)
+            self._command(cmd)
+
+    def press_at(self, t: float, warmup_sec: float = 3) -> 'TimedResult':
+        """Press the Switchbot as close as possible to the time t (sec since epoch):
+        connects and subscribes warmup_sec ahead of t, keeps the connection warm and writes
+        the prepared command at t. If the connection cannot be established ahead of t,
+        the press is attempted at t with a new connection.
+        """
+        LOG.info("press bot at %s", time.strftime('%H:%M:%S', time.localtime(t)))
+        cmd = press_cmd(password=self.password)
+        return self._command_at('press', cmd, t, warmup_sec=warmup_sec, idempotent=False)
 
-        finally:
-            self.adapter.stop()
+    def switch_at(self, t: float, switch_on: bool, warmup_sec: float = 3) -> 'TimedResult':
+        """Switch the state of the Switchbot in the dual state mode at the time t
+        (sec since epoch) over a connection established ahead of t [see press_at()]
+        """
+        LOG.info("switch bot on=%s at %s", str(switch_on), time.strftime('%H:%M:%S', time.localtime(t)))
+        cmd = switch_cmd(switch_on=switch_on, password=self.password)
+        result = self._command_at('switch', cmd, t, warmup_sec=warmup_sec)
 
+        if self.cache is not None:
+            self.cache.invalidate('settings')
+        return result
 
     def set_hold_time(self, sec: int):
         """Set the hold time for the Switchbot in the standard mode (up to one minute)"""
@@ -154,51 +463,26 @@ class Bot(object):
         if sec < 0 or sec > 60:
             raise ValueError("hold time must be between [0, 60] seconds")
 
-        try:
-            self.adapter.start()
-            self._connect()
-            self._activate_notifications()
-
-            if self.password:
-                cmd = b'\x57\x1f' + self.password
-            else:
-                cmd = b'\x57\x0f'
+        with self._session(operation='set_hold_time'):
+            cmd = hold_time_cmd(sec=sec, password=self.password)
+            self._command(cmd)
 
-            cmd += b'\x08' + sec.to_bytes(1, byteorder='big')
-
-            value = self._write_cmd_and_wait_for_notification(handle=0x16, cmd=cmd)
-            self._handle_switchbot_status_msg(value=value)
-
-        finally:
-            self.adapter.stop()
+        if self.cache is not None:
+            self.cache.update('settings', lambda settings: settings.update(hold_seconds=sec))
 
     def get_timer(self, idx: int) -> Tuple[BaseTimer, int]:
         """Get all the configured timers of the Switchbot."""
 
         LOG.info("get timer: %d", idx)
-        try:
-            self.adapter.start()
-            self._connect()
-            self._activate_notifications()
-
-            if self.password:
-                cmd = b'\x57\x18' + self.password
-            else:
-                cmd = b'\x57\x08'
-
-            timer_id = (idx * 16 + 3).to_bytes(1, byteorder='big')
-            cmd += timer_id
+        with self._session(operation='get_timer'):
+            cmd = get_timer_cmd(idx=idx, password=self.password)
 
             # trigger and wait for notification
-            value = self._write_cmd_and_wait_for_notification(handle=0x16, cmd=cmd)
-            self._handle_switchbot_status_msg(value=value)
+            value = self._command(cmd)
 
             # parse result
             timer, num_timer = parse_timer_cmd(value)
 
-        finally:
-            self.adapter.stop()
-
         return timer, num_timer
 
     def set_timer(self, timer: BaseTimer, idx: int, num_timer: int):
@@ -207,82 +491,82 @@ class Bot(object):
         LOG.info("set timer: %d", idx)
         if idx < 0 or idx > 4 or num_timer <= idx or num_timer < 1 or num_timer > 5:
             raise ValueError("Illegal Timer Idx or Number of Timers")
-        try:
-            self.adapter.start()
-            self._connect()
-            self._activate_notifications()
+        if self.cache is not None:
+            self.cache.invalidate('timers')
 
-            if self.password:
-                cmd = b'\x57\x19' + self.password
-            else:
-                cmd = b'\x57\x09'
+        with self._session(operation='set_timer'):
+            cmd = set_timer_cmd(timer=timer, idx=idx, num_timer=num_timer, password=self.password)
+            self._command(cmd)
 
-            cmd += timer.to_cmd(idx=idx, num_timer=num_timer)
-            value = self._write_cmd_and_wait_for_notification(handle=0x16, cmd=cmd)
-            self._handle_switchbot_status_msg(value=value)
-
-        finally:
-            self.adapter.stop()
+        if self.cache is not None:
+            self.cache.update('settings', lambda settings: settings.update(n_timers=num_timer))
 
 
     def set_timers(self, timers: List[BaseTimer]):
         """Configure multiple Switchbot timers."""
 
         LOG.info("set timers")
-        try:
-            self.adapter.start()
-            self._connect()
-            self._activate_notifications()
-
-            if self.password:
-                cmd_base = b'\x57\x19' + self.password
-            else:
-                cmd_base = b'\x57\x09'
+        if self.cache is not None:
+            # a partial write leaves the timers unknown
+            self.cache.invalidate('timers')
 
+        with self._session(operation='set_timers'), self._uninterrupted():
             num_timer = len(timers)
             for i, timer in enumerate(timers):
-                cmd = cmd_base
-                cmd += timer.to_cmd(idx=i, num_timer=num_timer)
-                value = self._write_cmd_and_wait_for_notification(handle=0x16, cmd=cmd)
-                self._handle_switchbot_status_msg(value=value)
+                cmd = set_timer_cmd(timer=timer, idx=i, num_timer=num_timer, password=self.password)
+                self._command(cmd)
 
             for i in range(num_timer, 5):
-                cmd = cmd_base
-                cmd += delete_timer_cmd(idx=i, num_timer=num_timer)
-                value = self._write_cmd_and_wait_for_notification(handle=0x16, cmd=cmd)
-                self._handle_switchbot_status_msg(value=value)
+                cmd = clear_timer_cmd(idx=i, num_timer=num_timer, password=self.password)
+                self._command(cmd)
 
-        finally:
-            self.adapter.stop()
+        if self.cache is not None:
+            self.cache.put('timers', copy.deepcopy(timers))
+            self.cache.update('settings', lambda settings: settings.update(n_timers=num_timer))
 
 
-    def set_current_timestamp(self):
-        """Sync the timestamps for the timers."""
+    def sync_timers(self, timers: List[BaseTimer], current: List[BaseTimer] = None) -> Dict[str, List[int]]:
+        """
+        Configure the Switchbot timers like set_timers() but only write the slots that
+        differ from the current timers (read from the bot, or its cache, if not given).
+        Returns the indices of the 'written', 'deleted' and 'unchanged' timer slots.
+        """
 
-        LOG.info("setting current timestamp")
-        try:
-            self.adapter.start()
-            self._connect()
-            self._activate_notifications()
+        LOG.info("sync timers")
+        with self._session(operation='sync_timers'), self._uninterrupted():
+            # the diff must not become stale by writes of other commands
+            if current is None:
+                current = self.get_timers()
 
-            if self.password:
-                cmd_base = b'\x57\x19' + self.password
-            else:
-                cmd_base = b'\x57\x09'
+            written, deleted, unchanged = diff_timers(current=current, desired=timers)
+            LOG.info("  write: %s delete: %s unchanged: %s", str(written), str(deleted), str(unchanged))
 
-            time_sec_utc = time.time()
-            time_local = time.localtime(time_sec_utc)
-            offset = time_local.tm_gmtoff
-            timestamp = int(time_sec_utc + offset)
+            if self.cache is not None:
+                # a partial write leaves the timers unknown
+                self.cache.invalidate('timers')
 
-            cmd = cmd_base + b'\x01'
-            cmd += timestamp.to_bytes(8, byteorder='big')
+            num_timer = len(timers)
+            for i in written:
+                cmd = set_timer_cmd(timer=timers[i], idx=i, num_timer=num_timer, password=self.password)
+                self._command(cmd)
 
-            value = self._write_cmd_and_wait_for_notification(handle=0x16, cmd=cmd)
-            self._handle_switchbot_status_msg(value=value)
+            for i in deleted:
+                cmd = clear_timer_cmd(idx=i, num_timer=num_timer, password=self.password)
+                self._command(cmd)
 
-        finally:
-            self.adapter.stop()
+        if self.cache is not None:
+            self.cache.put('timers', copy.deepcopy(timers))
+            self.cache.update('settings', lambda settings: settings.update(n_timers=num_timer))
+
+        return {'written': written, 'deleted': deleted, 'unchanged': unchanged}
+
+    def set_current_timestamp(self):
+        """Sync the timestamps for the timers."""
+
+        LOG.info("setting current timestamp")
+        with self._session(operation='set_current_timestamp'):
+            cmd = timestamp_cmd(password=self.password)
+            self._command(cmd)
 
 
     def set_mode(self, dual_state: bool, inverse: bool):
@@ -294,35 +578,17 @@ class Bot(object):
         LOG.info("setting mode: dual_state=%s  inverse=%s", str(dual_state), str(inverse))
         LOG.info("  resetting all timers")
 
-        # delete all timers
-        # -> because if dual_state changes, then also action of timer needs to change
-        self.set_timers(timers=[])
-
-        try:
-            self.adapter.start()
-            self._connect()
-            self._activate_notifications()
-
-            if self.password:
-                cmd_base = b'\x57\x13' + self.password
-            else:
-                cmd_base = b'\x57\x03'
-
-            cmd = cmd_base + b'\x64'
+        with self._session(operation='set_mode'), self._uninterrupted():
+            # delete all timers
+            # -> because if dual_state changes, then also action of timer needs to change
+            self.set_timers(timers=[])
 
-            config = 0
-            if dual_state:
-                config += 16
-            if inverse:
-                config += 1
+            cmd = mode_cmd(dual_state=dual_state, inverse=inverse, password=self.password)
+            self._command(cmd)
 
-            cmd += config.to_bytes(1, byteorder='big')
-
-            value = self._write_cmd_and_wait_for_notification(handle=0x16, cmd=cmd)
-            self._handle_switchbot_status_msg(value=value)
-
-        finally:
-            self.adapter.stop()
+        if self.cache is not None:
+            self.cache.update('settings', lambda settings: settings.update(
+                dual_state_mode=dual_state, inverse_direction=inverse))
 
     def get_settings(self) -> Dict[str, Any]:
         """
@@ -330,99 +596,421 @@ class Bot(object):
         mode (standard / dual state), inverse mode, hold seconds)"""
 
         LOG.info("get settings")
-        try:
-            self.adapter.start()
-            self._connect()
-            self._activate_notifications()
+        if self.cache is not None:
+            settings = self.cache.get('settings')
+            if settings is not None:
+                return dict(settings)
 
-            if self.password:
-                cmd = b'\x57\x12' + self.password
-            else:
-                cmd = b'\x57\x02'
+        if self._coalescing():
+            # the settings of a shared read are copied for every caller
+            settings = dict(self.coalescer.read(self.mac, ('get_settings',), self._read_settings))
+        else:
+            settings = self._read_settings()
 
-            # trigger and wait for notification
-            value = self._write_cmd_and_wait_for_notification(handle=0x16, cmd=cmd)
-            self._handle_switchbot_status_msg(value=value)
-
-            # parse result
-            settings = {}
+        if self.cache is not None:
+            self.cache.put('settings', dict(settings))
 
-            settings["battery"] = value[1]
-            settings["firmware"] = value[2] / 10.0
+        return settings
 
-            settings["n_timers"] = value[8]
-            settings["dual_state_mode"] = bool(value[9] & 16)
-            settings["inverse_direction"] = bool(value[9] & 1)
-            settings["hold_seconds"] = value[10]
+    def _read_settings(self) -> Dict[str, Any]:
+        with self._session(operation='get_settings'):
+            cmd = settings_cmd(password=self.password)
 
-        finally:
-            self.adapter.stop()
+            # trigger and wait for notification
+            value = self._command(cmd)
 
-        return settings
+        # parse result
+        return parse_settings(value)
 
     def get_timers(self, n_timers: int = 5) -> List[BaseTimer]:
         """Get the configured Switchbot timers"""
 
         LOG.info("get timers")
-        try:
-            self.adapter.start()
-            self._connect()
-            self._activate_notifications()
+        if self.cache is not None:
+            timers = self.cache.get('timers')
+            if timers is not None:
+                # the caller may change the timers (e.g. to write them back)
+                return copy.deepcopy(timers[:n_timers])
+
+        if self._coalescing():
+            timers, complete = self.coalescer.read(self.mac, ('get_timers', n_timers),
+                                                   lambda: self._read_timers(n_timers))
+            # the timers of a shared read are copied for every caller
+            timers = copy.deepcopy(timers)
+        else:
+            timers, complete = self._read_timers(n_timers)
+
+        if self.cache is not None and complete:
+            # only a complete list of the timers can be cached
+            self.cache.put('timers', copy.deepcopy(timers))
 
-            if self.password:
-                base_cmd = b'\x57\x18' + self.password
-            else:
-                base_cmd = b'\x57\x08'
+        return timers
 
+    def _read_timers(self, n_timers: int) -> Tuple[List[BaseTimer], bool]:
+        """the timers and whether they are all timers of the bot"""
+        with self._session(operation='get_timers'):
             timers = []
+            complete = n_timers >= 5
 
             for i in range(0, n_timers):
-                timer_id = (i * 16 + 3).to_bytes(1, byteorder='big')
-                cmd = base_cmd + timer_id
+                cmd = get_timer_cmd(idx=i, password=self.password)
 
                 # trigger and wait for notification
-                value = self._write_cmd_and_wait_for_notification(handle=0x16, cmd=cmd)
-                self._handle_switchbot_status_msg(value=value)
+                value = self._command(cmd)
 
                 # parse result
-                timer, _ = parse_timer_cmd(value)
+                timer, num_timer = parse_timer_cmd(value)
 
                 if timer is None:
                     # timer not set => all later also not set
+                    complete = True
                     break
 
                 # add to timers
                 timers.append(timer)
 
-        finally:
-            self.adapter.stop()
+                if len(timers) >= num_timer:
+                    # the bot reports the number of timers => no need to read the empty slots
+                    complete = True
+                    break
 
-        return timers
+        return timers, complete
+
+    def snapshot(self) -> 'BotSnapshot':
+        """
+        Get the settings and all configured timers in one session
+        (reads exactly the number of timers reported in the settings)
+        """
+
+        LOG.info("get snapshot")
+        with self._session(operation='snapshot'):
+            settings = self.get_settings()
+            if settings["n_timers"] > 0:
+                timers = self.get_timers(n_timers=min(settings["n_timers"], 5))
+            else:
+                timers = []
+
+        return BotSnapshot(mac=self.mac, timers=timers, time=time.time(), **settings)
+
+    def batch(self) -> 'Batch':
+        """
+        Build a sequence of commands that is executed over a single connection, e.g.,
+        bot.batch().set_timers(timers).set_hold_time(5).sync_time().execute()
+        """
+        return Batch(bot=self)
 
     def encrypted(self, password: str):
         """The Switchbot is configured with this password."""
 
         LOG.info("use encrypted communication")
-        data = password.encode()
-        crc = zlib.crc32(data)
-        self.password = crc.to_bytes(4, 'big')
+        self.password = password_crc(password)
+
+    @contextmanager
+    def _session(self, operation: str = None):
+        """
+        provides a connected and subscribed device for the duration of a command,
+        reusing the connection of an open session (or of an enclosing command)
+        (the duration and outcome of a named operation are reported to the metrics)
+        """
+        t_start = time.perf_counter()
+        outcome = 'error'
+        try:
+            with self._session_lock:
+                self._cancel_idle_timer()
+                self._session_depth += 1
+                self._session_owner = threading.get_ident()
+                try:
+                    if not self.notification_activated:
+                        # a connect does not show that the bot answers commands
+                        self._with_circuit_breaker(self._ensure_connected, count_success=False)
+                    yield
+                    outcome = 'ok'
+                except SwitchbotError as err:
+                    if err.switchbot_action_status is None:
+                        # communication failure -> connection is not reusable
+                        self._disconnect()
+                    if isinstance(err, CircuitOpenError):
+                        outcome = 'circuit_open'
+                    raise
+                finally:
+                    self._session_depth -= 1
+                    if self._session_depth == 0:
+                        self._session_owner = None
+                        if self._session_open or self._suspended:
+                            self._arm_idle_timer()
+                        else:
+                            self._disconnect(reusable=True)
+        finally:
+            if operation is not None and self.metrics.enabled:
+                self.metrics.observe('switchbot_operation_seconds', time.perf_counter() - t_start,
+                                     labels={'operation': operation})
+                self.metrics.increment('switchbot_operations_total',
+                                       labels={'operation': operation, 'outcome': outcome})
+
+    @contextmanager
+    def _uninterrupted(self):
+        """the commands within the context do not yield the bot (requires a session)"""
+        self._uninterruptible += 1
+        try:
+            yield
+        finally:
+            self._uninterruptible -= 1
+
+    def _coalescing(self) -> bool:
+        # a command within an ongoing command of this thread (e.g. a batch) must not wait
+        # for another thread that needs the session of this bot
+        return self.coalescer is not None and self._session_owner != threading.get_ident()
 
-    def _connect(self):
+    def _ensure_connected(self):
+        if self.notification_activated:
+            return
+        t_start = time.perf_counter()
         try:
-            self.device = self.adapter.connect(self.mac, address_type=pygatt.BLEAddressType.random)
+            if self.pool is not None:
+                self._lease = self.pool.acquire(self.mac, connect=self._open_connection)
+                self.device, self._channel = self._lease.device, self._lease.channel
+            else:
+                self._adapter_running = True
+                self.device, self._channel = self._open_connection(self.adapter)
+            self.notification_activated = True
+        except BaseException:
+            self._disconnect()
+            raise
+        self.metrics.observe('switchbot_connect_seconds', time.perf_counter() - t_start)
+
+    def _open_connection(self, adapter) -> Tuple[Any, NotificationChannel]:
+        """start the adapter, connect to the bot and subscribe to its notifications"""
+        adapter.start()
+        device = self._connect(adapter)
+        channel = self._activate_notifications(device)
+        return device, channel
+
+    def _disconnect(self, reusable: bool = False):
+        """drop the connection (a pooled connection is returned to the pool, warm if reusable)"""
+        self.notification_activated = False
+        if self._lease is not None:
+            lease, self._lease = self._lease, None
+            self.device = None
+            self._channel = None
+            self.pool.release(lease, reusable=reusable)
+            return
+        if self._channel is not None:
+            # late notifications of this connection must not reach later commands
+            self._channel.close()
+            self._channel = None
+        self.device = None
+        if self._adapter_running:
+            self._adapter_running = False
+            self.adapter.stop()
+
+    def _arm_idle_timer(self):
+        if self.idle_timeout_sec is None:
+            return
+        self._idle_generation += 1
+        self._idle_timer = threading.Timer(self.idle_timeout_sec, self._on_idle,
+                                           args=(self._idle_generation,))
+        self._idle_timer.daemon = True
+        self._idle_timer.start()
+
+    def _cancel_idle_timer(self):
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+            self._idle_timer = None
+
+    def _on_idle(self, generation: int):
+        with self._session_lock:
+            # the bot might have been used since the timer was armed
+            if (generation != self._idle_generation or self._session_depth > 0 or
+                    self._suspended):
+                return
+            if self.notification_activated:
+                LOG.info("session idle for %s sec: disconnect", str(self.idle_timeout_sec))
+                self._disconnect(reusable=True)
+
+    def _connect(self, adapter):
+        try:
+            return adapter.connect(self.mac, address_type=pygatt.BLEAddressType.random)
         except pygatt.BLEError:
             LOG.exception("pygatt: failed to connect to ble device")
             raise SwitchbotError(message="communication with ble device failed")
 
-    def _activate_notifications(self):
+    def _activate_notifications(self, device) -> NotificationChannel:
         uuid = "cba20003-224d-11e6-9fb8-0002a5d5c51b"
         try:
-            self.device.subscribe(uuid, callback=handle_notification)
-            self.notification_activated = True
+            channel = NotificationChannel()
+            device.subscribe(uuid, callback=channel.handle_notification)
+            return channel
         except pygatt.BLEError:
             LOG.exception("pygatt: failed to activate notifications")
             raise SwitchbotError(message="communication with ble device failed")
 
+    def _command(self, cmd: bytes, idempotent: bool = True) -> bytes:
+        """
+        write the command, wait for its notification and check the status
+        (failed attempts are retried according to the retry policy, requires a session)
+        """
+        self._yield_to_higher_priority()
+        rtt_key = '0x%02x' % opcode(cmd)
+
+        def exchange():
+            if self.rtt is not None:
+                timeout_sec = self.rtt.timeout(rtt_key)
+            elif self.retry_policy is not None:
+                timeout_sec = self.retry_policy.timeout_sec
+            else:
+                timeout_sec = 5
+            t_write = time.perf_counter()
+            try:
+                value = self._write_cmd_and_wait_for_notification(
+                    handle=CMD_HANDLE, cmd=cmd, notification_timeout_sec=timeout_sec)
+            except NotificationTimeout:
+                if self.rtt is not None:
+                    self.rtt.observe_timeout(rtt_key)
+                raise
+            if self.rtt is not None:
+                self.rtt.observe(time.perf_counter() - t_write, rtt_key)
+            return value
+
+        def attempt():
+            # reconnects if a failed attempt dropped the connection
+            self._ensure_connected()
+            try:
+                value = exchange()
+            except (NotificationTimeout, WriteError) as err:
+                if not (idempotent and self._lease is not None and self._lease.warm):
+                    raise
+                # the bot might have dropped the connection while it was idle in the pool
+                LOG.info("warm connection failed (%s): reconnect", str(err))
+                self._disconnect()
+                self._ensure_connected()
+                value = exchange()
+            if self._lease is not None:
+                self._lease.warm = False
+            self._handle_switchbot_status_msg(value=value)
+            return value
+
+        return self._with_circuit_breaker(attempt, idempotent=idempotent)
+
+    def _command_at(self, operation: str, cmd: bytes, t: float, warmup_sec: float,
+                    idempotent: bool = True) -> 'TimedResult':
+        """
+        write the prepared command at the time t over a connection established warmup_sec
+        ahead of t (or over a new connection at t if that fails)
+        """
+        # wait on the monotonic clock (not affected by adjustments of the system clock)
+        deadline = time.monotonic() + (t - time.time())
+        _sleep_until(deadline - warmup_sec)
+
+        prewarmed = False
+        try:
+            with self._session(operation=operation):
+                prewarmed = True
+                return self._write_at(cmd, t, deadline, idempotent=idempotent, prewarmed=True)
+        except SwitchbotError as err:
+            if prewarmed:
+                raise
+            LOG.warning("failed to connect ahead of time (%s): attempt without warm connection",
+                        str(err))
+
+        _sleep_until(deadline)
+        with self._session(operation=operation):
+            return self._write_at(cmd, t, deadline, idempotent=idempotent, prewarmed=False)
+
+    def _write_at(self, cmd: bytes, t: float, deadline: float, idempotent: bool,
+                  prewarmed: bool) -> 'TimedResult':
+        _sleep_until(deadline)
+        sent = time.time()
+        self._command(cmd, idempotent=idempotent)
+        result = TimedResult(target=t, sent=sent, completed=time.time(), prewarmed=prewarmed)
+        LOG.info("command sent %.1f ms after target (prewarmed=%s)",
+                 1000 * result.skew_sec, str(prewarmed))
+        self.metrics.observe('switchbot_deadline_skew_seconds', max(0.0, result.skew_sec))
+        return result
+
+    def _yield_to_higher_priority(self):
+        """
+        let waiting commands of a higher priority run before the next round-trip of this
+        command (over the connection of this command, which is kept for its next round-trip)
+        """
+        if self._uninterruptible or not self._session_lock.preempted():
+            return
+        LOG.debug("yield bot to commands of a higher priority")
+        state = (self._session_depth, self._session_owner)
+        self._session_depth, self._session_owner = 0, None
+        self._suspended += 1
+        try:
+            self._session_lock.yield_to_higher_priority()
+        finally:
+            self._suspended -= 1
+            self._session_depth, self._session_owner = state
+
+    def _with_circuit_breaker(self, func: Callable[[], Any], idempotent: bool = True,
+                              count_success: bool = True) -> Any:
+        """
+        call func with retries (see _with_retry()) unless the circuit is open and report
+        whether it reached the bot to the circuit breaker (only failures if not count_success)
+        """
+        breaker = self.circuit_breaker
+        if breaker is None:
+            return self._with_retry(func, idempotent=idempotent)
+
+        breaker.check()
+        try:
+            result = self._with_retry(func, idempotent=idempotent)
+        except SwitchbotError as err:
+            if err.switchbot_action_status in (None, ActionStatus.device_unreachable):
+                breaker.record_failure()
+            else:
+                # the bot replied
+                breaker.record_success()
+            raise
+        except BaseException:
+            # not a failure of the bot (e.g. an illegal argument), but the probe is over
+            breaker.release_probe()
+            raise
+        if count_success:
+            breaker.record_success()
+        else:
+            breaker.release_probe()
+        return result
+
+    def _with_retry(self, func: Callable[[], Any], idempotent: bool = True) -> Any:
+        """
+        call func and retry it according to the retry policy
+        (no retry is started after the deadline of the policy, counted from the first attempt)
+        """
+        policy = self.retry_policy
+        if policy is None:
+            return func()
+
+        deadline = time.monotonic() + policy.deadline_sec
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return func()
+            except SwitchbotError as err:
+                if not policy.should_retry(err, attempt=attempt, idempotent=idempotent):
+                    raise
+                delay = policy.backoff(attempt)
+                if time.monotonic() + delay >= deadline:
+                    raise
+                if err.switchbot_action_status is None:
+                    # a late notification must not be mistaken for the reply to the retry
+                    self._disconnect()
+                LOG.info("retry in %.2f sec (attempt %d failed: %s)", delay, attempt, str(err))
+                if self.metrics.enabled:
+                    if isinstance(err, NotificationTimeout):
+                        reason = 'timeout'
+                    elif isinstance(err, WriteError):
+                        reason = 'write'
+                    elif err.switchbot_action_status:
+                        reason = err.switchbot_action_status.name
+                    else:
+                        reason = 'connection'
+                    self.metrics.increment('switchbot_retries_total', labels={'reason': reason})
+                time.sleep(delay)
+
     def _write_cmd_and_wait_for_notification(self, handle, cmd, notification_timeout_sec=5):
         """
         utility method to write a command to the handle and wait for a notification,
@@ -432,18 +1020,22 @@ class Bot(object):
             raise ValueError("notifications must be activated")
         LOG.debug("handle: %s cmd: %s", str(hex(handle)), str(hexlify(cmd)))
 
+        t_start = time.perf_counter()
         try:
-            # trigger the notification
-            self.device.char_write_handle(handle=handle, value=cmd)
-
-            # wait for notification to return
-            _, value = notification_queue.get(timeout=notification_timeout_sec)
-
+            # trigger the notification and wait for it to return
+            value = self._channel.request(
+                write=lambda: self.device.char_write_handle(handle=handle, value=cmd),
+                timeout_sec=notification_timeout_sec)
+
+        except NotificationTimeout:
+            self.metrics.increment('switchbot_timeouts_total')
+            raise
         except pygatt.BLEError:
             LOG.exception("pygatt: failed to write cmd and wait for notification")
-            raise SwitchbotError(message="communication with ble device failed")
+            raise WriteError(message="communication with ble device failed")
 
 
+        self.metrics.observe('switchbot_notification_wait_seconds', time.perf_counter() - t_start)
         LOG.debug("handle: %s cmd: %s notification: %s",
                   str(hex(handle)), str(hexlify(cmd)), str(hexlify(value)))
         return value
@@ -452,9 +1044,119 @@ class Bot(object):
         """
         checks the status code of the value and raises an exception if the action did not complete
         """
+        if self.metrics.enabled:
+            try:
+                status = ActionStatus(value[0]).name
+            except ValueError:
+                status = 'unknown'
+            self.metrics.increment('switchbot_action_status_total', labels={'status': status})
+        check_status(value)
+
+
+class BotSnapshot(NamedTuple):
+    """full state of a bot (see Bot.snapshot())"""
+    mac: str
+    battery: int
+    firmware: float
+    n_timers: int
+    dual_state_mode: bool
+    inverse_direction: bool
+    hold_seconds: int
+    timers: List[BaseTimer]
+    time: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        snapshot = self._asdict()
+        snapshot['timers'] = [timer.to_dict(timer_id=i) for i, timer in enumerate(self.timers)]
+        return dict(snapshot)
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict())
+
+
+class TimedResult(NamedTuple):
+    """outcome of a command at a given time (see Bot.press_at()), times in sec since epoch"""
+    target: float
+    sent: float # the command was written
+    completed: float # the reply of the bot was received
+    prewarmed: bool # False if the connection had to be established at the target time
+
+    @property
+    def skew_sec(self) -> float:
+        """delay of the write with respect to the target time"""
+        return self.sent - self.target
+
+
+class BatchResult(NamedTuple):
+    """result of one step of a batch (error is None on success)"""
+    step: str
+    result: Any
+    error: Exception
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
 
-        status = value[0]
-        action_status = ActionStatus(status)
+class Batch(object):
+    """Sequence of Switchbot commands that is executed over a single connection."""
 
-        if action_status is not ActionStatus.complete:
-            raise SwitchbotError(message=action_status.msg(), switchbot_action_status=action_status)
+    def __init__(self, bot: Bot):
+        self.bot = bot
+        self._steps = []
+
+    def press(self) -> 'Batch':
+        return self._add('press')
+
+    def switch(self, switch_on: bool) -> 'Batch':
+        return self._add('switch', switch_on=switch_on)
+
+    def set_hold_time(self, sec: int) -> 'Batch':
+        return self._add('set_hold_time', sec=sec)
+
+    def set_mode(self, dual_state: bool, inverse: bool) -> 'Batch':
+        """note: resets all timers, i.e., set the mode before setting the timers"""
+        return self._add('set_mode', dual_state=dual_state, inverse=inverse)
+
+    def set_timer(self, timer: BaseTimer, idx: int, num_timer: int) -> 'Batch':
+        return self._add('set_timer', timer=timer, idx=idx, num_timer=num_timer)
+
+    def set_timers(self, timers: List[BaseTimer]) -> 'Batch':
+        return self._add('set_timers', timers=timers)
+
+    def sync_timers(self, timers: List[BaseTimer], current: List[BaseTimer] = None) -> 'Batch':
+        return self._add('sync_timers', timers=timers, current=current)
+
+    def sync_time(self) -> 'Batch':
+        return self._add('set_current_timestamp')
+
+    def get_settings(self) -> 'Batch':
+        return self._add('get_settings')
+
+    def get_timers(self, n_timers: int = 5) -> 'Batch':
+        return self._add('get_timers', n_timers=n_timers)
+
+    def execute(self, stop_on_error: bool = True) -> List[BatchResult]:
+        """
+        Execute the commands in order over one connection and return the result of every step.
+        With stop_on_error, the batch ends with the first failed step,
+        otherwise the remaining steps are executed (reconnecting if necessary).
+        """
+        LOG.info("execute batch: %d steps", len(self._steps))
+        results = []
+        with self.bot._session():
+            for name, kwargs in self._steps:
+                try:
+                    result = getattr(self.bot, name)(**kwargs)
+                except (SwitchbotError, ValueError) as err:
+                    LOG.warning("batch step %s failed: %s", name, str(err))
+                    results.append(BatchResult(step=name, result=None, error=err))
+                    if stop_on_error:
+                        break
+                else:
+                    results.append(BatchResult(step=name, result=result, error=None))
+        return results
+
+    def _add(self, name: str, **kwargs) -> 'Batch':
+        self._steps.append((name, kwargs))
+        return self
@@ -0,0 +1,243 @@
+"""
+Decode the status of Switchbots (battery, mode, state) from their BLE advertisements,
+i.e., without connecting to the bots.
+
+The bots broadcast service data (uuid 0x0d00 or 0xfd3d):
+    byte[0]: device type ('H' = 0x48 for the bot) in the last 7 bits
+    byte[1]: first bit = dual state mode, second bit = state (0 = on, 1 = off)
+    byte[2]: battery in the last 7 bits
+"""
+
+import logging
+import os
+import select
+import signal
+import subprocess
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+LOG = logging.getLogger('switchbot')
+
+SERVICE_DATA_UUIDS = (0x0d00, 0xfd3d)
+BOT_DEVICE_TYPE = 0x48
+
+
+class Advertisement(NamedTuple):
+    """a received BLE advertisement (data contains the raw AD structures)"""
+    mac: str
+    rssi: int
+    data: bytes
+    timestamp: float
+
+
+class BotStatus(NamedTuple):
+    """status of a bot as broadcast in its advertisement"""
+    mac: str
+    battery: int
+    dual_state_mode: bool
+    state: bool
+    rssi: int
+    last_seen: float
+
+    def to_dict(self):
+        return self._asdict()
+
+
+def parse_ad_structures(data: bytes) -> List[Tuple[int, bytes]]:
+    """split advertising data into a list of (AD type, value)"""
+    structures = []
+    i = 0
+    while i < len(data):
+        length = data[i]
+        if length == 0 or i + 1 + length > len(data):
+            break
+        structures.append((data[i+1], bytes(data[i+2:i+1+length])))
+        i += 1 + length
+    return structures
+
+def parse_service_data(data: bytes) -> Optional[bytes]:
+    """the switchbot service data of the advertising data (None if there is none)"""
+    for ad_type, value in parse_ad_structures(data):
+        # 0x16 = service data with 16-bit uuid (little endian)
+        if ad_type == 0x16 and len(value) >= 2:
+            uuid = int.from_bytes(value[:2], byteorder='little')
+            if uuid in SERVICE_DATA_UUIDS:
+                return value[2:]
+    return None
+
+def decode_advertisement(advertisement: Advertisement) -> Optional[BotStatus]:
+    """decode the status of a bot from the advertisement (None if it is not from a bot)"""
+    service_data = parse_service_data(advertisement.data)
+    if service_data is None or len(service_data) < 3:
+        return None
+    if service_data[0] & 127 != BOT_DEVICE_TYPE:
+        return None
+
+    dual_state_mode = bool(service_data[1] & 128)
+    return BotStatus(mac=advertisement.mac,
+                     battery=service_data[2] & 127,
+                     dual_state_mode=dual_state_mode,
+                     state=dual_state_mode and not service_data[1] & 64,
+                     rssi=advertisement.rssi,
+                     last_seen=advertisement.timestamp)
+
+
+class RecordedAdvertisementSource(object):
+    """Replays recorded advertisements (e.g., for tests)"""
+
+    def __init__(self, advertisements: Iterable[Advertisement]):
+        self.advertisements = list(advertisements)
+
+    def listen(self, timeout: float) -> Iterator[Advertisement]:
+        """yield the recorded advertisements (the timeout is ignored)"""
+        for advertisement in self.advertisements:
+            yield advertisement
+
+
+class HcidumpAdvertisementSource(object):
+    """
+    Receives advertisements by running an (active) 'hcitool lescan' and parsing the
+    raw output of 'hcidump' (both part of bluez, might require root privileges).
+    The scan is active because the bots send their service data in the scan response.
+    """
+
+    def __init__(self, hci_device: str = 'hci0'):
+        self.hci_device = hci_device
+
+    def listen(self, timeout: float) -> Iterator[Advertisement]:
+        """yield advertisements as they are received until the timeout (in sec) expires"""
+        scan = subprocess.Popen(['hcitool', '-i', self.hci_device, 'lescan', '--duplicates'],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        dump = subprocess.Popen(['hcidump', '-i', self.hci_device, '--raw'],
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        deadline = time.time() + timeout
+        try:
+            packet = []
+            for line in self._lines(dump.stdout, deadline):
+                if line.startswith('>') or line.startswith('<'):
+                    # new packet => the previous is complete
+                    yield from parse_hci_event(packet, timestamp=time.time())
+                    packet = []
+                    line = line[1:] if line.startswith('>') else ''
+                packet += line.split()
+            yield from parse_hci_event(packet, timestamp=time.time())
+        finally:
+            for process in (scan, dump):
+                # lescan has to be stopped with SIGINT to leave the adapter in a clean state
+                process.send_signal(signal.SIGINT)
+                try:
+                    process.wait(timeout=2)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+
+    @staticmethod
+    def _lines(stream, deadline: float) -> Iterator[str]:
+        buffer = b''
+        fd = stream.fileno()
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return
+            readable, _, _ = select.select([fd], [], [], remaining)
+            if not readable:
+                return
+            chunk = os.read(fd, 4096)
+            if not chunk:
+                return
+            buffer += chunk
+            *lines, buffer = buffer.split(b'\n')
+            for line in lines:
+                yield line.decode(errors='ignore')
+
+
+def parse_hci_event(packet: List[str], timestamp: float) -> Iterator[Advertisement]:
+    """parse the hex bytes of a HCI LE advertising report event (other packets are ignored)"""
+    try:
+        event = bytes(int(b, 16) for b in packet)
+    except ValueError:
+        return
+    # 0x04 = HCI event, 0x3e = LE meta event, 0x02 = LE advertising report
+    if len(event) < 5 or event[0] != 0x04 or event[1] != 0x3e or event[3] != 0x02:
+        return
+
+    i = 5
+    for _ in range(event[4]):
+        # event type, address type, address (little endian), data length, data, rssi
+        if i + 9 > len(event):
+            return
+        mac = ':'.join('%02X' % b for b in reversed(event[i+2:i+8]))
+        length = event[i+8]
+        data = event[i+9:i+9+length]
+        if i + 9 + length >= len(event):
+            return
+        rssi = int.from_bytes(event[i+9+length:i+10+length], byteorder='big', signed=True)
+        yield Advertisement(mac=mac, rssi=rssi, data=data, timestamp=timestamp)
+        i += 10 + length
+
+
+class PresenceMonitor(object):
+    """
+    Keeps an up-to-date table of the switchbots in range by continuously listening
+    for advertisements in a background thread. Bots that have not been seen for
+    expiry_sec are removed from the table.
+    """
+
+    def __init__(self, advertisement_source, expiry_sec: float = 60, window_sec: float = 10):
+        self.advertisement_source = advertisement_source
+        self.expiry_sec = expiry_sec
+        self.window_sec = window_sec
+        self._lock = threading.Lock()
+        self._table: Dict[str, BotStatus] = {}
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """start listening in the background"""
+        LOG.info("start presence monitor")
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='switchbot-presence', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """stop listening (returns after the current listening window at the latest)"""
+        LOG.info("stop presence monitor")
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.window_sec + 5)
+            self._thread = None
+
+    def present(self) -> Dict[str, BotStatus]:
+        """the latest status of all bots seen within the last expiry_sec"""
+        self._expire()
+        with self._lock:
+            return dict(self._table)
+
+    def update(self, bot_status: BotStatus):
+        with self._lock:
+            if bot_status.mac not in self._table:
+                LOG.info("bot appeared: %s", bot_status.mac)
+            self._table[bot_status.mac] = bot_status
+
+    def _expire(self):
+        limit = time.time() - self.expiry_sec
+        with self._lock:
+            for mac in [mac for mac, status in self._table.items() if status.last_seen < limit]:
+                LOG.info("bot disappeared: %s", mac)
+                del self._table[mac]
+
+    def _run(self):
+        while not self._stopped.is_set():
+            window_start = time.time()
+            try:
+                for advertisement in self.advertisement_source.listen(timeout=self.window_sec):
+                    if self._stopped.is_set():
+                        break
+                    bot_status = decode_advertisement(advertisement)
+                    if bot_status is not None:
+                        self.update(bot_status)
+            except OSError:
+                LOG.exception("presence monitor: failed to listen for advertisements")
+            self._expire()
+            # don't spin if the source returned early
+            self._stopped.wait(max(0, window_start + self.window_sec - time.time()))
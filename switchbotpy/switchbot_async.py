@@ -0,0 +1,327 @@
+"""
+asyncio interface to scan and control Switchbots via BLE.
+
+The blocking adapter calls (start, connect, subscribe, write) run in an executor,
+while waiting for the notification of a command only awaits a future that is resolved
+by the notification callback. Hence a single event loop can drive many bots concurrently.
+"""
+
+import asyncio
+import functools
+import logging
+import re
+import threading
+from binascii import hexlify
+from typing import Any, AsyncIterator, Dict, Iterable, List, Tuple
+
+import pygatt
+
+from switchbotpy.switchbot import Scanner
+from switchbotpy.switchbot_advertisement import BotStatus
+from switchbotpy.switchbot_cmd import (CMD_HANDLE, check_status, clear_timer_cmd, get_timer_cmd,
+                                      hold_time_cmd, mode_cmd, parse_settings, press_cmd,
+                                      set_timer_cmd, settings_cmd, switch_cmd, timestamp_cmd)
+from switchbotpy.switchbot_timer import BaseTimer, parse_timer_cmd
+from switchbotpy.switchbot_transport import gatttool_transport
+from switchbotpy.switchbot_util import (NotificationChannel, NotificationTimeout, SwitchbotError,
+                                       WriteError, password_crc)
+
+LOG = logging.getLogger('switchbot')
+
+# the loop of the running coroutine (get_running_loop() is new in python 3.7)
+_running_loop = getattr(asyncio, 'get_running_loop', asyncio.get_event_loop)
+
+
+class AsyncScanner(object):
+    """Switchbot Scanner class for asyncio (might require root privileges)"""
+
+    def __init__(self, adapter=None, advertisement_source=None, executor=None):
+        self._scanner = Scanner(adapter=adapter, advertisement_source=advertisement_source)
+        self._executor = executor
+
+    async def scan(self, known_dict=None) -> List[str]:
+        """Scan for available switchbots"""
+        loop = _running_loop()
+        return await loop.run_in_executor(self._executor, self._scanner.scan, known_dict)
+
+    async def scan_status(self, timeout: float = 5) -> Dict[str, BotStatus]:
+        """Decode the status of all switchbots in range from their advertisements"""
+        loop = _running_loop()
+        return await loop.run_in_executor(self._executor, self._scanner.scan_status, timeout)
+
+    async def find(self, macs: Iterable[str], timeout: float = 10) -> Dict[str, BotStatus]:
+        """Look for the given switchbots, returns early once all are found (see Scanner.find())"""
+        loop = _running_loop()
+        return await loop.run_in_executor(self._executor, self._scanner.find, macs, timeout)
+
+    async def scan_iter(self, timeout: float = 10) -> AsyncIterator[BotStatus]:
+        """Yield the switchbots as soon as they are seen (see Scanner.scan_iter())"""
+        loop = _running_loop()
+        found = asyncio.Queue()
+        done = object()
+        stopped = threading.Event()
+
+        def produce():
+            try:
+                for bot_status in self._scanner.scan_iter(timeout=timeout):
+                    if stopped.is_set():
+                        break
+                    loop.call_soon_threadsafe(found.put_nowait, bot_status)
+            finally:
+                loop.call_soon_threadsafe(found.put_nowait, done)
+
+        producer = loop.run_in_executor(self._executor, produce)
+        try:
+            while True:
+                bot_status = await found.get()
+                if bot_status is done:
+                    break
+                yield bot_status
+        finally:
+            # the consumer might stop early
+            stopped.set()
+        await producer
+
+
+def _set_result(future: asyncio.Future, value: bytes):
+    if not future.done():
+        future.set_result(value)
+
+
+class _AsyncSession(object):
+    """serializes the commands of a bot and provides a connected and subscribed device"""
+
+    def __init__(self, bot):
+        self._bot = bot
+
+    async def __aenter__(self):
+        lock = self._bot._get_lock()
+        await lock.acquire()
+        try:
+            await self._bot._ensure_connected()
+        except BaseException:
+            lock.release()
+            raise
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        try:
+            replied = (isinstance(exc_value, SwitchbotError) and
+                       exc_value.switchbot_action_status is not None)
+            if (exc_value is not None and not replied) or not self._bot._session_open:
+                # communication failure or cancelled command -> connection is not reusable
+                await self._bot._disconnect()
+        finally:
+            self._bot._lock.release()
+
+
+class AsyncBot(object):
+    """Switchbot class to control the bot from an asyncio event loop."""
+
+    def __init__(self, bot_id: int, mac: str, name: str, adapter=None, executor=None):
+
+        if not re.match(r"[0-9A-F]{2}(?:[-:][0-9A-F]{2}){5}$", mac):
+            raise ValueError("Illegal Mac Address: ", mac)
+
+        self.bot_id = bot_id
+        self.mac = mac
+        self.name = name
+
+        self.adapter = adapter if adapter is not None else gatttool_transport()
+        self.device = None
+        self.password = None
+        self.notification_activated = False
+
+        self._executor = executor
+        self._lock = None # created in the event loop of the first command (see _get_lock())
+        self._loop = None
+        self._channel = None
+        self._session_open = False
+        self._adapter_running = False
+
+        LOG.info("create async bot: id=%d mac=%s name=%s", self.bot_id, self.mac, self.name)
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def open(self):
+        """Open a session: keep the bot connected and subscribed until close() is called."""
+        LOG.info("open session")
+        async with self._get_lock():
+            self._session_open = True
+            await self._ensure_connected()
+
+    async def close(self):
+        """Close the session and disconnect from the Switchbot."""
+        LOG.info("close session")
+        async with self._get_lock():
+            self._session_open = False
+            await self._disconnect()
+
+    def encrypted(self, password: str):
+        """The Switchbot is configured with this password."""
+        LOG.info("use encrypted communication")
+        self.password = password_crc(password)
+
+    async def press(self):
+        """Press the Switchbot in the standard mode (see Bot.press())"""
+        LOG.info("press bot")
+        async with _AsyncSession(self):
+            await self._command(press_cmd(password=self.password))
+
+    async def switch(self, switch_on: bool):
+        """Switch the state of the Switchbot in the dual state mode (see Bot.switch())"""
+        LOG.info("switch bot on=%s", str(switch_on))
+        async with _AsyncSession(self):
+            await self._command(switch_cmd(switch_on=switch_on, password=self.password))
+
+    async def set_hold_time(self, sec: int):
+        """Set the hold time for the Switchbot in the standard mode (up to one minute)"""
+        LOG.info("set hold time: %d sec", sec)
+        if sec < 0 or sec > 60:
+            raise ValueError("hold time must be between [0, 60] seconds")
+        async with _AsyncSession(self):
+            await self._command(hold_time_cmd(sec=sec, password=self.password))
+
+    async def set_mode(self, dual_state: bool, inverse: bool):
+        """Change the switchbot mode, resets all timers (see Bot.set_mode())"""
+        LOG.info("setting mode: dual_state=%s  inverse=%s", str(dual_state), str(inverse))
+        async with _AsyncSession(self):
+            await self._set_timers(timers=[])
+            await self._command(mode_cmd(dual_state=dual_state, inverse=inverse,
+                                         password=self.password))
+
+    async def set_current_timestamp(self):
+        """Sync the timestamps for the timers."""
+        LOG.info("setting current timestamp")
+        async with _AsyncSession(self):
+            await self._command(timestamp_cmd(password=self.password))
+
+    async def get_settings(self) -> Dict[str, Any]:
+        """Get the Switchbot settings (see Bot.get_settings())"""
+        LOG.info("get settings")
+        async with _AsyncSession(self):
+            value = await self._command(settings_cmd(password=self.password))
+        return parse_settings(value)
+
+    async def get_timer(self, idx: int) -> Tuple[BaseTimer, int]:
+        """Get the configured timer with index idx and the number of timers."""
+        LOG.info("get timer: %d", idx)
+        async with _AsyncSession(self):
+            value = await self._command(get_timer_cmd(idx=idx, password=self.password))
+        return parse_timer_cmd(value)
+
+    async def get_timers(self, n_timers: int = 5) -> List[BaseTimer]:
+        """Get the configured Switchbot timers"""
+        LOG.info("get timers")
+        async with _AsyncSession(self):
+            timers = []
+            for i in range(0, n_timers):
+                value = await self._command(get_timer_cmd(idx=i, password=self.password))
+                timer, _ = parse_timer_cmd(value)
+                if timer is None:
+                    # timer not set => all later also not set
+                    break
+                timers.append(timer)
+        return timers
+
+    async def set_timer(self, timer: BaseTimer, idx: int, num_timer: int):
+        """Configure Switchbot timer."""
+        LOG.info("set timer: %d", idx)
+        if idx < 0 or idx > 4 or num_timer <= idx or num_timer < 1 or num_timer > 5:
+            raise ValueError("Illegal Timer Idx or Number of Timers")
+        async with _AsyncSession(self):
+            await self._command(set_timer_cmd(timer=timer, idx=idx, num_timer=num_timer,
+                                              password=self.password))
+
+    async def set_timers(self, timers: List[BaseTimer]):
+        """Configure multiple Switchbot timers."""
+        LOG.info("set timers")
+        async with _AsyncSession(self):
+            await self._set_timers(timers=timers)
+
+    async def _set_timers(self, timers: List[BaseTimer]):
+        num_timer = len(timers)
+        for i, timer in enumerate(timers):
+            await self._command(set_timer_cmd(timer=timer, idx=i, num_timer=num_timer,
+                                              password=self.password))
+        for i in range(num_timer, 5):
+            await self._command(clear_timer_cmd(idx=i, num_timer=num_timer, password=self.password))
+
+    def _get_lock(self) -> asyncio.Lock:
+        """
+        the lock that serializes the commands of the bot, created by the first command
+        (before python 3.9, a lock is bound to the event loop that is current at its creation)
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def _run(self, func, *args, **kwargs):
+        """runs a blocking adapter call in the executor"""
+        loop = _running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def _ensure_connected(self):
+        if self.notification_activated:
+            return
+        self._loop = _running_loop()
+        uuid = "cba20003-224d-11e6-9fb8-0002a5d5c51b"
+        try:
+            self._adapter_running = True
+            await self._run(self.adapter.start)
+            self.device = await self._run(self.adapter.connect, self.mac,
+                                          address_type=pygatt.BLEAddressType.random)
+            self._channel = NotificationChannel()
+            await self._run(self.device.subscribe, uuid, callback=self._channel.handle_notification)
+            self.notification_activated = True
+        except pygatt.BLEError:
+            LOG.exception("pygatt: failed to connect to ble device")
+            await self._disconnect()
+            raise SwitchbotError(message="communication with ble device failed")
+        except BaseException:
+            await self._disconnect()
+            raise
+
+    async def _disconnect(self):
+        self.notification_activated = False
+        if self._channel is not None:
+            # late notifications of this connection must not reach later commands
+            self._channel.close()
+            self._channel = None
+        self.device = None
+        if self._adapter_running:
+            self._adapter_running = False
+            await self._run(self.adapter.stop)
+
+    async def _command(self, cmd: bytes, notification_timeout_sec: float = 5) -> bytes:
+        """write the command, wait for the notification and check its status"""
+        LOG.debug("handle: %s cmd: %s", str(hex(CMD_HANDLE)), str(hexlify(cmd)))
+        reply = self._loop.create_future()
+        # the notification arrives on the thread of the adapter -> resolve in the event loop
+        seq = self._channel.expect(
+            lambda value: self._loop.call_soon_threadsafe(_set_result, reply, value))
+        replied = False
+        try:
+            await self._run(self.device.char_write_handle, handle=CMD_HANDLE, value=cmd)
+            value = await asyncio.wait_for(reply, notification_timeout_sec)
+            replied = True
+        except pygatt.BLEError:
+            LOG.exception("pygatt: failed to write cmd and wait for notification")
+            raise WriteError(message="communication with ble device failed")
+        except asyncio.TimeoutError:
+            raise NotificationTimeout(message="no notification from ble device")
+        finally:
+            self._channel.cancel(seq)
+            if not replied:
+                # failed or cancelled (e.g. by the caller): a late reply must not answer
+                # the next command
+                self._channel.close()
+
+        LOG.debug("handle: %s cmd: %s notification: %s",
+                  str(hex(CMD_HANDLE)), str(hexlify(cmd)), str(hexlify(value)))
+        check_status(value)
+        return value
@@ -0,0 +1,132 @@
+"""
+Caches to avoid BLE round-trips:
+- identification cache: remembers which devices are switchbots (on disk, shared between scans)
+- read cache: settings and timers read from a bot (in memory, per bot)
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from enum import Enum
+from typing import Any, Callable, Dict, Optional
+
+LOG = logging.getLogger('switchbot')
+
+
+class Verdict(Enum):
+    switchbot = 'switchbot'
+    other = 'other'
+    unreachable = 'unreachable'
+
+
+class IdentificationCache(object):
+    """
+    On-disk cache of mac -> verdict (switchbot / not a switchbot / unreachable).
+    Each verdict expires after its ttl, unreachable devices are retried soonest.
+    """
+
+    def __init__(self, path: str = None, ttl_sec: float = 30 * 24 * 3600,
+                 negative_ttl_sec: float = 7 * 24 * 3600, unreachable_ttl_sec: float = 3600):
+        if path is None:
+            path = os.path.join(os.path.expanduser('~'), '.cache', 'switchbotpy',
+                                'identification.json')
+        self.path = path
+        self.ttls = {Verdict.switchbot: ttl_sec,
+                     Verdict.other: negative_ttl_sec,
+                     Verdict.unreachable: unreachable_ttl_sec}
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    def get(self, mac: str) -> Optional[Verdict]:
+        """the cached verdict for the device (None if unknown or expired)"""
+        with self._lock:
+            entry = self._entries.get(mac)
+        if entry is None:
+            return None
+        verdict = Verdict(entry['verdict'])
+        if time.time() - entry['time'] > self.ttls[verdict]:
+            return None
+        return verdict
+
+    def put(self, mac: str, verdict: Verdict):
+        with self._lock:
+            self._entries[mac] = {'verdict': verdict.value, 'time': time.time()}
+
+    def save(self):
+        """write the cache to disk (atomically), expired entries are removed"""
+        now = time.time()
+        with self._lock:
+            entries = {mac: entry for mac, entry in self._entries.items()
+                       if now - entry['time'] <= self.ttls[Verdict(entry['verdict'])]}
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump(entries, file)
+        os.replace(tmp_path, self.path)
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as file:
+                entries = json.load(file)
+            for entry in entries.values():
+                Verdict(entry['verdict'])
+        except FileNotFoundError:
+            entries = {}
+        except (ValueError, KeyError, TypeError, AttributeError):
+            LOG.warning("ignore corrupt identification cache: %s", self.path)
+            entries = {}
+        return entries
+
+
+class ReadCache(object):
+    """
+    Per-bot cache of the values read from the bot ('settings' and 'timers').
+    Entries expire after their ttl and are updated or invalidated by the writes of the bot.
+    """
+
+    def __init__(self, settings_ttl_sec: float = 60, timers_ttl_sec: float = 300):
+        self.ttls = {'settings': settings_ttl_sec, 'timers': timers_ttl_sec}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, key: str) -> Optional[Any]:
+        """the cached value (None if missing or expired)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[1] > self.ttls[key]:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, value: Any):
+        with self._lock:
+            self._entries[key] = (value, time.time())
+
+    def update(self, key: str, func: Callable[[Any], None]):
+        """apply the (in-place) change of a write to the cached value, if there is one"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                func(entry[0])
+
+    def invalidate(self, key: str = None):
+        """remove the entry (all entries if key is None)"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries)}
@@ -0,0 +1,84 @@
+"""
+Switchbot BLE commands (written to handle 0x16) and parsing of the notifications (see README).
+The optional password is the crc32 checksum of the password in 4 bytes (see Bot.encrypted()).
+"""
+
+import time
+from typing import Any, Dict
+
+from switchbotpy.switchbot_timer import BaseTimer, delete_timer_cmd
+from switchbotpy.switchbot_util import ActionStatus, SwitchbotError
+
+CMD_HANDLE = 0x16
+
+
+def _base(cmd: int, password: bytes = None):
+    # the encrypted variant of a command sets the 0x10 bit and is followed by the password
+    if password:
+        return bytes((0x57, cmd | 0x10)) + password
+    return bytes((0x57, cmd))
+
+def opcode(cmd: bytes) -> int:
+    """the command without the encryption bit (e.g. 0x01 for press and switch)"""
+    return cmd[1] & ~0x10
+
+def press_cmd(password: bytes = None) -> bytes:
+    return _base(0x01, password)
+
+def switch_cmd(switch_on: bool, password: bytes = None) -> bytes:
+    if switch_on:
+        return _base(0x01, password) + b'\x01'
+    return _base(0x01, password) + b'\x02'
+
+def hold_time_cmd(sec: int, password: bytes = None) -> bytes:
+    return _base(0x0f, password) + b'\x08' + sec.to_bytes(1, byteorder='big')
+
+def mode_cmd(dual_state: bool, inverse: bool, password: bytes = None) -> bytes:
+    config = 0
+    if dual_state:
+        config += 16
+    if inverse:
+        config += 1
+    return _base(0x03, password) + b'\x64' + config.to_bytes(1, byteorder='big')
+
+def settings_cmd(password: bytes = None) -> bytes:
+    return _base(0x02, password)
+
+def get_timer_cmd(idx: int, password: bytes = None) -> bytes:
+    return _base(0x08, password) + (idx * 16 + 3).to_bytes(1, byteorder='big')
+
+def set_timer_cmd(timer: BaseTimer, idx: int, num_timer: int, password: bytes = None) -> bytes:
+    return _base(0x09, password) + timer.to_cmd(idx=idx, num_timer=num_timer)
+
+def clear_timer_cmd(idx: int, num_timer: int, password: bytes = None) -> bytes:
+    return _base(0x09, password) + delete_timer_cmd(idx=idx, num_timer=num_timer)
+
+def timestamp_cmd(password: bytes = None, time_sec_utc: float = None) -> bytes:
+    """sync the timers with the local time (the bot has no notion of time zones)"""
+    if time_sec_utc is None:
+        time_sec_utc = time.time()
+    time_local = time.localtime(time_sec_utc)
+    offset = time_local.tm_gmtoff
+    timestamp = int(time_sec_utc + offset)
+    return _base(0x09, password) + b'\x01' + timestamp.to_bytes(8, byteorder='big')
+
+def check_status(value: bytes):
+    """
+    checks the status code of the value and raises an exception if the action did not complete
+    """
+    action_status = ActionStatus(value[0])
+    if action_status is not ActionStatus.complete:
+        raise SwitchbotError(message=action_status.msg(), switchbot_action_status=action_status)
+
+def parse_settings(value: bytes) -> Dict[str, Any]:
+    settings = {}
+
+    settings["battery"] = value[1]
+    settings["firmware"] = value[2] / 10.0
+
+    settings["n_timers"] = value[8]
+    settings["dual_state_mode"] = bool(value[9] & 16)
+    settings["inverse_direction"] = bool(value[9] & 1)
+    settings["hold_seconds"] = value[10]
+
+    return settings
@@ -0,0 +1,147 @@
+"""
+Coalescing of concurrent identical commands to the same bot (see Bot.enable_coalescing()):
+- reads (e.g. get settings) that are issued while the same read of the bot is in flight
+  wait for it and share its result instead of doing their own BLE round-trip
+- writes of a state (e.g. switch on / off) that are queued behind a running write of the bot
+  collapse: only the latest desired state is written and all queued callers get its outcome
+
+Share one Coalescer between the Bot instances of a process to coalesce across them.
+"""
+
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+
+from switchbotpy.switchbot_metrics import NULL_METRICS, Metrics
+
+Key = Tuple[str, Tuple[Hashable, ...]]
+
+
+class _Call(object):
+    """a caller waiting for the outcome of a (shared) round-trip"""
+
+    __slots__ = ('finished', 'result', 'error', 'lead')
+
+    def __init__(self):
+        self.finished = False
+        self.result = None
+        self.error = None
+        self.lead = False
+
+    def finish(self, result: Any, error: BaseException):
+        self.finished = True
+        self.result = result
+        self.error = error
+
+    def outcome(self) -> Any:
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class _Writes(object):
+    """the latest queued state of a write and the callers waiting for it"""
+
+    __slots__ = ('value', 'calls', 'running')
+
+    def __init__(self):
+        self.value = None
+        self.calls: List[_Call] = []
+        self.running = False
+
+
+class Coalescer(object):
+    """In-flight table of the reads and writes of bots keyed by (mac, command)."""
+
+    def __init__(self, metrics: Metrics = None):
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+        self._cond = threading.Condition()
+        self._reads: Dict[Key, _Call] = {}
+        self._writes: Dict[Key, _Writes] = {}
+        self.coalesced_reads = 0
+        self.coalesced_writes = 0
+
+    def read(self, mac: str, command: Tuple[Hashable, ...], func: Callable[[], Any]) -> Any:
+        """
+        the result of func() or of the identical read that is in flight
+        (command: name and arguments of the read, e.g. ('get_timers', 5))
+        """
+        key = (mac, command)
+        with self._cond:
+            flight = self._reads.get(key)
+            if flight is not None:
+                self.coalesced_reads += 1
+                self._count(command)
+                while not flight.finished:
+                    self._cond.wait()
+                return flight.outcome()
+            flight = self._reads[key] = _Call()
+
+        result, error = None, None
+        try:
+            result = func()
+        except BaseException as err:
+            error = err
+            raise
+        finally:
+            with self._cond:
+                del self._reads[key]
+                flight.finish(result, error)
+                self._cond.notify_all()
+        return result
+
+    def write_latest(self, mac: str, command: Tuple[Hashable, ...], value: Any,
+                     func: Callable[[Any], Any]) -> Any:
+        """
+        func(value) unless a later write of the same command is queued before this one
+        starts: then only the latest value is written and its outcome is returned
+        (command: name of the write, e.g. ('switch',))
+        """
+        key = (mac, command)
+        call = _Call()
+        with self._cond:
+            writes = self._writes.get(key)
+            if writes is None:
+                writes = self._writes[key] = _Writes()
+            writes.value = value
+            writes.calls.append(call)
+            if not writes.running:
+                writes.running = True
+                call.lead = True
+            while not call.lead and not call.finished:
+                self._cond.wait()
+            if call.finished:
+                return call.outcome()
+            # write the latest value for all callers queued so far
+            value, calls = writes.value, writes.calls
+            writes.calls = []
+            if len(calls) > 1:
+                self.coalesced_writes += len(calls) - 1
+                self._count(command, len(calls) - 1)
+
+        result, error = None, None
+        try:
+            result = func(value)
+        except BaseException as err:
+            error = err
+        finally:
+            with self._cond:
+                for queued in calls:
+                    queued.finish(result, error)
+                if writes.calls:
+                    # the next queued caller writes the latest value of the queue
+                    writes.calls[0].lead = True
+                else:
+                    del self._writes[key]
+                self._cond.notify_all()
+        return call.outcome()
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {'coalesced_reads': self.coalesced_reads,
+                    'coalesced_writes': self.coalesced_writes,
+                    'reads_in_flight': len(self._reads),
+                    'writes_in_flight': len(self._writes)}
+
+    def _count(self, command: Tuple[Hashable, ...], value: int = 1):
+        self.metrics.increment('switchbot_coalesced_total', value,
+                               labels={'operation': str(command[0])})
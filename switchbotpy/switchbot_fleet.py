@@ -0,0 +1,127 @@
+"""
+Control a fleet of Switchbots:
+operations are dispatched to all bots in parallel with a bounded number of workers
+and a limit on the number of concurrent connections per BLE adapter (hci device).
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Tuple, Union
+
+from switchbotpy.switchbot import Bot
+from switchbotpy.switchbot_metrics import Metrics
+from switchbotpy.switchbot_pool import AdapterPool
+from switchbotpy.switchbot_retry import CircuitBreaker, RetryPolicy
+from switchbotpy.switchbot_timer import BaseTimer
+from switchbotpy.switchbot_transport import gatttool_transport
+from switchbotpy.switchbot_util import CircuitOpenError
+
+LOG = logging.getLogger('switchbot')
+
+
+class FleetResult(NamedTuple):
+    """result of an operation on one bot of the fleet (error is None on success)"""
+    mac: str
+    result: Any
+    error: Exception
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class Fleet(object):
+    """Run operations on many Switchbots in parallel."""
+
+    def __init__(self, entries: List[Tuple[str, str]], max_workers: int = 8,
+                 per_adapter_limit: int = 4, hci_devices: List[str] = None,
+                 adapter_factory: Callable[[str], Any] = None, metrics: Metrics = None,
+                 retry_policy: RetryPolicy = None, circuit_breaker_threshold: int = None,
+                 circuit_breaker_reset_sec: float = 30, pool: AdapterPool = None):
+        """
+        entries: list of (mac, password) of the bots (password is None for unencrypted bots)
+        max_workers: maximum number of bots that are operated on at the same time
+        per_adapter_limit: maximum number of concurrent connections per hci device
+        hci_devices: BLE adapters to distribute the bots on (default: hci0)
+        adapter_factory: creates the adapter of a bot given the hci device
+        metrics: sink for the metrics of all bots (see switchbot_metrics)
+        retry_policy: retry failed commands of the bots (see Bot.enable_retry())
+        circuit_breaker_threshold: skip bots after this many consecutive failures until
+                                   circuit_breaker_reset_sec passed (see Bot.enable_circuit_breaker())
+        pool: the bots borrow adapters and connections from the pool instead of
+              using adapters of the adapter_factory (see switchbot_pool)
+        """
+
+        if hci_devices is None:
+            hci_devices = ['hci0']
+        if adapter_factory is None:
+            adapter_factory = gatttool_transport
+
+        self.max_workers = max_workers
+        self.bots: Dict[str, Bot] = {}
+
+        self._hci_devices: Dict[str, str] = {}
+        self._limits = {hci: threading.BoundedSemaphore(per_adapter_limit) for hci in hci_devices}
+
+        for i, (mac, password) in enumerate(entries):
+            hci_device = hci_devices[i % len(hci_devices)]
+            adapter = adapter_factory(hci_device) if pool is None else None
+            bot = Bot(bot_id=i, mac=mac, name=mac, adapter=adapter, metrics=metrics, pool=pool)
+            if password:
+                bot.encrypted(password)
+            if retry_policy is not None:
+                bot.enable_retry(retry_policy)
+            if circuit_breaker_threshold is not None:
+                bot.enable_circuit_breaker(failure_threshold=circuit_breaker_threshold,
+                                           reset_timeout_sec=circuit_breaker_reset_sec)
+            self.bots[mac] = bot
+            self._hci_devices[mac] = hci_device
+
+        LOG.info("create fleet: %d bots on %d adapters", len(self.bots), len(hci_devices))
+
+    def run(self, operation: Union[str, Callable[[Bot], Any]], *args, **kwargs) -> Iterator[FleetResult]:
+        """
+        Run the operation on all bots and yield the results as they complete.
+        The operation is either the name of a Bot method (called with args and kwargs)
+        or a callable that receives the bot.
+        """
+        LOG.info("fleet run: %s", str(operation))
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(self._run_bot, mac, operation, args, kwargs)
+                       for mac in self.bots]
+            for future in as_completed(futures):
+                yield future.result()
+
+    def press(self) -> Iterator[FleetResult]:
+        """Press all bots."""
+        return self.run('press')
+
+    def switch(self, switch_on: bool) -> Iterator[FleetResult]:
+        """Switch all bots (dual state mode)."""
+        return self.run('switch', switch_on=switch_on)
+
+    def get_settings(self) -> Iterator[FleetResult]:
+        """Get the settings of all bots."""
+        return self.run('get_settings')
+
+    def set_timers(self, timers: List[BaseTimer]) -> Iterator[FleetResult]:
+        """Configure the same timers on all bots."""
+        return self.run('set_timers', timers=timers)
+
+    def _run_bot(self, mac: str, operation, args, kwargs) -> FleetResult:
+        bot = self.bots[mac]
+        if bot.circuit_breaker is not None and bot.circuit_breaker.state == CircuitBreaker.open:
+            # fail fast without waiting for a connection slot of the adapter
+            return FleetResult(mac=mac, result=None,
+                               error=CircuitOpenError(message="circuit open: bot failed repeatedly"))
+        with self._limits[self._hci_devices[mac]]:
+            try:
+                if callable(operation):
+                    result = operation(bot)
+                else:
+                    result = getattr(bot, operation)(*args, **kwargs)
+            except Exception as err: # pylint: disable=broad-except
+                LOG.warning("fleet: %s failed on bot %s: %s", str(operation), mac, str(err))
+                return FleetResult(mac=mac, result=None, error=err)
+        return FleetResult(mac=mac, result=result, error=None)
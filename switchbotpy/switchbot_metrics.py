@@ -0,0 +1,169 @@
+"""
+Metrics of the BLE operations (counters, gauges and histograms) reported to a pluggable sink.
+
+Bot and Scanner report to the null sink unless a sink is passed as metrics=...:
+    metrics = InMemoryMetrics()
+    bot = Bot(bot_id=0, mac=mac, name=name, metrics=metrics)
+    ...
+    print(prometheus_text(metrics))
+
+Reported metrics:
+    switchbot_operations_total{operation, outcome}      counter (ok / error / circuit_open)
+    switchbot_operation_seconds{operation}              histogram
+    switchbot_connect_seconds                           histogram (adapter start + connect + subscribe)
+    switchbot_notification_wait_seconds                 histogram (write until notification)
+    switchbot_timeouts_total                            counter (no notification in time)
+    switchbot_retries_total{reason}                     counter (see RetryPolicy)
+    switchbot_action_status_total{status}               counter
+    switchbot_scan_seconds{kind}                        histogram
+    switchbot_scan_devices{kind}                        gauge (devices of the last scan)
+"""
+
+import bisect
+import threading
+from typing import Dict, List, Tuple
+
+# upper bounds (in sec) of the histogram buckets, BLE round-trips take 10 ms to seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+DESCRIPTIONS = {
+    'switchbot_operations_total': "number of bot operations by outcome",
+    'switchbot_operation_seconds': "duration of bot operations",
+    'switchbot_connect_seconds': "duration of adapter start, connect and subscribe",
+    'switchbot_notification_wait_seconds': "time between writing a command and its notification",
+    'switchbot_timeouts_total': "number of commands without notification",
+    'switchbot_retries_total': "number of retried commands by reason",
+    'switchbot_action_status_total': "number of replies by action status",
+    'switchbot_scan_seconds': "duration of scans",
+    'switchbot_scan_devices': "number of devices found by the last scan",
+    'switchbot_coalesced_total': "number of calls served by the round-trip of another call",
+    'switchbot_queue_wait_seconds': "time commands waited for their bot by priority",
+    'switchbot_deadline_skew_seconds': "delay of commands at a given time (press_at, switch_at)",
+}
+
+Labels = Dict[str, str]
+
+
+class Metrics(object):
+    """
+    Metrics sink interface, this base class discards everything (null sink).
+    Instrumented code checks `enabled` before computing expensive values.
+    """
+
+    enabled = False
+
+    def increment(self, name: str, value: float = 1, labels: Labels = None):
+        """increase the counter"""
+
+    def observe(self, name: str, value: float, labels: Labels = None):
+        """add the value to the histogram"""
+
+    def set(self, name: str, value: float, labels: Labels = None):
+        """set the gauge"""
+
+
+NULL_METRICS = Metrics()
+
+
+class InMemoryMetrics(Metrics):
+    """Keeps all counters, gauges and histograms in memory (thread-safe)"""
+
+    enabled = True
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self.counters: Dict[Tuple[str, tuple], float] = {}
+        self.gauges: Dict[Tuple[str, tuple], float] = {}
+        # histogram: per bucket count (non-cumulative, last = +Inf), sum
+        self.histograms: Dict[Tuple[str, tuple], Tuple[List[int], List[float]]] = {}
+
+    def increment(self, name: str, value: float = 1, labels: Labels = None):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, labels: Labels = None):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = ([0] * (len(self.buckets) + 1), [0.0])
+                self.histograms[key] = histogram
+            histogram[0][bisect.bisect_left(self.buckets, value)] += 1
+            histogram[1][0] += value
+
+    def set(self, name: str, value: float, labels: Labels = None):
+        with self._lock:
+            self.gauges[(name, _label_key(labels))] = value
+
+    def counter(self, name: str, labels: Labels = None) -> float:
+        """the value of the counter (0 if it was never incremented)"""
+        with self._lock:
+            return self.counters.get((name, _label_key(labels)), 0)
+
+    def histogram(self, name: str, labels: Labels = None) -> Dict[str, float]:
+        """count and sum of the histogram"""
+        with self._lock:
+            histogram = self.histograms.get((name, _label_key(labels)))
+            if histogram is None:
+                return {'count': 0, 'sum': 0.0}
+            return {'count': sum(histogram[0]), 'sum': histogram[1][0]}
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+
+
+def _label_key(labels: Labels) -> tuple:
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _format_labels(label_key: tuple, extra: Tuple[str, str] = None) -> str:
+    items = list(label_key) + ([extra] if extra else [])
+    if not items:
+        return ''
+    return '{' + ','.join('%s="%s"' % (key, _escape(value)) for key, value in items) + '}'
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def prometheus_text(metrics: InMemoryMetrics) -> str:
+    """the metrics in the Prometheus text exposition format (version 0.0.4)"""
+    with metrics._lock:
+        counters = dict(metrics.counters)
+        gauges = dict(metrics.gauges)
+        histograms = {key: (list(counts), total[0])
+                      for key, (counts, total) in metrics.histograms.items()}
+
+    lines = []
+    for kind, values in (('counter', counters), ('gauge', gauges), ('histogram', histograms)):
+        for name in sorted({name for name, _ in values}):
+            if name in DESCRIPTIONS:
+                lines.append('# HELP %s %s' % (name, DESCRIPTIONS[name]))
+            lines.append('# TYPE %s %s' % (name, kind))
+            for key in sorted(key for key in values if key[0] == name):
+                label_key = key[1]
+                if kind != 'histogram':
+                    lines.append('%s%s %s' % (name, _format_labels(label_key),
+                                              _format_value(values[key])))
+                    continue
+                counts, total = values[key]
+                cumulative = 0
+                for bound, count in zip(metrics.buckets + (float('inf'),), counts):
+                    cumulative += count
+                    lines.append('%s_bucket%s %d' % (
+                        name, _format_labels(label_key, ('le', _format_value(bound))), cumulative))
+                lines.append('%s_sum%s %s' % (name, _format_labels(label_key), repr(total)))
+                lines.append('%s_count%s %d' % (name, _format_labels(label_key), cumulative))
+    return '\n'.join(lines) + '\n'
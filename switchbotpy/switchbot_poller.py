@@ -0,0 +1,307 @@
+"""
+Background polling of the settings and timers of many bots that reports changes
+(battery dropped, mode changed, timers changed, ...) instead of full snapshots.
+
+The polling interval of every bot adapts to how often its values change: it is halved
+after a change and grows after every poll without change (between min and max interval).
+Bots with a low battery are polled less often, unreachable bots back off.
+Polls are spread over time (random start and jitter) and run with background priority
+(see Bot.priority()).
+
+    poller = Poller(bots, min_interval_sec=60, max_interval_sec=3600)
+    poller.start()
+    for event in poller.events():
+        print(event.to_dict())
+"""
+
+import heapq
+import logging
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+from switchbotpy.switchbot import Bot
+from switchbotpy.switchbot_priority import Priority
+from switchbotpy.switchbot_timer import BaseTimer
+from switchbotpy.switchbot_util import SwitchbotError
+
+LOG = logging.getLogger('switchbot')
+
+
+class Change(Enum):
+    battery_dropped = 'battery_dropped'
+    battery_increased = 'battery_increased' # e.g. battery replaced
+    mode_changed = 'mode_changed'
+    hold_time_changed = 'hold_time_changed'
+    firmware_changed = 'firmware_changed'
+    timers_changed = 'timers_changed'
+    unreachable = 'unreachable'
+    reachable = 'reachable'
+
+
+class ChangeEvent(NamedTuple):
+    """a change of a bot between two polls (time in sec since epoch)"""
+    mac: str
+    change: Change
+    old: Any
+    new: Any
+    time: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = self._asdict()
+        d['change'] = self.change.value
+        if self.change == Change.timers_changed:
+            d['old'] = [timer.to_dict(timer_id=i) for i, timer in enumerate(self.old)]
+            d['new'] = [timer.to_dict(timer_id=i) for i, timer in enumerate(self.new)]
+        return dict(d)
+
+
+class _BotState(object):
+    """what the poller knows about a bot"""
+
+    __slots__ = ('bot', 'settings', 'timers', 'reachable', 'interval', 'next_poll',
+                 'last_poll', 'polls', 'changes', 'failures')
+
+    def __init__(self, bot: Bot, interval: float):
+        self.bot = bot
+        self.settings: Optional[Dict[str, Any]] = None
+        self.timers: Optional[List[BaseTimer]] = None
+        self.reachable = True
+        self.interval = interval
+        self.next_poll = None
+        self.last_poll = None
+        self.polls = 0
+        self.changes = 0
+        self.failures = 0
+
+
+def _timers_key(timers: List[BaseTimer]) -> List[bytes]:
+    return [timer.to_cmd(idx=i, num_timer=len(timers)) for i, timer in enumerate(timers)]
+
+
+class Poller(object):
+    """Polls bots in the background with adaptive intervals and emits change events."""
+
+    def __init__(self, bots: Iterable[Bot], min_interval_sec: float = 60,
+                 max_interval_sec: float = 3600, initial_interval_sec: float = 300,
+                 growth: float = 1.5, low_battery: int = 20, low_battery_factor: float = 2,
+                 timers_every: int = 4, jitter: float = 0.2, max_workers: int = 2,
+                 on_event: Callable[[ChangeEvent], None] = None, seed: int = None):
+        """
+        growth: factor of the interval after a poll without change
+        low_battery: bots with a battery below (in %) are polled low_battery_factor times less often
+        timers_every: the timers are read every n-th poll (and whenever their number changed),
+                      0 = never
+        jitter: the intervals vary randomly by up to this fraction (to spread the polls)
+        max_workers: maximum number of bots that are polled at the same time
+        on_event: called with every change event (in addition to events())
+        """
+        if min_interval_sec <= 0 or min_interval_sec > max_interval_sec:
+            raise ValueError("intervals must satisfy 0 < min_interval_sec <= max_interval_sec")
+        if jitter < 0 or jitter >= 1:
+            raise ValueError("jitter must be between [0, 1)")
+        self.min_interval_sec = min_interval_sec
+        self.max_interval_sec = max_interval_sec
+        self.growth = growth
+        self.low_battery = low_battery
+        self.low_battery_factor = low_battery_factor
+        self.timers_every = timers_every
+        self.jitter = jitter
+        self.max_workers = max_workers
+        self.on_event = on_event
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._events: queue.Queue = queue.Queue()
+        self._thread = None
+
+        initial_interval_sec = min(max(initial_interval_sec, min_interval_sec), max_interval_sec)
+        now = time.monotonic()
+        self._states: Dict[str, _BotState] = {}
+        self._schedule = [] # heap of (next poll, mac)
+        for bot in bots:
+            state = _BotState(bot, interval=initial_interval_sec)
+            # the first polls are spread over the minimum interval
+            state.next_poll = now + self._random.uniform(0, min_interval_sec)
+            self._states[bot.mac] = state
+            heapq.heappush(self._schedule, (state.next_poll, bot.mac))
+
+    def start(self):
+        """start polling in the background"""
+        LOG.info("start poller: %d bots", len(self._states))
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='switchbot-poller', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """stop polling (returns after the running polls)"""
+        LOG.info("stop poller")
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def events(self, timeout: float = None) -> Iterator[ChangeEvent]:
+        """the change events as they occur (until the poller is stopped or no event for timeout sec)"""
+        while True:
+            try:
+                event = self._events.get(timeout=timeout if timeout is not None else 1)
+            except queue.Empty:
+                if timeout is not None or self._stopped.is_set():
+                    return
+                continue
+            yield event
+
+    def poll(self, mac: str) -> List[ChangeEvent]:
+        """poll the bot now, returns its change events (which are also emitted)"""
+        state = self._states[mac]
+        now = time.time()
+        events = []
+        changed = failed = False
+        try:
+            with state.bot.priority(Priority.background):
+                settings = state.bot.get_settings()
+                timers = None
+                if self._read_timers(state, settings):
+                    n_timers = min(settings['n_timers'], 5)
+                    timers = state.bot.get_timers(n_timers=n_timers) if n_timers > 0 else []
+        except SwitchbotError as err:
+            LOG.warning("poller: failed to poll bot %s: %s", mac, str(err))
+            failed = True
+            with self._lock:
+                state.failures += 1
+                if state.reachable:
+                    state.reachable = False
+                    events.append(ChangeEvent(mac, Change.unreachable, True, False, now))
+        else:
+            with self._lock:
+                if not state.reachable:
+                    state.reachable = True
+                    events.append(ChangeEvent(mac, Change.reachable, False, True, now))
+                events += self._diff(mac, state, settings, timers, now)
+                changed = any(event.change != Change.reachable for event in events)
+                state.settings = settings
+                if timers is not None:
+                    state.timers = timers
+
+        with self._lock:
+            state.polls += 1
+            state.changes += int(changed)
+            state.last_poll = now
+            self._reschedule(state, changed=changed, failed=failed)
+        self._wakeup.set()
+
+        for event in events:
+            LOG.info("bot %s: %s", mac, event.change.value)
+            self._events.put(event)
+            if self.on_event is not None:
+                self.on_event(event)
+        return events
+
+    def poll_due(self) -> List[ChangeEvent]:
+        """poll all bots that are due now (for polling without the background thread)"""
+        events = []
+        for mac in self._pop_due():
+            events += self.poll(mac)
+        return events
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """the polling state of every bot"""
+        now = time.monotonic()
+        with self._lock:
+            return {mac: {'interval_sec': state.interval,
+                          'next_poll_in_sec': max(0.0, state.next_poll - now),
+                          'last_poll': state.last_poll, 'polls': state.polls,
+                          'changes': state.changes, 'failures': state.failures,
+                          'reachable': state.reachable,
+                          'battery': state.settings['battery'] if state.settings else None}
+                    for mac, state in self._states.items()}
+
+    def _read_timers(self, state: _BotState, settings: Dict[str, Any]) -> bool:
+        if not self.timers_every:
+            return False
+        return (state.timers is None or state.polls % self.timers_every == 0 or
+                settings['n_timers'] != state.settings['n_timers'])
+
+    @staticmethod
+    def _diff(mac: str, state: _BotState, settings: Dict[str, Any],
+              timers: Optional[List[BaseTimer]], now: float) -> List[ChangeEvent]:
+        events = []
+        old = state.settings
+        if old is not None:
+            if settings['battery'] < old['battery']:
+                events.append(ChangeEvent(mac, Change.battery_dropped,
+                                          old['battery'], settings['battery'], now))
+            elif settings['battery'] > old['battery']:
+                events.append(ChangeEvent(mac, Change.battery_increased,
+                                          old['battery'], settings['battery'], now))
+            old_mode = (old['dual_state_mode'], old['inverse_direction'])
+            mode = (settings['dual_state_mode'], settings['inverse_direction'])
+            if mode != old_mode:
+                events.append(ChangeEvent(mac, Change.mode_changed, old_mode, mode, now))
+            if settings['hold_seconds'] != old['hold_seconds']:
+                events.append(ChangeEvent(mac, Change.hold_time_changed,
+                                          old['hold_seconds'], settings['hold_seconds'], now))
+            if settings['firmware'] != old['firmware']:
+                events.append(ChangeEvent(mac, Change.firmware_changed,
+                                          old['firmware'], settings['firmware'], now))
+        if (timers is not None and state.timers is not None and
+                _timers_key(timers) != _timers_key(state.timers)):
+            events.append(ChangeEvent(mac, Change.timers_changed, state.timers, timers, now))
+        return events
+
+    def _reschedule(self, state: _BotState, changed: bool, failed: bool):
+        """adapt the interval of the bot and schedule its next poll (requires the lock)"""
+        if failed:
+            interval = state.interval * 2
+        elif changed:
+            interval = state.interval / 2
+        else:
+            interval = state.interval * self.growth
+        state.interval = min(self.max_interval_sec, max(self.min_interval_sec, interval))
+
+        delay = state.interval
+        if state.settings is not None and state.settings['battery'] < self.low_battery:
+            # every poll costs battery
+            delay *= self.low_battery_factor
+        delay *= 1 + self._random.uniform(-self.jitter, self.jitter)
+        state.next_poll = time.monotonic() + delay
+        heapq.heappush(self._schedule, (state.next_poll, state.bot.mac))
+
+    def _pop_due(self) -> List[str]:
+        now = time.monotonic()
+        due = []
+        with self._lock:
+            while self._schedule and self._schedule[0][0] <= now:
+                next_poll, mac = heapq.heappop(self._schedule)
+                # a poll() in between rescheduled the bot
+                if next_poll == self._states[mac].next_poll:
+                    due.append(mac)
+        return due
+
+    def _run(self):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while not self._stopped.is_set():
+                for mac in self._pop_due():
+                    executor.submit(self._poll_safe, mac)
+                with self._lock:
+                    wait_sec = self._schedule[0][0] - time.monotonic() if self._schedule else None
+                # a finished poll schedules the next one and wakes up the scheduler
+                self._wakeup.wait(timeout=wait_sec)
+                self._wakeup.clear()
+
+    def _poll_safe(self, mac: str):
+        try:
+            self.poll(mac)
+        except Exception: # pylint: disable=broad-except
+            LOG.exception("poller: failed to poll bot %s", mac)
+            with self._lock:
+                self._reschedule(self._states[mac], changed=False, failed=True)
+            self._wakeup.set()
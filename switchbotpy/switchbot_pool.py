@@ -0,0 +1,211 @@
+"""
+Process-wide pool of BLE adapters and connections shared by Bot and Scanner instances.
+
+Every adapter (transport) holds at most one connection. The pool creates adapters on demand
+up to max_connections (the number of simultaneous connections the controller supports),
+keeps released connections warm (connected and subscribed) for the next command to the same
+bot and evicts the least recently used idle connection when a new one is needed.
+
+    pool = default_pool()
+    bots = [Bot(bot_id=i, mac=mac, name=name, pool=pool) for i, (mac, name) in enumerate(config)]
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+from switchbotpy.switchbot_transport import Transport, gatttool_transport
+from switchbotpy.switchbot_util import NotificationChannel, SwitchbotError
+
+LOG = logging.getLogger('switchbot')
+
+
+class PooledConnection(object):
+    """a live connection of the pool (connected and subscribed to notifications)"""
+
+    def __init__(self, mac: str, adapter: Transport, device: Any, channel: NotificationChannel):
+        self.mac = mac
+        self.adapter = adapter
+        self.device = device
+        self.channel = channel
+        self.last_used = time.monotonic()
+        # handed out from the idle connections and not used since (might be dropped already)
+        self.warm = False
+
+
+class AdapterPool(object):
+    """Shares a bounded number of adapters and warm connections between bots."""
+
+    def __init__(self, max_connections: int = 5, adapter_factory: Callable[[], Transport] = None,
+                 idle_timeout_sec: float = 10, acquire_timeout_sec: float = 30):
+        """
+        max_connections: maximum number of simultaneously live connections (= adapters)
+        adapter_factory: creates the adapters (default: gatttool on hci0)
+        idle_timeout_sec: idle connections older than this are not reused (the bot might
+                          have dropped them already, None: no limit)
+        acquire_timeout_sec: how long to wait for a connection when all are in use
+        """
+        if max_connections < 1:
+            raise ValueError("max_connections must be at least 1")
+        self.max_connections = max_connections
+        self.adapter_factory = adapter_factory if adapter_factory is not None else gatttool_transport
+        self.idle_timeout_sec = idle_timeout_sec
+        self.acquire_timeout_sec = acquire_timeout_sec
+
+        self._cond = threading.Condition()
+        self._idle: Dict[str, PooledConnection] = OrderedDict() # lru first
+        self._leased: Dict[str, PooledConnection] = {} # None while connecting
+        self._free: List[Transport] = []
+        self._n_adapters = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def acquire(self, mac: str,
+                connect: Callable[[Transport], Tuple[Any, NotificationChannel]]) -> PooledConnection:
+        """
+        A connection to the bot for exclusive use until release(): a warm connection if
+        there is one, otherwise connect(adapter) is called with a stopped adapter and
+        returns the connected device and its notification channel.
+        """
+        deadline = time.monotonic() + self.acquire_timeout_sec
+        with self._cond:
+            while True:
+                if mac not in self._leased:
+                    connection = self._idle.pop(mac, None)
+                    if connection is not None and not self._expired(connection):
+                        self._leased[mac] = connection
+                        connection.warm = True
+                        self.hits += 1
+                        return connection
+                    # a stale connection of the bot is closed to free its adapter
+                    adapter, evicted = self._take_adapter(stale=connection)
+                    if adapter is not None:
+                        self._leased[mac] = None
+                        self.misses += 1
+                        break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    raise SwitchbotError(message="no connection available in the adapter pool")
+
+        if evicted is not None:
+            self._close(evicted)
+        try:
+            device, channel = connect(adapter)
+        except BaseException:
+            self._stop(adapter)
+            with self._cond:
+                del self._leased[mac]
+                self._free.append(adapter)
+                self._cond.notify_all()
+            raise
+
+        connection = PooledConnection(mac=mac, adapter=adapter, device=device, channel=channel)
+        with self._cond:
+            self._leased[mac] = connection
+        return connection
+
+    def release(self, connection: PooledConnection, reusable: bool = True):
+        """return the connection, it is kept warm unless it is not reusable (e.g. after a failure)"""
+        with self._cond:
+            if self._leased.get(connection.mac) is connection:
+                del self._leased[connection.mac]
+            if reusable:
+                connection.last_used = time.monotonic()
+                self._idle[connection.mac] = connection
+                self._cond.notify_all()
+                return
+        self._close(connection)
+        with self._cond:
+            self._free.append(connection.adapter)
+            self._cond.notify_all()
+
+    @contextmanager
+    def adapter(self) -> Iterator[Transport]:
+        """
+        An adapter without connection for exclusive use (e.g. to scan), the caller
+        starts and stops the adapter.
+        """
+        deadline = time.monotonic() + self.acquire_timeout_sec
+        with self._cond:
+            while True:
+                adapter, evicted = self._take_adapter()
+                if adapter is not None:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    raise SwitchbotError(message="no adapter available in the adapter pool")
+        if evicted is not None:
+            self._close(evicted)
+        try:
+            yield adapter
+        finally:
+            with self._cond:
+                self._free.append(adapter)
+                self._cond.notify_all()
+
+    def close(self):
+        """disconnect all idle connections"""
+        with self._cond:
+            idle = list(self._idle.values())
+            self._idle.clear()
+        for connection in idle:
+            self._close(connection)
+        with self._cond:
+            self._free += [connection.adapter for connection in idle]
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'idle': len(self._idle), 'leased': len(self._leased),
+                    'adapters': self._n_adapters}
+
+    def _take_adapter(self, stale: PooledConnection = None):
+        """a stopped adapter (or the adapter of a connection that has to be closed first)"""
+        if stale is not None:
+            return stale.adapter, stale
+        if self._free:
+            return self._free.pop(), None
+        if self._n_adapters < self.max_connections:
+            self._n_adapters += 1
+            return self.adapter_factory(), None
+        if self._idle:
+            mac = next(iter(self._idle))
+            LOG.info("adapter pool: evict idle connection of %s", mac)
+            self.evictions += 1
+            evicted = self._idle.pop(mac)
+            return evicted.adapter, evicted
+        return None, None
+
+    def _expired(self, connection: PooledConnection) -> bool:
+        return (self.idle_timeout_sec is not None and
+                time.monotonic() - connection.last_used > self.idle_timeout_sec)
+
+    def _close(self, connection: PooledConnection):
+        connection.channel.close()
+        self._stop(connection.adapter)
+
+    @staticmethod
+    def _stop(adapter: Transport):
+        try:
+            adapter.stop()
+        except Exception: # pylint: disable=broad-except
+            LOG.exception("adapter pool: failed to stop adapter")
+
+
+_DEFAULT_POOL = None
+_DEFAULT_POOL_LOCK = threading.Lock()
+
+
+def default_pool() -> AdapterPool:
+    """the process-wide adapter pool (gatttool on hci0, created on first use)"""
+    global _DEFAULT_POOL # pylint: disable=global-statement
+    with _DEFAULT_POOL_LOCK:
+        if _DEFAULT_POOL is None:
+            _DEFAULT_POOL = AdapterPool()
+        return _DEFAULT_POOL
@@ -0,0 +1,138 @@
+"""
+Priority classes for the commands of a bot (see Bot.priority()): the commands of a bot run
+one at a time and waiting commands are served by priority (first come, first served within
+a priority). Between its BLE round-trips, a running command yields the bot to waiting
+commands of a higher priority, e.g. an interactive press preempts the polling of the timers.
+A yielding command keeps its place in the queue: commands of its own priority that arrived
+later do not run before it is finished.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from enum import IntEnum
+from typing import Any, Dict, Iterator, List, Tuple
+
+from switchbotpy.switchbot_metrics import NULL_METRICS, Metrics
+
+
+class Priority(IntEnum):
+    """lower value = served first"""
+    interactive = 0
+    normal = 1
+    background = 2
+
+
+class PriorityLock(object):
+    """
+    Reentrant lock whose waiters acquire it in the order of the priority of their thread
+    (set with priority(), default: normal).
+    """
+
+    def __init__(self, metrics: Metrics = None):
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+        self._cond = threading.Condition(threading.Lock())
+        self._owner = None
+        self._owner_entry = None # (priority, ticket) of the owner
+        self._count = 0
+        self._waiters: List[Tuple[int, int]] = [] # heap of (priority, ticket)
+        self._tickets = itertools.count()
+        self._local = threading.local()
+        self._waits = {p: [0, 0.0, 0.0] for p in Priority} # count, total sec, max sec
+
+    @contextmanager
+    def priority(self, priority: Priority) -> Iterator[None]:
+        """the commands of the current thread have the priority within the context"""
+        previous = self.current_priority()
+        self._local.priority = priority
+        try:
+            yield
+        finally:
+            self._local.priority = previous
+
+    def current_priority(self) -> Priority:
+        return getattr(self._local, 'priority', Priority.normal)
+
+    def acquire(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._owner == me:
+                self._count += 1
+                return
+            self._wait(me)
+            self._count = 1
+
+    def release(self):
+        with self._cond:
+            if self._owner != threading.get_ident():
+                raise RuntimeError("cannot release un-acquired lock")
+            self._count -= 1
+            if self._count == 0:
+                self._owner = None
+                self._owner_entry = None
+                self._cond.notify_all()
+
+    __enter__ = acquire
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+    def preempted(self) -> bool:
+        """True if a thread of a higher priority than the owner waits for the lock"""
+        with self._cond:
+            return (bool(self._waiters) and self._owner_entry is not None and
+                    self._waiters[0][0] < self._owner_entry[0])
+
+    def yield_to_higher_priority(self):
+        """
+        let all waiting threads of a higher priority run first (the owner releases the
+        lock completely and re-acquires it with its original ticket afterwards, i.e. ahead of
+        the threads of its priority that started waiting in the meantime)
+        """
+        me = threading.get_ident()
+        with self._cond:
+            if self._owner != me:
+                raise RuntimeError("cannot yield un-acquired lock")
+            count, entry = self._count, self._owner_entry
+            self._count, self._owner, self._owner_entry = 0, None, None
+            self._cond.notify_all()
+            self._wait(me, entry)
+            self._count = count
+
+    def stats(self) -> Dict[str, Any]:
+        """queue depth and wait time (count, total, max sec) per priority"""
+        with self._cond:
+            depth = {p.name: 0 for p in Priority}
+            for priority, _ in self._waiters:
+                depth[Priority(priority).name] += 1
+            return {'queue_depth': depth,
+                    'wait': {p.name: {'count': count, 'total_sec': total, 'max_sec': maximum}
+                             for p, (count, total, maximum) in self._waits.items()}}
+
+    def _wait(self, me: int, entry: Tuple[int, int] = None):
+        """
+        wait for the turn of the thread with its (priority, ticket) entry, a new ticket of
+        its priority if None (requires the condition)
+        """
+        if entry is None:
+            entry = (self.current_priority().value, next(self._tickets))
+        if self._owner is None and not self._waiters:
+            self._owner, self._owner_entry = me, entry
+            return
+        t_start = time.perf_counter()
+        heapq.heappush(self._waiters, entry)
+        while self._owner is not None or self._waiters[0] != entry:
+            self._cond.wait()
+        heapq.heappop(self._waiters)
+        self._owner, self._owner_entry = me, entry
+
+        priority = Priority(entry[0])
+        wait_sec = time.perf_counter() - t_start
+        waits = self._waits[priority]
+        waits[0] += 1
+        waits[1] += wait_sec
+        waits[2] = max(waits[2], wait_sec)
+        self.metrics.observe('switchbot_queue_wait_seconds', wait_sec,
+                             labels={'priority': priority.name})
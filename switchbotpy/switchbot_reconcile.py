@@ -0,0 +1,159 @@
+"""
+Declarative configuration of a fleet of Switchbots: the desired state of every bot is
+compared with its current state (one snapshot per bot) and only the differences are written,
+in parallel for all bots (see Fleet).
+
+    desired = {mac: DesiredState.from_dict(doc) for mac, doc in config.items()}
+    reconciler = Reconciler(desired, max_workers=8)
+    for result in reconciler.plan(): # dry run
+        print(result.to_dict())
+    results = reconciler.apply()
+"""
+
+import logging
+from typing import Any, Dict, List, NamedTuple
+
+from switchbotpy.switchbot import BatchResult, Bot, BotSnapshot
+from switchbotpy.switchbot_fleet import Fleet
+from switchbotpy.switchbot_timer import BaseTimer, diff_timers, timer_from_dict
+
+LOG = logging.getLogger('switchbot')
+
+
+class DesiredState(NamedTuple):
+    """
+    desired configuration of a bot, None means the setting is not managed
+    (the password is only used to communicate with the bot, it cannot be changed via BLE)
+    """
+    hold_seconds: int = None
+    dual_state: bool = None
+    inverse: bool = None
+    timers: List[BaseTimer] = None
+    password: str = None
+    sync_time: bool = False
+
+    @staticmethod
+    def from_dict(d: Dict[str, Any]) -> 'DesiredState':
+        """e.g. {"hold_seconds": 5, "dual_state": false, "timers": [timer.to_dict(), ...]}"""
+        timers = d.get('timers')
+        if timers is not None:
+            timers = [timer_from_dict(timer) for timer in timers]
+        return DesiredState(hold_seconds=d.get('hold_seconds'), dual_state=d.get('dual_state'),
+                            inverse=d.get('inverse'), timers=timers, password=d.get('password'),
+                            sync_time=d.get('sync_time', False))
+
+
+class Step(NamedTuple):
+    """a command of a plan (name and arguments of the Batch method)"""
+    name: str
+    kwargs: Dict[str, Any]
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = {'step': self.name}
+        for key, value in self.kwargs.items():
+            if key in ('timers', 'current'):
+                value = [timer.to_dict(timer_id=i) for i, timer in enumerate(value)]
+            d[key] = value
+        return d
+
+
+class ReconcileResult(NamedTuple):
+    """the plan for one bot and the results of its steps (empty for a dry run)"""
+    mac: str
+    plan: List[Step]
+    results: List[BatchResult]
+    error: Exception
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    @property
+    def drifted(self) -> bool:
+        return bool(self.plan)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'mac': self.mac,
+                'plan': [step.to_dict() for step in self.plan] if self.plan is not None else None,
+                'results': [{'step': result.step, 'ok': result.ok,
+                             'error': str(result.error) if result.error else None}
+                            for result in self.results],
+                'error': str(self.error) if self.error else None}
+
+
+def plan_changes(current: BotSnapshot, desired: DesiredState) -> List[Step]:
+    """
+    the minimal sequence of commands to bring the bot from the current to the desired state
+    (set_mode() deletes all timers, i.e., the mode is set first and the timers are written
+    afterwards, the current timers are restored if the timers are not managed)
+    """
+    steps = []
+    timers = current.timers
+
+    dual_state = current.dual_state_mode if desired.dual_state is None else desired.dual_state
+    inverse = current.inverse_direction if desired.inverse is None else desired.inverse
+    if (dual_state, inverse) != (current.dual_state_mode, current.inverse_direction):
+        steps.append(Step('set_mode', {'dual_state': dual_state, 'inverse': inverse}))
+        timers = []
+
+    if desired.hold_seconds is not None and desired.hold_seconds != current.hold_seconds:
+        steps.append(Step('set_hold_time', {'sec': desired.hold_seconds}))
+
+    target = current.timers if desired.timers is None else desired.timers
+    written, deleted, _ = diff_timers(current=timers, desired=target)
+    if written or deleted:
+        steps.append(Step('sync_timers', {'timers': list(target), 'current': list(timers)}))
+
+    if desired.sync_time or (written and not current.timers):
+        # the bot needs the current time to run timers (e.g. after a reset of the timers)
+        steps.append(Step('sync_time', {}))
+
+    return steps
+
+
+class Reconciler(object):
+    """Brings a fleet of bots into the desired state, touching only bots that drifted."""
+
+    def __init__(self, desired: Dict[str, DesiredState], **fleet_kwargs):
+        """
+        desired: the desired state per mac address
+        fleet_kwargs: configuration of the fleet (e.g. max_workers, pool, retry_policy)
+        """
+        self.desired = desired
+        self.fleet = Fleet([(mac, state.password) for mac, state in desired.items()],
+                           **fleet_kwargs)
+
+    def plan(self) -> List[ReconcileResult]:
+        """read the state of all bots and compute the plans without applying them (dry run)"""
+        return self.reconcile(dry_run=True)
+
+    def apply(self) -> List[ReconcileResult]:
+        """read the state of all bots and apply the plans of the bots that drifted"""
+        return self.reconcile(dry_run=False)
+
+    def reconcile(self, dry_run: bool = False) -> List[ReconcileResult]:
+        LOG.info("reconcile %d bots: dry run=%s", len(self.desired), str(dry_run))
+        results = []
+        for fleet_result in self.fleet.run(lambda bot: self._reconcile_bot(bot, dry_run)):
+            if fleet_result.ok:
+                results.append(fleet_result.result)
+            else:
+                results.append(ReconcileResult(mac=fleet_result.mac, plan=None, results=[],
+                                               error=fleet_result.error))
+        return results
+
+    def _reconcile_bot(self, bot: Bot, dry_run: bool) -> ReconcileResult:
+        # read and write over a single connection
+        with bot:
+            steps = plan_changes(current=bot.snapshot(), desired=self.desired[bot.mac])
+            LOG.info("reconcile bot %s: %s", bot.mac, ', '.join(step.name for step in steps))
+            if dry_run or not steps:
+                return ReconcileResult(mac=bot.mac, plan=steps, results=[], error=None)
+
+            batch = bot.batch()
+            for step in steps:
+                getattr(batch, step.name)(**step.kwargs)
+            results = batch.execute(stop_on_error=True)
+
+        error = next((result.error for result in results if not result.ok), None)
+        return ReconcileResult(mac=bot.mac, plan=steps, results=results, error=error)
@@ -0,0 +1,134 @@
+"""
+Retry policy and circuit breaker for the commands of a bot (see Bot.enable_retry() and
+Bot.enable_circuit_breaker()).
+"""
+
+import logging
+import random
+import threading
+import time
+from typing import Iterable
+
+from switchbotpy.switchbot_util import (ActionStatus, CircuitOpenError, NotificationTimeout,
+                                       SwitchbotError, WriteError)
+
+LOG = logging.getLogger('switchbot')
+
+
+class RetryPolicy(object):
+    """
+    Which failed commands are retried and how long to wait in between:
+    - replies with one of the retry_statuses (the bot did not execute the command)
+    - connection failures (nothing was written yet)
+    - notification timeouts and failed writes, but only for idempotent commands (a press
+      could have been executed without its notification being received)
+    Every attempt waits at most timeout_sec for the notification. The backoff doubles with
+    every attempt (capped at max_backoff_sec) and is reduced by a random fraction of up to
+    `jitter`. No retry is started later than deadline_sec after the first attempt of a command
+    (a running attempt waits for its notification regardless).
+    """
+
+    def __init__(self, max_attempts: int = 3,
+                 retry_statuses: Iterable[ActionStatus] = (ActionStatus.device_busy,),
+                 retry_timeouts: bool = True, timeout_sec: float = 2, backoff_sec: float = 0.2,
+                 max_backoff_sec: float = 2.0, jitter: float = 0.5, deadline_sec: float = 10,
+                 seed: int = None):
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1")
+        if jitter < 0 or jitter > 1:
+            raise ValueError("jitter must be between [0, 1]")
+        self.max_attempts = max_attempts
+        self.retry_statuses = frozenset(retry_statuses)
+        self.retry_timeouts = retry_timeouts
+        self.timeout_sec = timeout_sec
+        self.backoff_sec = backoff_sec
+        self.max_backoff_sec = max_backoff_sec
+        self.jitter = jitter
+        self.deadline_sec = deadline_sec
+        self._random = random.Random(seed)
+
+    def should_retry(self, error: SwitchbotError, attempt: int, idempotent: bool = True) -> bool:
+        """True if the command should be attempted again after the failed attempt (1 = first)"""
+        if attempt >= self.max_attempts or isinstance(error, CircuitOpenError):
+            return False
+        if isinstance(error, NotificationTimeout):
+            return self.retry_timeouts and idempotent
+        if isinstance(error, WriteError):
+            return idempotent
+        if error.switchbot_action_status is None:
+            # connection failure
+            return True
+        return error.switchbot_action_status in self.retry_statuses
+
+    def backoff(self, attempt: int) -> float:
+        """seconds to wait after the failed attempt (1 = first)"""
+        delay = min(self.max_backoff_sec, self.backoff_sec * 2 ** (attempt - 1))
+        return delay * (1 - self.jitter * self._random.random())
+
+
+class CircuitBreaker(object):
+    """
+    Fails fast for a bot that keeps failing: after failure_threshold consecutive failures
+    the circuit opens and all commands fail immediately with CircuitOpenError.
+    After reset_timeout_sec, a single probe is let through (half open): if it succeeds
+    the circuit closes, otherwise it opens again.
+    """
+
+    closed = 'closed'
+    open = 'open'
+    half_open = 'half_open'
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout_sec: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_sec = reset_timeout_sec
+        self._lock = threading.Lock()
+        self._state = CircuitBreaker.closed
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == CircuitBreaker.open and self._reset_timeout_expired():
+                return CircuitBreaker.half_open
+            return self._state
+
+    def check(self):
+        """raises CircuitOpenError if the command must not be attempted"""
+        with self._lock:
+            if self._state == CircuitBreaker.closed:
+                return
+            if self._state == CircuitBreaker.open and self._reset_timeout_expired():
+                self._state = CircuitBreaker.half_open
+            if self._state == CircuitBreaker.half_open and not self._probing:
+                # let a single probe through
+                self._probing = True
+                return
+        raise CircuitOpenError(message="circuit open: bot failed repeatedly")
+
+    def record_success(self):
+        with self._lock:
+            if self._state != CircuitBreaker.closed:
+                LOG.info("circuit closed")
+            self._state = CircuitBreaker.closed
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._state == CircuitBreaker.half_open or self._failures >= self.failure_threshold:
+                if self._state != CircuitBreaker.open:
+                    LOG.info("circuit open after %d failures", self._failures)
+                self._state = CircuitBreaker.open
+                self._opened_at = time.monotonic()
+
+    def release_probe(self):
+        """the probe ended without reaching or failing to reach the bot: allow another probe"""
+        with self._lock:
+            self._probing = False
+
+    def _reset_timeout_expired(self) -> bool:
+        return time.monotonic() - self._opened_at >= self.reset_timeout_sec
@@ -0,0 +1,98 @@
+"""
+Round trip time estimation of the commands of a bot to derive the notification timeout from
+the observed link quality instead of a fixed worst case (see Bot.enable_adaptive_timeout()).
+"""
+
+import threading
+from typing import Dict, Hashable
+
+
+class _Estimate(object):
+    """smoothed round trip time and its variation (TCP retransmission timeout, RFC 6298)"""
+
+    __slots__ = ('srtt', 'rttvar', 'samples', 'timeouts', 'backoff')
+
+    def __init__(self):
+        self.srtt = None
+        self.rttvar = None
+        self.samples = 0
+        self.timeouts = 0
+        self.backoff = 1
+
+
+class RttEstimator(object):
+    """
+    Learns the round trip time (write command -> notification) of a bot per opcode:
+    timeout = srtt + k * rttvar, bounded to [min_timeout_sec, max_timeout_sec].
+    Opcodes without samples use the estimate of all commands (initial_timeout_sec before
+    the first sample). Every timeout doubles the timeout until the next sample.
+    """
+
+    def __init__(self, min_timeout_sec: float = 0.5, max_timeout_sec: float = 10,
+                 initial_timeout_sec: float = 5, alpha: float = 0.125, beta: float = 0.25,
+                 k: float = 4):
+        if min_timeout_sec <= 0 or min_timeout_sec > max_timeout_sec:
+            raise ValueError("timeouts must satisfy 0 < min_timeout_sec <= max_timeout_sec")
+        self.min_timeout_sec = min_timeout_sec
+        self.max_timeout_sec = max_timeout_sec
+        self.initial_timeout_sec = initial_timeout_sec
+        self.alpha = alpha
+        self.beta = beta
+        self.k = k
+        self._lock = threading.Lock()
+        self._all = _Estimate()
+        self._by_key: Dict[Hashable, _Estimate] = {}
+
+    def timeout(self, key: Hashable = None) -> float:
+        """seconds to wait for the notification of a command"""
+        with self._lock:
+            estimate = self._by_key.get(key)
+            if estimate is None or estimate.samples == 0:
+                estimate = self._all
+            return self._timeout(estimate)
+
+    def observe(self, rtt_sec: float, key: Hashable = None):
+        """a notification was received rtt_sec after writing the command"""
+        with self._lock:
+            for estimate in (self._all, self._estimate(key)):
+                if estimate.srtt is None:
+                    estimate.srtt = rtt_sec
+                    estimate.rttvar = rtt_sec / 2
+                else:
+                    estimate.rttvar = ((1 - self.beta) * estimate.rttvar +
+                                       self.beta * abs(estimate.srtt - rtt_sec))
+                    estimate.srtt = (1 - self.alpha) * estimate.srtt + self.alpha * rtt_sec
+                estimate.samples += 1
+                estimate.backoff = 1
+
+    def observe_timeout(self, key: Hashable = None):
+        """no notification was received within the timeout"""
+        with self._lock:
+            for estimate in (self._all, self._estimate(key)):
+                estimate.timeouts += 1
+                if self._timeout(estimate) < self.max_timeout_sec:
+                    estimate.backoff *= 2
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """the learned estimates of all commands ('all') and per opcode"""
+        with self._lock:
+            estimates = [('all', self._all)]
+            estimates += [(str(key), estimate) for key, estimate in self._by_key.items()]
+            return {name: {'srtt_sec': estimate.srtt, 'rttvar_sec': estimate.rttvar,
+                           'timeout_sec': self._timeout(estimate), 'samples': estimate.samples,
+                           'timeouts': estimate.timeouts}
+                    for name, estimate in estimates}
+
+    def _estimate(self, key: Hashable) -> _Estimate:
+        estimate = self._by_key.get(key)
+        if estimate is None:
+            estimate = self._by_key[key] = _Estimate()
+        return estimate
+
+    def _timeout(self, estimate: _Estimate) -> float:
+        if estimate.srtt is None:
+            timeout = self.initial_timeout_sec
+        else:
+            timeout = estimate.srtt + self.k * estimate.rttvar
+        timeout *= estimate.backoff
+        return min(self.max_timeout_sec, max(self.min_timeout_sec, timeout))
@@ -0,0 +1,175 @@
+"""
+Index of the timers of many bots to answer when timers fire next (e.g. to plan maintenance
+windows or to warm up connections before a timer fires).
+
+The bots run their timers in local time (see Bot.set_current_timestamp()), so the index
+computes the fire times in the local time zone of this machine. Timers are modelled as:
+- enabled standard timers with weekdays: every week on these weekdays at hour:min
+- enabled standard timers without weekdays (no repeat): once, at the first hour:min at or
+  after the time the timers were added to the index
+- enabled interval timers: every interval_hour:interval_min, counted from local midnight
+  of every day (the interval semantics of the bots are not verified, see Mode)
+- disabled timers never fire
+"""
+
+import bisect
+import heapq
+import itertools
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, NamedTuple, Tuple
+
+from switchbotpy.switchbot_timer import Action, BaseTimer, IntervalTimer
+
+MINUTES_PER_DAY = 24 * 60
+
+
+class Fire(NamedTuple):
+    """a timer of a bot firing at time (sec since epoch)"""
+    time: float
+    mac: str
+    timer_idx: int
+    action: Action
+
+
+def minute_of_week(iso_weekday: int, hour: int, minute: int) -> int:
+    """minutes since Monday 00:00"""
+    return (iso_weekday - 1) * MINUTES_PER_DAY + hour * 60 + minute
+
+
+def _week_start(t: float) -> datetime:
+    """Monday 00:00 (local time) of the week of t"""
+    local = datetime.fromtimestamp(t)
+    return datetime(local.year, local.month, local.day) - timedelta(days=local.weekday())
+
+
+class ScheduleIndex(object):
+    """
+    The timers of many bots, sorted by their minute of the week (weekly timers),
+    their fire time (one-shot timers) and their period (interval timers).
+    update() replaces the timers of one bot without touching the others.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timers: Dict[str, List[BaseTimer]] = {}
+        # sorted (minute of week, mac, timer idx)
+        self._weekly: List[Tuple[int, str, int]] = []
+        # sorted (fire time, mac, timer idx)
+        self._once: List[Tuple[float, str, int]] = []
+        # (period in minutes, mac, timer idx)
+        self._intervals: List[Tuple[int, str, int]] = []
+        self._keys: Dict[str, List[Tuple[str, tuple]]] = {}
+
+    def update(self, mac: str, timers: List[BaseTimer], reference_time: float = None):
+        """
+        replace the timers of the bot (reference_time: when the timers were set,
+        to place timers without repeat, default: now)
+        """
+        if reference_time is None:
+            reference_time = time.time()
+        with self._lock:
+            self._remove(mac)
+            self._timers[mac] = list(timers)
+            keys = []
+            for idx, timer in enumerate(timers):
+                if timer is None or not timer.enabled:
+                    continue
+                if isinstance(timer, IntervalTimer):
+                    period = timer.interval_hour * 60 + timer.interval_min
+                    if period > 0:
+                        keys.append(('interval', (period, mac, idx)))
+                elif timer.weekdays:
+                    for weekday in set(timer.weekdays):
+                        keys.append(('weekly', (minute_of_week(weekday, timer.hour, timer.min),
+                                                mac, idx)))
+                else:
+                    keys.append(('once', (self._next_time(reference_time, timer.hour, timer.min),
+                                          mac, idx)))
+            for kind, key in keys:
+                if kind == 'interval':
+                    self._intervals.append(key)
+                else:
+                    bisect.insort(self._list(kind), key)
+            self._keys[mac] = keys
+
+    def remove(self, mac: str):
+        """remove all timers of the bot"""
+        with self._lock:
+            self._remove(mac)
+
+    def next_fires(self, after: float = None, limit: int = 10) -> List[Fire]:
+        """the next `limit` fires at or after the time (default: now) in chronological order"""
+        if after is None:
+            after = time.time()
+        with self._lock:
+            return list(itertools.islice(self._iter_fires(after), limit))
+
+    def fires_between(self, t0: float, t1: float) -> List[Fire]:
+        """all fires in [t0, t1) in chronological order"""
+        with self._lock:
+            return list(itertools.takewhile(lambda fire: fire.time < t1, self._iter_fires(t0)))
+
+    def __len__(self) -> int:
+        """number of indexed timers that fire"""
+        with self._lock:
+            return len({(mac, idx) for _, (_, mac, idx) in
+                        itertools.chain.from_iterable(self._keys.values())})
+
+    def _list(self, kind: str) -> list:
+        return self._weekly if kind == 'weekly' else self._once
+
+    def _remove(self, mac: str):
+        for kind, key in self._keys.pop(mac, []):
+            if kind == 'interval':
+                self._intervals.remove(key)
+            else:
+                keys = self._list(kind)
+                del keys[bisect.bisect_left(keys, key)]
+        self._timers.pop(mac, None)
+
+    def _fire(self, t: float, mac: str, idx: int) -> Fire:
+        return Fire(time=t, mac=mac, timer_idx=idx, action=self._timers[mac][idx].action)
+
+    def _iter_fires(self, t0: float) -> Iterator[Fire]:
+        sources = [self._iter_weekly(t0), self._iter_once(t0)]
+        sources += [self._iter_interval(t0, *key) for key in self._intervals]
+        return heapq.merge(*sources, key=lambda fire: (fire.time, fire.mac, fire.timer_idx))
+
+    def _iter_weekly(self, t0: float) -> Iterator[Fire]:
+        if not self._weekly:
+            return
+        week_start = _week_start(t0)
+        # start with the first entry of the week that is not before t0
+        start = bisect.bisect_left(self._weekly, (int((t0 - week_start.timestamp()) // 60),))
+        while True:
+            for minute, mac, idx in itertools.islice(self._weekly, start, None):
+                t = (week_start + timedelta(minutes=minute)).timestamp()
+                if t >= t0:
+                    yield self._fire(t, mac, idx)
+            week_start += timedelta(days=7)
+            start = 0
+
+    def _iter_once(self, t0: float) -> Iterator[Fire]:
+        for t, mac, idx in itertools.islice(self._once, bisect.bisect_left(self._once, (t0,)), None):
+            yield self._fire(t, mac, idx)
+
+    def _iter_interval(self, t0: float, period: int, mac: str, idx: int) -> Iterator[Fire]:
+        local = datetime.fromtimestamp(t0)
+        day_start = datetime(local.year, local.month, local.day)
+        while True:
+            for minute in range(0, MINUTES_PER_DAY, period):
+                t = (day_start + timedelta(minutes=minute)).timestamp()
+                if t >= t0:
+                    yield self._fire(t, mac, idx)
+            day_start += timedelta(days=1)
+
+    @staticmethod
+    def _next_time(t: float, hour: int, minute: int) -> float:
+        """the first hour:min (local time) at or after t"""
+        local = datetime.fromtimestamp(t)
+        candidate = datetime(local.year, local.month, local.day, hour, minute)
+        if candidate.timestamp() < t:
+            candidate += timedelta(days=1)
+        return candidate.timestamp()
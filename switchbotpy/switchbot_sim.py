@@ -0,0 +1,259 @@
+"""
+In-process simulation of Switchbots to run, load-test and profile without BLE hardware.
+
+SimulatedSwitchbot implements the 0x57 command set (see README): press / switch, settings,
+hold time, mode, timers and timestamp, including the password check of encrypted bots and
+the ActionStatus replies. Latency, busy replies, lost notifications and connection failures
+can be injected per bot.
+
+    bot_sim = SimulatedSwitchbot(mac="AA:BB:CC:DD:EE:FF", latency_sec=0.05)
+    bot = Bot(bot_id=0, mac=bot_sim.mac, name="sim", adapter=SimulatedTransport([bot_sim]))
+"""
+
+import logging
+import random
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List
+from uuid import UUID
+
+import pygatt
+
+from switchbotpy.switchbot_advertisement import Advertisement
+from switchbotpy.switchbot_transport import Connection, Transport
+from switchbotpy.switchbot_util import ActionStatus, password_crc
+
+LOG = logging.getLogger('switchbot')
+
+NOTIFICATION_HANDLE = 0x13
+CMD_HANDLE = 0x16
+
+
+class SimulatedSwitchbot(object):
+    """A simulated Switchbot that answers the 0x57 commands like a real bot."""
+
+    def __init__(self, mac: str, password: str = None, battery: int = 100, firmware: float = 4.5,
+                 hold_seconds: int = 0, dual_state_mode: bool = False,
+                 inverse_direction: bool = False, rssi: int = -60,
+                 latency_sec: float = 0.0, connect_latency_sec: float = 0.0,
+                 busy_probability: float = 0.0, drop_probability: float = 0.0,
+                 connect_failure_probability: float = 0.0, seed: int = None):
+        """
+        latency_sec: delay between a write and its notification
+        connect_latency_sec: duration of a connect
+        busy_probability: probability that a command is answered with device_busy
+        drop_probability: probability that the notification of a command is lost
+        connect_failure_probability: probability that a connect fails
+        """
+        self.mac = mac
+        self.password = password_crc(password) if password else None
+        self.battery = battery
+        self.firmware = firmware
+        self.hold_seconds = hold_seconds
+        self.dual_state_mode = dual_state_mode
+        self.inverse_direction = inverse_direction
+        self.rssi = rssi
+        self.state = False
+        self.timestamp = None
+        self.num_timer = 0
+        self.timers: List[bytes] = [None] * 5
+
+        self.latency_sec = latency_sec
+        self.connect_latency_sec = connect_latency_sec
+        self.busy_probability = busy_probability
+        self.drop_probability = drop_probability
+        self.connect_failure_probability = connect_failure_probability
+
+        self.commands = 0
+        self.presses = 0
+        self.connected = False
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+
+    def handle_command(self, cmd: bytes):
+        """execute the command and return the notification value (None if it is lost)"""
+        with self._lock:
+            self.commands += 1
+            if self._random.random() < self.drop_probability:
+                return None
+            return bytes(self._execute(bytes(cmd)))
+
+    def advertisement(self) -> Advertisement:
+        """the current advertisement of the bot (flags + service data)"""
+        mode = 0
+        if self.dual_state_mode:
+            mode |= 128
+        if not self.state:
+            mode |= 64
+        data = b'\x02\x01\x06' + b'\x06\x16\x00\x0d' + bytes((0x48, mode, self.battery & 127))
+        return Advertisement(mac=self.mac, rssi=self.rssi, data=data, timestamp=time.time())
+
+    def _execute(self, cmd: bytes):
+        if len(cmd) < 2 or cmd[0] != 0x57:
+            return [ActionStatus.unable_resp.value]
+
+        code = cmd[1] & 0x0f
+        if cmd[1] & 0x10:
+            # encrypted command: 4 byte password crc follows
+            if self.password is None:
+                return [ActionStatus.device_unencrypted.value]
+            if cmd[2:6] != self.password:
+                return [ActionStatus.wrong_password.value]
+            payload = cmd[6:]
+        else:
+            if self.password is not None:
+                return [ActionStatus.device_encrypted.value]
+            payload = cmd[2:]
+
+        if self._random.random() < self.busy_probability:
+            return [ActionStatus.device_busy.value]
+
+        complete = ActionStatus.complete.value
+
+        if code == 0x01: # press / switch
+            self.presses += 1
+            if payload[:1] == b'\x01':
+                self.state = True
+            elif payload[:1] == b'\x02':
+                self.state = False
+            return [complete]
+
+        if code == 0x02: # get settings
+            mode = (16 if self.dual_state_mode else 0) | (1 if self.inverse_direction else 0)
+            return [complete, int(self.battery), int(round(self.firmware * 10)), 0x64, 0, 0, 0, 0,
+                    self.num_timer, mode, self.hold_seconds, 0, 0]
+
+        if code == 0x03 and payload[:1] == b'\x64' and len(payload) >= 2: # set mode
+            self.dual_state_mode = bool(payload[1] & 16)
+            self.inverse_direction = bool(payload[1] & 1)
+            return [complete]
+
+        if code == 0x0f and payload[:1] == b'\x08' and len(payload) >= 2: # set hold time
+            self.hold_seconds = payload[1]
+            return [complete]
+
+        if code == 0x08 and payload: # get timer
+            idx = payload[0] // 16
+            if idx > 4:
+                return [ActionStatus.unable_resp.value]
+            record = self.timers[idx] or bytes(11)
+            return [complete, self.num_timer] + list(record[2:])
+
+        if code == 0x09 and payload[:1] == b'\x01' and len(payload) == 9: # sync timestamp
+            self.timestamp = int.from_bytes(payload[1:], byteorder='big')
+            return [complete]
+
+        if code == 0x09 and len(payload) == 11 and payload[0] & 15 == 3: # set timer
+            idx = payload[0] // 16
+            if idx > 4:
+                return [ActionStatus.unable_resp.value]
+            self.num_timer = payload[1]
+            self.timers[idx] = payload if any(payload[3:]) else None
+            return [complete]
+
+        return [ActionStatus.unable_resp.value]
+
+
+class SimulatedConnection(Connection):
+    """connection to a simulated switchbot: notifications arrive after the latency of the bot"""
+
+    def __init__(self, device: SimulatedSwitchbot):
+        self.device = device
+        self._callbacks = []
+        self._connected = True
+
+    def subscribe(self, uuid: str, callback=None, indication: bool = False,
+                  wait_for_response: bool = True):
+        if callback is not None:
+            self._callbacks.append(callback)
+
+    def char_write_handle(self, handle: int, value: bytes, wait_for_response: bool = True,
+                          timeout: float = 30):
+        if not self._connected:
+            raise pygatt.exceptions.NotConnectedError("simulated device is disconnected")
+        if handle != CMD_HANDLE:
+            raise pygatt.BLEError("unknown handle: " + hex(handle))
+
+        reply = self.device.handle_command(value)
+        if reply is None:
+            return
+        notify = threading.Timer(self.device.latency_sec, self._notify, args=(reply,))
+        notify.daemon = True
+        notify.start()
+
+    def disconnect(self):
+        if self._connected:
+            self._connected = False
+            self.device.connected = False
+
+    def _notify(self, reply: bytes):
+        if not self._connected:
+            return
+        for callback in self._callbacks:
+            callback(NOTIFICATION_HANDLE, bytearray(reply))
+
+
+class SimulatedTransport(Transport):
+    """Transport to simulated switchbots (holds one connection at a time, like gatttool)"""
+
+    def __init__(self, devices: Iterable[SimulatedSwitchbot], start_latency_sec: float = 0.0):
+        self.devices: Dict[str, SimulatedSwitchbot] = {device.mac: device for device in devices}
+        self.start_latency_sec = start_latency_sec
+        self._running = False
+        self._connection = None
+
+    def start(self):
+        time.sleep(self.start_latency_sec)
+        self._running = True
+
+    def stop(self):
+        if self._connection is not None:
+            self._connection.disconnect()
+            self._connection = None
+        self._running = False
+
+    def scan(self, timeout: float = 10) -> List[Dict[str, Any]]:
+        return [{'address': mac, 'name': None} for mac in self.devices]
+
+    def connect(self, address: str, timeout: float = 5,
+                address_type: pygatt.BLEAddressType = pygatt.BLEAddressType.public) -> Connection:
+        if not self._running:
+            raise pygatt.exceptions.NotConnectedError("simulated transport is not started")
+        device = self.devices.get(address)
+        if device is None:
+            raise pygatt.exceptions.NotConnectedError("unknown simulated device: " + address)
+
+        time.sleep(device.connect_latency_sec)
+        with device._lock:
+            failed = device._random.random() < device.connect_failure_probability
+            # a bot accepts only one connection at a time
+            if failed or device.connected:
+                raise pygatt.exceptions.NotConnectedError("failed to connect to " + address)
+            device.connected = True
+
+        if self._connection is not None:
+            self._connection.disconnect()
+        self._connection = SimulatedConnection(device)
+        return self._connection
+
+    def discover_characteristics(self, device: Connection) -> Dict[UUID, Any]:
+        return {UUID("{cba20002-224d-11e6-9fb8-0002a5d5c51b}"): None,
+                UUID("{cba20003-224d-11e6-9fb8-0002a5d5c51b}"): None}
+
+
+class SimulatedAdvertisementSource(object):
+    """advertisements of simulated switchbots, every bot advertises every interval_sec"""
+
+    def __init__(self, devices: Iterable[SimulatedSwitchbot], interval_sec: float = 0.1):
+        self.devices = list(devices)
+        self.interval_sec = interval_sec
+
+    def listen(self, timeout: float) -> Iterator[Advertisement]:
+        deadline = time.time() + timeout
+        while True:
+            for device in self.devices:
+                yield device.advertisement()
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return
+            time.sleep(min(self.interval_sec, remaining))
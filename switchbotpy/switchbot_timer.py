@@ -1,83 +1,124 @@
+import struct
 from enum import Enum
 from abc import ABC
-from typing import List
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 
-def parse_timer_cmd(val: bytes):
+# timer record (the payload of the set timer command and the get timer notification):
+# idx/status num_timer filler repeat hour min mode action interval_timer_sum interval_hour interval_min
+TIMER_RECORD = struct.Struct('11B')
+# the records of all timers of a bot (1 to 5) at once
+_TIMER_RECORDS = {n: struct.Struct('%dB' % (n * TIMER_RECORD.size)) for n in range(1, 6)}
 
-    num_timer = val[1]
-    weekdays = _from_byte_to_iso_weekdays(val[3])
-    hour = val[4]
-    minutes = val[5]
+def parse_timer_cmd(val: bytes, offset: int = 0):
 
-    interval_mode = val[6] & 15 # 15 = 00001111 in binary and interval mode is only in second part of the byte
-    action = val[7] & 15 # action mode is only in second part of the byte
-    interval_timer_sum = val[8]
-    interval_hour = val[9]
-    interval_min = val[10]
+    (_, num_timer, _, repeat, hour, minutes, mode_b, action_b,
+     interval_timer_sum, interval_hour, interval_min) = TIMER_RECORD.unpack_from(val, offset)
 
-    enabled = val[3] != 0
+    interval_mode = mode_b & 15 # 15 = 00001111 in binary and interval mode is only in second part of the byte
+    action = action_b & 15 # action mode is only in second part of the byte
+
+    enabled = repeat != 0
 
     if not enabled:
+        if hour == 0 and minutes == 0 and interval_timer_sum == 0 and interval_hour == 0 and interval_min == 0:
+            return None, num_timer # timer not set
         # if a timer is disabled, then the repeating pattern is stored in the first part of the interval mode and the action mode
-        repeat = (val[6] & 240) | ((val[7] & 240) >> 4)
-        weekdays = _from_byte_to_iso_weekdays(repeat)
-
-    if not enabled and hour == 0 and minutes == 0 and interval_timer_sum == 0 and interval_hour == 0 and interval_min == 0:
-        timer = None # timer not set
-    elif interval_mode:
-        timer = IntervalTimer(enabled=enabled, 
-                                mode=interval_mode, 
-                                action=Action(action), 
-                                timer_sum=interval_timer_sum,
-                                hour=interval_hour,
-                                min=interval_min)
+        repeat = (mode_b & 240) | ((action_b & 240) >> 4)
+
+    if interval_mode:
+        timer = IntervalTimer(enabled=enabled,
+                              mode=_MODES.get(interval_mode, interval_mode),
+                              action=_ACTIONS.get(action) or Action(action),
+                              timer_sum=interval_timer_sum,
+                              hour=interval_hour,
+                              min=interval_min)
     else:
-        timer = StandardTimer(enabled=enabled, weekdays=weekdays, hour=hour, min=minutes, action=Action(action))
+        timer = StandardTimer(enabled=enabled, weekdays=list(_ISO_WEEKDAYS[repeat]), hour=hour, min=minutes, action=_ACTIONS.get(action) or Action(action))
 
     return timer, num_timer
 
+def encode_timers(timers: List['BaseTimer'], buffer: bytearray = None, offset: int = 0) -> bytearray:
+    """
+    encodes the timers of a bot (timer i in slot i) into consecutive records of the buffer,
+    starting at offset (a new buffer is allocated if none is given)
+    """
+    num_timer = len(timers)
+    if buffer is None:
+        buffer = bytearray(offset + num_timer * TIMER_RECORD.size)
+    if num_timer == 0:
+        return buffer
+    fields = []
+    for idx, timer in enumerate(timers):
+        fields += timer._fields(idx, num_timer)
+    _TIMER_RECORDS[num_timer].pack_into(buffer, offset, *fields)
+    return buffer
+
+def decode_timers(buffer: bytes, offset: int = 0, count: int = None) -> List[Tuple[Optional['BaseTimer'], int]]:
+    """decodes consecutive timer records of the buffer into a list of (timer, num_timer)"""
+    if count is None:
+        count = (len(buffer) - offset) // TIMER_RECORD.size
+    return [parse_timer_cmd(buffer, offset + i * TIMER_RECORD.size) for i in range(count)]
+
+def diff_timers(current: List['BaseTimer'], desired: List['BaseTimer']) -> Tuple[List[int], List[int], List[int]]:
+    """
+    compares the desired timers with the current timers of a bot slot by slot (using their encoding)
+    and returns the indices of the slots to write, to delete and the unchanged slots
+    """
+
+    num_timer = len(desired)
+    if num_timer > 5:
+        raise ValueError("Illegal Argument: Support for max 5 timers")
+
+    written = []
+    unchanged = []
+    for idx, timer in enumerate(desired):
+        # the first two bytes (idx, num_timer) are the header and not part of the timer itself:
+        # if the number of timers changes, at least one slot is written or deleted anyway
+        # and that command carries the new num_timer
+        cmd = timer.to_cmd(idx=idx, num_timer=num_timer)
+        if idx < len(current) and current[idx].to_cmd(idx=idx, num_timer=len(current))[2:] == cmd[2:]:
+            unchanged.append(idx)
+        else:
+            written.append(idx)
+
+    deleted = list(range(num_timer, len(current)))
+
+    return written, deleted, unchanged
+
+def timer_from_dict(d: Dict[str, Any]) -> 'BaseTimer':
+    """creates a timer from its dict representation (see to_dict())"""
+    action = Action[d['action']]
+    enabled = d.get('enabled', True)
+    if d.get('mode', Mode.standard.name) == Mode.standard.name:
+        return StandardTimer(enabled=enabled, weekdays=list(d.get('weekdays', [])),
+                             hour=d['hour'], min=d['min'], action=action)
+    return IntervalTimer(enabled=enabled, mode=Mode[d['mode']], action=action,
+                         timer_sum=d.get('timer_sum', 0), hour=d['hour'], min=d['min'])
+
 def delete_timer_cmd(idx: int, num_timer: int):
 
     # \x03 for 0'th timer, \x13 for 1st timer, \x23 for 2nd timer
-    cmd = _to_byte(idx*16+3)
-
     # \x01 for 1 timer, \x02 for 2 timers, ... , \x05 for 5 timers
-    cmd += _to_byte(num_timer)
+    # filler repeat hour min mode action interval_timer_sum interval_hour interval_min are 0
+    return TIMER_RECORD.pack(idx*16+3, num_timer, 0, 0, 0, 0, 0, 0, 0, 0, 0)
 
-    # filler repeat hour min mode action interval_timer_sum interval_hour interval_min
-    cmd += b'\x00\x00\x00\x00\x00\x00\x00\x00\x00'
 
-    return cmd
 
-   
-
-def _to_byte(value: int):
-    return value.to_bytes(1, byteorder='big')
-
-def _from_iso_weekdays_to_byte(weekdays: List[int]):
-    
+def _iso_weekdays_to_int(weekdays: Iterable[int]) -> int:
+    # bit 0 = Monday, ..., bit 6 = Sunday, 128 = no repeat
     val = 0
-    for day in weekdays:
-        val += 2 ** (day-1)
+    if weekdays:
+        for day in weekdays:
+            val += 1 << (day-1)
 
     if val == 0:
         val = 128
-        
-    return _to_byte(val)
 
-def _from_byte_to_iso_weekdays(val: bytes):
-    weekdays = []
-    if val & 1:  weekdays += [1] # Monday
-    if val & 2:  weekdays += [2] # Tuesday
-    if val & 4:  weekdays += [3] # Wednesday
-    if val & 8:  weekdays += [4] # Thursday
-    if val & 16: weekdays += [5] # Friday
-    if val & 32: weekdays += [6] # Saturday
-    if val & 64: weekdays += [7] # Sunday
-    # if val & 128: no repeat
+    return val
 
-    return weekdays
+# iso weekdays of every repeat byte (the no repeat bit 128 is ignored)
+_ISO_WEEKDAYS = tuple(tuple(day + 1 for day in range(7) if val & (1 << day)) for val in range(256))
 
 class Action(Enum):
     press = 0
@@ -88,8 +129,14 @@ class Mode(Enum):
     standard = 0
     interval = 1 # TODO [nku] not sure, needs to be verified
 
+_MODES = {mode.value: mode for mode in Mode}
+_ACTIONS = {action.value: action for action in Action}
+
+
+class BaseTimer(ABC):
 
-class BaseTimer(ABC):  
+    __slots__ = ('enabled', 'weekdays', 'hour', 'min', 'mode', 'action',
+                 'interval_timer_sum', 'interval_hour', 'interval_min')
 
     def __init__(self, enabled:bool=None, weekdays:List[int]=None, hour:int=None, min:int=None, mode:Mode=None, action:Action=None, interval_timer_sum:int=None, interval_hour:int=None, interval_min:int=None):
         self.enabled = enabled 
@@ -106,50 +153,34 @@ class BaseTimer(ABC):
 
 
     def to_cmd(self, idx: int, num_timer: int):
+        return TIMER_RECORD.pack(*self._fields(idx, num_timer))
+
+    def _fields(self, idx: int, num_timer: int):
+        """the values of the 11 bytes of the timer record"""
 
         if idx < 0 or idx >= num_timer or num_timer > 5:
             raise ValueError("Illegal Argument: Support for max 5 timers and idx must be < num_timer")
 
-        # \x03 for 0'th timer, \x13 for 1st timer, \x23 for 2nd timer
-        cmd = _to_byte(idx*16+3)
-
-        # \x01 for 1 timer, \x02 for 2 timers, ... , \x05 for 5 timers
-        cmd += _to_byte(num_timer)
-
-        # filler
-        cmd += b'\x00'
-
         # byte[0] = No Repeat, byte[1] = Sunday, byte[2] = Saturday, ... byte[7] = Monday
-        repeat = _from_iso_weekdays_to_byte(self.weekdays)
+        repeat = _iso_weekdays_to_int(self.weekdays)
+        mode = self.mode.value if isinstance(self.mode, Mode) else self.mode
+        action = self.action.value
+
         if self.enabled:
-            cmd += repeat
-        else: 
-            cmd += b'\x00'
+            repeat_b = repeat
+        else:
+            repeat_b = 0
+            # if timer is not enabled, store the first 4 bits (no_rep, sun, sat, fri)
+            # of the repeating pattern in the top 4 bits of the mode
+            mode |= repeat & 240
+            # and the last 4 bits (mon, tue, wed, thu) in the top 4 bits of the action
+            action |= (repeat & 15) << 4
 
-        cmd += _to_byte(self.hour)
-        cmd += _to_byte(self.min)
-        
-        mode_b = _to_byte(self.mode.value)
-        if not self.enabled:
-             # if timer is not enabled, store the first 4 bits (no_rep, sun, sat, fri)
-             # of the repeating pattern in the top 4 bits of the action
-            mode_b = _to_byte(ord(mode_b) | (ord(repeat) & 240))
-            
-        cmd += mode_b
-
-        action_b = _to_byte(self.action.value)
-        if not self.enabled:
-            # if timer is not enabled, store the last 4 bits (mon, tue, wed, thu)
-            # of the repeating pattern in the top 4 bits of the action
-            action_b = _to_byte(ord(action_b) | ((ord(repeat) & 15) << 4))
-            
-        cmd += action_b
-
-        cmd += _to_byte(self.interval_timer_sum)
-        cmd += _to_byte(self.interval_hour)
-        cmd += _to_byte(self.interval_min)
-
-        return cmd
+        # \x03 for 0'th timer, \x13 for 1st timer, \x23 for 2nd timer
+        # \x01 for 1 timer, \x02 for 2 timers, ... , \x05 for 5 timers
+        # \x00 filler
+        return (idx*16+3, num_timer, 0, repeat_b, self.hour, self.min, mode, action,
+                self.interval_timer_sum, self.interval_hour, self.interval_min)
 
     def to_dict(self, timer_id=None):
         raise NotImplementedError()
@@ -158,6 +189,8 @@ class BaseTimer(ABC):
 
 class StandardTimer(BaseTimer):
 
+    __slots__ = ()
+
     def __init__(self, enabled: bool, weekdays: List[int], hour: int, min: int, action: Action):
         BaseTimer.__init__(self, mode=Mode.standard, action=action, enabled=enabled, weekdays=weekdays, hour=hour, min=min)
 
@@ -175,6 +208,9 @@ class StandardTimer(BaseTimer):
 
 
 class IntervalTimer(BaseTimer):
+
+    __slots__ = ()
+
     def __init__(self, enabled: bool, mode: Mode, action: Action, timer_sum: int, hour: int, min: int):
         BaseTimer.__init__(self, enabled=enabled, mode=mode, action=action, interval_timer_sum=timer_sum, interval_hour=hour, interval_min=min)
     
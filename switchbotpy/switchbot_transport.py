@@ -0,0 +1,68 @@
+"""
+Transport layer between the Switchbot classes and the BLE stack.
+
+Bot and Scanner talk to an adapter that implements the Transport interface
+(which follows the pygatt backend API) and to the Connection it returns on connect().
+The default transport is the gatttool backend of pygatt, an in-process simulation
+is available in switchbot_sim.
+Errors are reported as pygatt exceptions (pygatt.BLEError, pygatt.exceptions.NotConnectedError).
+"""
+
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List
+from uuid import UUID
+
+import pygatt
+
+
+class Connection(ABC):
+    """a connection to one BLE device"""
+
+    @abstractmethod
+    def subscribe(self, uuid: str, callback: Callable[[int, bytes], None] = None,
+                  indication: bool = False, wait_for_response: bool = True):
+        """enable notifications of the characteristic and register the callback(handle, value)"""
+
+    @abstractmethod
+    def char_write_handle(self, handle: int, value: bytes, wait_for_response: bool = True,
+                          timeout: float = 30):
+        """write the value to the characteristic with the handle"""
+
+    @abstractmethod
+    def disconnect(self):
+        """close the connection"""
+
+
+class Transport(ABC):
+    """a BLE adapter that holds (at most) one connection at a time"""
+
+    @abstractmethod
+    def start(self):
+        """prepare the adapter"""
+
+    @abstractmethod
+    def stop(self):
+        """disconnect any connected device and release the adapter"""
+
+    @abstractmethod
+    def scan(self, timeout: float = 10) -> List[Dict[str, Any]]:
+        """scan for devices, returns a list of dicts with 'address' and 'name'"""
+
+    @abstractmethod
+    def connect(self, address: str, timeout: float = 5,
+                address_type: pygatt.BLEAddressType = pygatt.BLEAddressType.public) -> Connection:
+        """connect to the device with the address"""
+
+    @abstractmethod
+    def discover_characteristics(self, device: Connection) -> Dict[UUID, Any]:
+        """the characteristics of the connected device"""
+
+
+# the pygatt gatttool backend and its devices implement the interfaces
+Transport.register(pygatt.GATTToolBackend)
+Connection.register(pygatt.backends.gatttool.device.GATTToolBLEDevice)
+
+
+def gatttool_transport(hci_device: str = 'hci0') -> Transport:
+    """the default transport: runs gatttool (bluez) on the hci device"""
+    return pygatt.GATTToolBackend(hci_device=hci_device)
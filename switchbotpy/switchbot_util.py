@@ -1,14 +1,16 @@
-import queue
+import logging
+import threading
+import zlib
+from binascii import hexlify
 from enum import Enum
+from typing import Callable
 
-notification_queue = queue.Queue()
+LOG = logging.getLogger('switchbot')
+
+def password_crc(password: str) -> bytes:
+    """crc32 checksum of the password in 4 bytes (as used in the commands of encrypted bots)"""
+    return zlib.crc32(password.encode()).to_bytes(4, 'big')
 
-def handle_notification(handle: int, value: bytes):
-    """
-    handle: integer, characteristic read handle the data was received on
-    value: bytearray, the data returned in the notification
-    """
-    notification_queue.put((handle, value))
 
 class ActionStatus(Enum):
     complete = 1
@@ -48,3 +50,97 @@ class SwitchbotError(Exception):
     def __init__(self, message, switchbot_action_status:ActionStatus=None):
         super().__init__(message)
         self.switchbot_action_status = switchbot_action_status
+
+
+class NotificationTimeout(SwitchbotError):
+    """the ble device did not answer a command with a notification in time"""
+
+
+class WriteError(SwitchbotError):
+    """the communication failed while writing a command (the bot could have executed it)"""
+
+
+class CircuitOpenError(SwitchbotError):
+    """the command was not attempted because the bot failed repeatedly (see CircuitBreaker)"""
+
+
+class NotificationChannel(object):
+    """
+    Routes the notifications of one device connection to the command waiting for them.
+
+    There is at most one outstanding command per connection and every command is answered
+    by exactly one notification. A notification that arrives while no command is waiting
+    (a duplicate or the late reply of a timed out command) is dropped. A request that fails
+    or is interrupted before its reply arrived closes the channel because a late reply could
+    be mistaken for the reply to the next command (the connection should be closed as well).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._waiter = None
+        self._closed = False
+        self.dropped = 0
+
+    def expect(self, callback: Callable[[bytes], None]) -> int:
+        """register the callback for the next notification and return the request sequence number"""
+        with self._lock:
+            if self._closed:
+                raise SwitchbotError(message="connection to ble device closed")
+            if self._waiter is not None:
+                raise ValueError("another command is waiting for a notification")
+            self._seq += 1
+            self._waiter = (self._seq, callback)
+            return self._seq
+
+    def cancel(self, seq: int):
+        """stop waiting for the notification of request seq (e.g. after a timeout)"""
+        with self._lock:
+            if self._waiter is not None and self._waiter[0] == seq:
+                self._waiter = None
+
+    def close(self):
+        """drop all further notifications of the connection"""
+        with self._lock:
+            self._closed = True
+            self._waiter = None
+
+    def request(self, write: Callable[[], None], timeout_sec: float) -> bytes:
+        """write a command and block until its notification arrives"""
+        reply = []
+        received = threading.Event()
+
+        def on_reply(value: bytes):
+            reply.append(value)
+            received.set()
+
+        seq = self.expect(on_reply)
+        try:
+            write()
+            if not received.wait(timeout_sec):
+                raise NotificationTimeout(message="no notification from ble device")
+        finally:
+            self.cancel(seq)
+            if not received.is_set():
+                # failed or interrupted: a late reply must not answer the next request
+                self.close()
+        return reply[0]
+
+    def handle_notification(self, handle: int, value: bytes):
+        """
+        handle: integer, characteristic read handle the data was received on
+        value: bytearray, the data returned in the notification
+        """
+        with self._lock:
+            waiter = self._waiter
+            self._waiter = None
+            if waiter is None:
+                self.dropped += 1
+
+        if waiter is None:
+            LOG.debug("drop unexpected notification: handle: %s value: %s",
+                      str(hex(handle)), str(hexlify(value)))
+            return
+
+        _, callback = waiter
+        callback(bytes(value))
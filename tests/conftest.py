@@ -0,0 +1,21 @@
+"""
+Fixtures of the tests: bots that talk to simulated switchbots (see switchbot_sim),
+run from the root of the repository with: python -m pytest
+"""
+
+import pytest
+
+from switchbotpy import Bot
+from switchbotpy.switchbot_sim import SimulatedSwitchbot, SimulatedTransport
+
+MAC = "AA:BB:CC:DD:EE:FF"
+
+
+@pytest.fixture
+def sim():
+    return SimulatedSwitchbot(mac=MAC, seed=0)
+
+
+@pytest.fixture
+def bot(sim):
+    return Bot(bot_id=0, mac=sim.mac, name="sim", adapter=SimulatedTransport([sim]))
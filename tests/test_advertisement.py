@@ -0,0 +1,130 @@
+"""decoding of the status of bots from their advertisements (see Scanner.scan_status())"""
+
+import time
+
+from switchbotpy import BotStatus, PresenceMonitor, Scanner
+from switchbotpy.switchbot_advertisement import (Advertisement, RecordedAdvertisementSource,
+                                                 decode_advertisement, parse_hci_event)
+from switchbotpy.switchbot_sim import SimulatedTransport
+
+MAC = "AA:BB:CC:DD:EE:01"
+FLAGS = b'\x02\x01\x06'
+
+
+def _bot_data(mode: int, battery: int, uuid: bytes = b'\x00\x0d') -> bytes:
+    """flags and service data of a bot"""
+    return FLAGS + b'\x06\x16' + uuid + bytes((0x48, mode, battery))
+
+
+def _report(mac: str, data: bytes, rssi: int, event_type: int = 0x04) -> bytes:
+    """an advertising report (0x04 = scan response)"""
+    address = bytes(reversed(bytes.fromhex(mac.replace(':', ''))))
+    return (bytes((event_type, 0x01)) + address + bytes((len(data),)) + data +
+            rssi.to_bytes(1, byteorder='big', signed=True))
+
+
+def _event(*reports: bytes) -> list:
+    """the hex bytes of a HCI LE advertising report event (as printed by hcidump --raw)"""
+    payload = bytes((0x02, len(reports))) + b''.join(reports)
+    return ['%02X' % b for b in bytes((0x04, 0x3e, len(payload))) + payload]
+
+
+def _advertisement(mac: str = MAC, mode: int = 0, battery: int = 90, rssi: int = -60,
+                   timestamp: float = None) -> Advertisement:
+    return Advertisement(mac=mac, rssi=rssi, data=_bot_data(mode, battery),
+                         timestamp=time.time() if timestamp is None else timestamp)
+
+
+def test_parse_scan_response():
+    data = _bot_data(mode=0x40, battery=87)
+    advertisements = list(parse_hci_event(_event(_report(MAC, data, rssi=-71)), timestamp=1.0))
+    assert advertisements == [Advertisement(mac=MAC, rssi=-71, data=data, timestamp=1.0)]
+
+
+def test_parse_several_reports():
+    reports = [_report("AA:BB:CC:DD:EE:%02X" % i, _bot_data(0, 50 + i), rssi=-50 - i,
+                       event_type=i % 2 * 4) for i in range(3)]
+    advertisements = list(parse_hci_event(_event(*reports), timestamp=1.0))
+    assert [(a.mac, a.rssi) for a in advertisements] == \
+        [("AA:BB:CC:DD:EE:%02X" % i, -50 - i) for i in range(3)]
+
+
+def test_parse_ignores_other_packets():
+    assert list(parse_hci_event(['04', '0E', '04', '01', '0C', '20', '00'], timestamp=1.0)) == []
+    assert list(parse_hci_event(_event(_report(MAC, FLAGS, rssi=-60))[:-3], timestamp=1.0)) == []
+    assert list(parse_hci_event(['04', 'zz'], timestamp=1.0)) == []
+    assert list(parse_hci_event([], timestamp=1.0)) == []
+
+
+def test_decode_bot_status():
+    standard = decode_advertisement(_advertisement(mode=0x40, battery=0x80 | 87, timestamp=1.0))
+    assert standard == BotStatus(mac=MAC, battery=87, dual_state_mode=False, state=False,
+                                 rssi=-60, last_seen=1.0)
+
+    switched_on = decode_advertisement(_advertisement(mode=0x80, battery=50))
+    assert switched_on.dual_state_mode and switched_on.state
+    switched_off = decode_advertisement(_advertisement(mode=0xc0, battery=50))
+    assert switched_off.dual_state_mode and not switched_off.state
+
+
+def test_decode_other_uuid():
+    advertisement = Advertisement(mac=MAC, rssi=-60, data=_bot_data(0, 42, uuid=b'\x3d\xfd'),
+                                  timestamp=1.0)
+    assert decode_advertisement(advertisement).battery == 42
+
+
+def test_decode_ignores_other_devices():
+    # meter ('T'), no service data, truncated service data
+    meter = FLAGS + b'\x06\x16\x00\x0d' + bytes((0x54, 0, 90))
+    for data in (meter, FLAGS, FLAGS + b'\x04\x16\x00\x0d\x48'):
+        assert decode_advertisement(Advertisement(MAC, -60, data, 1.0)) is None
+
+
+def _scanner(advertisements) -> Scanner:
+    return Scanner(adapter=SimulatedTransport([]),
+                   advertisement_source=RecordedAdvertisementSource(advertisements))
+
+
+def test_scan_status_keeps_latest():
+    other = Advertisement(mac="11:22:33:44:55:66", rssi=-40, data=FLAGS, timestamp=1.0)
+    status = _scanner([_advertisement(battery=90), other, _advertisement(battery=89)]).scan_status()
+    assert list(status) == [MAC]
+    assert status[MAC].battery == 89
+
+
+def test_scan_iter_yields_every_bot_once():
+    macs = ["AA:BB:CC:DD:EE:%02X" % i for i in range(3)]
+    advertisements = [_advertisement(mac=mac) for mac in macs + macs]
+    assert [status.mac for status in _scanner(advertisements).scan_iter()] == macs
+
+
+def test_find_returns_early():
+    consumed = []
+
+    class Source(object):
+        def listen(self, timeout):
+            for i in range(100):
+                consumed.append(i)
+                yield _advertisement(mac="AA:BB:CC:DD:EE:%02X" % (i % 10))
+
+    scanner = Scanner(adapter=SimulatedTransport([]), advertisement_source=Source())
+    found = scanner.find(["aa:bb:cc:dd:ee:01", "AA:BB:CC:DD:EE:03"])
+    assert sorted(found) == ["AA:BB:CC:DD:EE:01", "AA:BB:CC:DD:EE:03"]
+    assert len(consumed) == 4
+
+
+def test_presence_monitor():
+    monitor = PresenceMonitor(RecordedAdvertisementSource([_advertisement()]), expiry_sec=60,
+                              window_sec=0.05)
+    monitor.start()
+    try:
+        deadline = time.time() + 2
+        while MAC not in monitor.present() and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        monitor.stop()
+    assert monitor.present()[MAC].battery == 90
+
+    monitor.update(decode_advertisement(_advertisement(mac="AA:BB:CC:DD:EE:02",
+                                                        timestamp=time.time() - 61)))
+    assert list(monitor.present()) == [MAC]
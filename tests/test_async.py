@@ -0,0 +1,73 @@
+"""asyncio interface (see AsyncBot)"""
+
+import asyncio
+
+from switchbotpy import AsyncBot
+from switchbotpy.switchbot_sim import SimulatedSwitchbot, SimulatedTransport
+
+
+def _run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def test_bot_created_outside_event_loop(sim):
+    # e.g. created at import time, before the loop that runs its commands
+    bot = AsyncBot(bot_id=0, mac=sim.mac, name="sim", adapter=SimulatedTransport([sim]))
+    sim.latency_sec = 0.05
+
+    async def main():
+        return await asyncio.gather(*[bot.get_settings() for _ in range(3)])
+
+    assert [settings['battery'] for settings in _run(main())] == [sim.battery] * 3
+    assert sim.commands == 3
+
+
+def test_bots_run_concurrently():
+    sims = [SimulatedSwitchbot(mac="AA:BB:CC:DD:EE:%02X" % i, battery=10 + i, latency_sec=0.05)
+            for i in range(4)]
+    bots = [AsyncBot(bot_id=i, mac=s.mac, name="sim%d" % i, adapter=SimulatedTransport([s]))
+            for i, s in enumerate(sims)]
+
+    async def main():
+        await asyncio.gather(*[bot.press() for bot in bots])
+        return await asyncio.gather(*[bot.get_settings() for bot in bots])
+
+    assert [settings['battery'] for settings in _run(main())] == [s.battery for s in sims]
+    assert [s.presses for s in sims] == [1] * 4
+
+
+def test_session(sim):
+    bot = AsyncBot(bot_id=0, mac=sim.mac, name="sim", adapter=SimulatedTransport([sim]))
+
+    async def main():
+        async with bot:
+            await bot.set_hold_time(5)
+            assert bot.notification_activated
+            return await bot.get_settings()
+
+    assert _run(main())['hold_seconds'] == 5
+    assert not bot.notification_activated
+
+
+def test_cancelled_command_does_not_answer_next_command(sim):
+    bot = AsyncBot(bot_id=0, mac=sim.mac, name="sim", adapter=SimulatedTransport([sim]))
+    sim.latency_sec = 0.2
+
+    async def main():
+        async with bot:
+            task = asyncio.ensure_future(bot.get_settings())
+            await asyncio.sleep(0.05)
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            # the reply of the settings arrives while waiting for the timer
+            return await bot.get_timer(0)
+
+    assert _run(main()) == (None, 0)
+    assert sim.commands == 2
@@ -0,0 +1,117 @@
+"""read cache of a bot (see Bot.enable_cache())"""
+
+import time
+
+import pytest
+
+from switchbotpy import Action, StandardTimer, SwitchbotError
+
+
+def _timers(n):
+    return [StandardTimer(enabled=True, weekdays=[1 + i], hour=8 + i, min=30, action=Action.press)
+            for i in range(n)]
+
+
+def test_settings_are_read_once(sim, bot):
+    bot.enable_cache()
+    first = bot.get_settings()
+    second = bot.get_settings()
+    assert first == second
+    assert sim.commands == 1
+    assert bot.cache.stats()['hits'] == 1
+
+
+def test_cached_settings_are_copies(sim, bot):
+    bot.enable_cache()
+    bot.get_settings()['battery'] = 0
+    assert bot.get_settings()['battery'] == sim.battery
+
+
+def test_settings_expire(sim, bot):
+    bot.enable_cache(settings_ttl_sec=0.05)
+    bot.get_settings()
+    sim.battery = 50
+    time.sleep(0.1)
+    assert bot.get_settings()['battery'] == 50
+    assert sim.commands == 2
+
+
+def test_writes_update_cached_settings(sim, bot):
+    bot.enable_cache()
+    bot.get_settings()
+    bot.set_hold_time(7)
+    bot.set_mode(dual_state=True, inverse=False)
+    n_commands = sim.commands
+
+    settings = bot.get_settings()
+    assert sim.commands == n_commands
+    assert settings['hold_seconds'] == 7
+    assert settings['dual_state_mode'] and not settings['inverse_direction']
+    assert settings['n_timers'] == 0
+
+
+def test_switch_invalidates_settings(sim, bot):
+    bot.enable_cache()
+    bot.get_settings()
+    bot.switch(True)
+    bot.get_settings()
+    assert sim.commands == 3
+
+
+def test_set_timers_updates_cached_timers(sim, bot):
+    bot.enable_cache()
+    bot.get_settings()
+    bot.set_timers(_timers(2))
+    n_commands = sim.commands
+
+    timers = bot.get_timers()
+    assert [t.to_dict() for t in timers] == [t.to_dict() for t in _timers(2)]
+    assert bot.get_settings()['n_timers'] == 2
+    assert sim.commands == n_commands
+
+
+def test_failed_set_timers_invalidates_timers(sim, bot):
+    bot.enable_cache()
+    bot.set_timers(_timers(2))
+    sim.busy_probability = 1.0
+    with pytest.raises(SwitchbotError):
+        bot.set_timers(_timers(3))
+    sim.busy_probability = 0.0
+
+    n_commands = sim.commands
+    timers = bot.get_timers()
+    assert sim.commands > n_commands
+    assert [t.to_dict() for t in timers] == [t.to_dict() for t in _timers(2)]
+
+
+def test_partial_read_is_not_cached(sim, bot):
+    bot.enable_cache()
+    bot.set_timers(_timers(3))
+    bot.cache.invalidate()
+    assert len(bot.get_timers(n_timers=1)) == 1
+    assert bot.cache.get('timers') is None
+
+
+def test_cached_timers_are_copies(sim, bot):
+    bot.enable_cache()
+    timers = _timers(2)
+    bot.set_timers(timers)
+    timers[0].hour = 20
+    assert bot.get_timers()[0].hour == 8
+
+    read = bot.get_timers()
+    read[0].hour = 9
+    read[1].weekdays.append(7)
+    assert bot.get_timers()[0].hour == 8
+    assert bot.get_timers()[1].weekdays == [2]
+
+
+def test_edit_cached_timers_and_write_back(sim, bot):
+    bot.enable_cache()
+    bot.set_timers(_timers(2))
+    timers = bot.get_timers()
+    timers[0].hour = 9
+    assert bot.sync_timers(timers) == {'written': [0], 'deleted': [], 'unchanged': [1]}
+
+    bot.cache.invalidate()
+    assert [t.hour for t in bot.get_timers()] == [9, 9]
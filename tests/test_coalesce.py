@@ -0,0 +1,67 @@
+"""coalescing of concurrent commands to the same bot (see Bot.enable_coalescing())"""
+
+import threading
+import time
+
+from switchbotpy import Action, StandardTimer
+
+
+def _run(*funcs):
+    threads = [threading.Thread(target=func) for func in funcs]
+    for thread in threads:
+        thread.start()
+        # keep the order of the calls
+        time.sleep(0.02)
+    for thread in threads:
+        thread.join()
+
+
+def test_concurrent_reads_share_a_round_trip(sim, bot):
+    bot.enable_coalescing()
+    sim.latency_sec = 0.3
+    results = []
+    _run(*[lambda: results.append(bot.get_settings())] * 5)
+
+    assert sim.commands == 1
+    assert len(results) == 5 and all(result == results[0] for result in results)
+    assert bot.coalescer.stats()['coalesced_reads'] == 4
+
+
+def test_shared_settings_are_copies(sim, bot):
+    bot.enable_coalescing()
+    sim.latency_sec = 0.2
+    results = []
+    _run(*[lambda: results.append(bot.get_settings())] * 2)
+    results[0]['battery'] = 0
+    assert results[1]['battery'] == sim.battery
+
+
+def test_queued_switches_collapse_to_latest(sim, bot):
+    bot.enable_coalescing()
+    sim.latency_sec = 0.3
+    _run(lambda: bot.switch(True), lambda: bot.switch(False), lambda: bot.switch(True),
+         lambda: bot.switch(False))
+
+    # the first switch runs, the three queued ones are written once with the latest state
+    assert sim.commands == 2
+    assert sim.state is False
+    assert bot.coalescer.stats()['coalesced_writes'] == 2
+
+
+def test_reads_within_a_batch(sim, bot):
+    bot.enable_coalescing()
+    results = bot.batch().get_settings().get_timers().execute()
+    assert all(result.ok for result in results)
+    assert sim.commands == 2
+
+
+def test_shared_timers_are_copies(sim, bot):
+    bot.enable_coalescing()
+    bot.set_timers([StandardTimer(enabled=True, weekdays=[1], hour=8, min=0,
+                                  action=Action.press)])
+    sim.latency_sec = 0.2
+    results = []
+    _run(*[lambda: results.append(bot.get_timers())] * 2)
+    assert bot.coalescer.stats()['coalesced_reads'] == 1
+    results[0][0].hour = 9
+    assert results[1][0].hour == 8
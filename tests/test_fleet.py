@@ -0,0 +1,79 @@
+"""parallel dispatch of commands to many bots (see Fleet)"""
+
+import threading
+
+from switchbotpy import Fleet, SwitchbotError
+from switchbotpy.switchbot_sim import SimulatedSwitchbot, SimulatedTransport
+from switchbotpy.switchbot_util import ActionStatus
+
+
+def _sims(n, **kwargs):
+    return [SimulatedSwitchbot(mac="AA:BB:CC:DD:EE:%02X" % i, battery=10 + i, **kwargs)
+            for i in range(n)]
+
+
+def _fleet(sims, entries=None, **kwargs):
+    if entries is None:
+        entries = [(sim.mac, None) for sim in sims]
+    # one simulated adapter per bot (an adapter holds one connection)
+    return Fleet(entries, adapter_factory=lambda hci_device: SimulatedTransport(sims), **kwargs)
+
+
+def test_results_per_bot():
+    sims = _sims(6, latency_sec=0.02)
+    results = list(_fleet(sims).get_settings())
+
+    assert sorted(result.mac for result in results) == sorted(sim.mac for sim in sims)
+    assert all(result.ok for result in results)
+    assert {result.mac: result.result['battery'] for result in results} == \
+        {sim.mac: sim.battery for sim in sims}
+
+
+def test_errors_per_bot():
+    sims = _sims(3)
+    sims[1].password = b'\x00\x00\x00\x01'
+    sims[2].connect_failure_probability = 1.0
+    results = {result.mac: result for result in _fleet(sims).press()}
+
+    assert results[sims[0].mac].ok and sims[0].presses == 1
+    error = results[sims[1].mac].error
+    assert isinstance(error, SwitchbotError)
+    assert error.switchbot_action_status == ActionStatus.device_encrypted
+    assert isinstance(results[sims[2].mac].error, SwitchbotError)
+    assert sims[1].presses == sims[2].presses == 0
+
+
+def test_password_per_bot():
+    sims = [SimulatedSwitchbot(mac="AA:BB:CC:DD:EE:00", password="secret")]
+    results = list(_fleet(sims, entries=[(sims[0].mac, "secret")]).press())
+    assert results[0].ok and sims[0].presses == 1
+
+
+def _max_concurrency(fleet):
+    lock = threading.Lock()
+    running = [0, 0] # current, max
+
+    def operation(bot):
+        with lock:
+            running[0] += 1
+            running[1] = max(running[1], running[0])
+        try:
+            return bot.get_settings()
+        finally:
+            with lock:
+                running[0] -= 1
+
+    assert all(result.ok for result in fleet.run(operation))
+    return running[1]
+
+
+def test_per_adapter_limit():
+    sims = _sims(8, latency_sec=0.05)
+    assert _max_concurrency(_fleet(sims, max_workers=8, per_adapter_limit=2)) == 2
+    assert _max_concurrency(_fleet(sims, max_workers=8, per_adapter_limit=2,
+                                   hci_devices=['hci0', 'hci1'])) == 4
+
+
+def test_max_workers():
+    sims = _sims(8, latency_sec=0.05)
+    assert _max_concurrency(_fleet(sims, max_workers=3, per_adapter_limit=8)) == 3
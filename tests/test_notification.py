@@ -0,0 +1,74 @@
+"""routing of notifications per connection"""
+
+import threading
+
+import pytest
+
+from switchbotpy import Bot, RetryPolicy
+from switchbotpy.switchbot_sim import SimulatedSwitchbot, SimulatedTransport
+from switchbotpy.switchbot_util import NotificationChannel, NotificationTimeout, SwitchbotError
+
+
+def test_duplicate_notification_is_dropped():
+    channel = NotificationChannel()
+    replies = []
+    channel.expect(replies.append)
+    channel.handle_notification(0x13, b'\x01')
+    channel.handle_notification(0x13, b'\x01')
+    assert replies == [b'\x01']
+    assert channel.dropped == 1
+
+
+def test_late_notification_of_timed_out_request_is_dropped():
+    channel = NotificationChannel()
+    with pytest.raises(NotificationTimeout):
+        channel.request(write=lambda: None, timeout_sec=0.01)
+    channel.handle_notification(0x13, b'\x01')
+    assert channel.dropped == 1
+
+
+def test_closed_channel_drops_notifications():
+    channel = NotificationChannel()
+    channel.close()
+    channel.handle_notification(0x13, b'\x01')
+    assert channel.dropped == 1
+    with pytest.raises(SwitchbotError):
+        channel.expect(lambda value: None)
+
+
+def test_one_outstanding_request_per_channel():
+    channel = NotificationChannel()
+    channel.expect(lambda value: None)
+    with pytest.raises(ValueError):
+        channel.expect(lambda value: None)
+
+
+def test_late_reply_does_not_answer_next_command(sim, bot):
+    bot.enable_retry(RetryPolicy(max_attempts=1, timeout_sec=0.1))
+    sim.latency_sec = 0.3
+    with pytest.raises(NotificationTimeout):
+        bot.press()
+
+    sim.latency_sec = 0.0
+    sim.battery = 42
+    # the late reply of the press (a single status byte) must not be taken for the settings
+    assert bot.get_settings()['battery'] == 42
+
+
+def test_concurrent_bots_receive_their_own_replies():
+    sims = [SimulatedSwitchbot(mac="AA:BB:CC:DD:EE:%02X" % i, battery=10 + i, latency_sec=0.05)
+            for i in range(4)]
+    bots = [Bot(bot_id=i, mac=s.mac, name="sim%d" % i, adapter=SimulatedTransport([s]))
+            for i, s in enumerate(sims)]
+    batteries = {}
+
+    def read(bot):
+        batteries[bot.mac] = [bot.get_settings()['battery'] for _ in range(3)]
+
+    threads = [threading.Thread(target=read, args=(bot,)) for bot in bots]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert batteries == {s.mac: [s.battery] * 3 for s in sims}
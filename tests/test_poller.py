@@ -0,0 +1,125 @@
+"""adaptive polling of many bots (see Poller)"""
+
+import time
+
+import pytest
+
+from switchbotpy import Action, Bot, StandardTimer
+from switchbotpy.switchbot_poller import Change, Poller
+from switchbotpy.switchbot_sim import SimulatedSwitchbot, SimulatedTransport
+
+
+def _poller(bots, **kwargs):
+    kwargs.setdefault('min_interval_sec', 10)
+    kwargs.setdefault('max_interval_sec', 1000)
+    kwargs.setdefault('initial_interval_sec', 100)
+    kwargs.setdefault('growth', 2)
+    kwargs.setdefault('jitter', 0)
+    return Poller(bots, seed=0, **kwargs)
+
+
+def _changes(events):
+    return [event.change for event in events]
+
+
+def test_first_poll_has_no_events(sim, bot):
+    poller = _poller([bot])
+    assert poller.poll(sim.mac) == []
+    assert poller.stats()[sim.mac]['battery'] == sim.battery
+
+
+def test_changes_are_reported(sim, bot):
+    received = []
+    poller = _poller([bot], timers_every=1, on_event=received.append)
+    poller.poll(sim.mac)
+
+    sim.battery -= 10
+    sim.dual_state_mode = True
+    sim.hold_seconds = 5
+    bot.set_timers([StandardTimer(enabled=True, weekdays=[1], hour=8, min=0,
+                                  action=Action.press)])
+    events = poller.poll(sim.mac)
+
+    assert _changes(events) == [Change.battery_dropped, Change.mode_changed,
+                                Change.hold_time_changed, Change.timers_changed]
+    assert (events[0].old, events[0].new) == (sim.battery + 10, sim.battery)
+    assert (events[1].old, events[1].new) == ((False, False), (True, False))
+    assert [len(events[3].old), len(events[3].new)] == [0, 1]
+    assert received == events
+    assert list(poller.events(timeout=0)) == events
+    assert poller.poll(sim.mac) == []
+
+
+def test_interval_adapts_to_changes(sim, bot):
+    poller = _poller([bot])
+    poller.poll(sim.mac)
+    assert poller.stats()[sim.mac]['interval_sec'] == 200
+
+    sim.hold_seconds = 5
+    poller.poll(sim.mac)
+    assert poller.stats()[sim.mac]['interval_sec'] == 100
+
+    # bounded by the max and min interval
+    for _ in range(5):
+        poller.poll(sim.mac)
+    assert poller.stats()[sim.mac]['interval_sec'] == 1000
+    for hold_seconds in range(1, 10):
+        sim.hold_seconds = hold_seconds
+        poller.poll(sim.mac)
+    assert poller.stats()[sim.mac]['interval_sec'] == 10
+
+    stats = poller.stats()[sim.mac]
+    assert stats['polls'] == 16 and stats['changes'] == 10
+    assert stats['next_poll_in_sec'] == pytest.approx(10, abs=0.5)
+
+
+def test_low_battery_is_polled_less_often():
+    sims = [SimulatedSwitchbot(mac="AA:BB:CC:DD:EE:0%d" % i, battery=battery, seed=i)
+            for i, battery in enumerate([100, 10])]
+    bots = [Bot(bot_id=i, mac=sim.mac, name="sim", adapter=SimulatedTransport([sim]))
+            for i, sim in enumerate(sims)]
+    poller = _poller(bots, low_battery=20, low_battery_factor=3)
+    for sim in sims:
+        poller.poll(sim.mac)
+
+    stats = poller.stats()
+    assert stats[sims[0].mac]['interval_sec'] == stats[sims[1].mac]['interval_sec'] == 200
+    assert stats[sims[0].mac]['next_poll_in_sec'] == pytest.approx(200, abs=0.5)
+    assert stats[sims[1].mac]['next_poll_in_sec'] == pytest.approx(600, abs=0.5)
+
+
+def test_unreachable_bot_backs_off(sim, bot):
+    poller = _poller([bot])
+    poller.poll(sim.mac)
+
+    sim.connect_failure_probability = 1.0
+    events = poller.poll(sim.mac)
+    assert _changes(events) == [Change.unreachable]
+    # reported once
+    assert poller.poll(sim.mac) == []
+    stats = poller.stats()[sim.mac]
+    assert stats['interval_sec'] == 800 and stats['failures'] == 2 and not stats['reachable']
+
+    sim.connect_failure_probability = 0.0
+    assert _changes(poller.poll(sim.mac)) == [Change.reachable]
+    stats = poller.stats()[sim.mac]
+    # being reachable again is not a change of the values of the bot
+    assert stats['reachable'] and stats['interval_sec'] == 1000 and stats['changes'] == 0
+
+
+def test_poll_due():
+    sims = [SimulatedSwitchbot(mac="AA:BB:CC:DD:EE:0%d" % i, seed=i) for i in range(3)]
+    bots = [Bot(bot_id=i, mac=sim.mac, name="sim", adapter=SimulatedTransport([sim]))
+            for i, sim in enumerate(sims)]
+    poller = _poller(bots, min_interval_sec=0.01)
+    # the first polls are spread over the minimum interval
+    assert all(stats['next_poll_in_sec'] < 0.01 for stats in poller.stats().values())
+    time.sleep(0.02)
+
+    poller.poll_due()
+    assert [stats['polls'] for stats in poller.stats().values()] == [1, 1, 1]
+    # the next polls are due after the (grown) interval
+    poller.poll_due()
+    assert [stats['polls'] for stats in poller.stats().values()] == [1, 1, 1]
+    # the settings only (bots without timers)
+    assert [sim.commands for sim in sims] == [1, 1, 1]
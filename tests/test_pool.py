@@ -0,0 +1,125 @@
+"""adapter pool shared by bots (see switchbot_pool)"""
+
+import time
+
+import pytest
+
+from switchbotpy import AdapterPool, Bot, RetryPolicy, SwitchbotError
+from switchbotpy.switchbot_sim import SimulatedSwitchbot, SimulatedTransport
+from switchbotpy.switchbot_util import WriteError
+
+MACS = ["AA:BB:CC:DD:EE:0%d" % i for i in range(3)]
+
+
+@pytest.fixture
+def sims():
+    return [SimulatedSwitchbot(mac=mac, seed=i) for i, mac in enumerate(MACS)]
+
+
+def _pool(sims, **kwargs):
+    return AdapterPool(adapter_factory=lambda: SimulatedTransport(sims), **kwargs)
+
+
+def _bots(pool):
+    return [Bot(bot_id=i, mac=mac, name="sim%d" % i, pool=pool) for i, mac in enumerate(MACS)]
+
+
+def _drop_idle_connection(pool, mac):
+    # the bot drops the connection while it is idle in the pool
+    pool._idle[mac].device.disconnect()
+
+
+def test_warm_connection_is_reused(sims):
+    pool = _pool(sims)
+    bot = _bots(pool)[0]
+    bot.get_settings()
+    bot.press()
+    assert pool.stats() == {'hits': 1, 'misses': 1, 'evictions': 0,
+                            'idle': 1, 'leased': 0, 'adapters': 1}
+    assert sims[0].connected
+
+
+def test_number_of_connections_is_capped(sims):
+    pool = _pool(sims, max_connections=2)
+    for bot in _bots(pool):
+        bot.get_settings()
+    stats = pool.stats()
+    assert stats['adapters'] == 2 and stats['idle'] == 2 and stats['evictions'] == 1
+    assert sum(sim.connected for sim in sims) == 2
+
+
+def test_least_recently_used_connection_is_evicted(sims):
+    pool = _pool(sims, max_connections=2)
+    bots = _bots(pool)
+    bots[0].get_settings()
+    bots[1].get_settings()
+    bots[0].get_settings()
+    bots[2].get_settings()
+    assert [sim.connected for sim in sims] == [True, False, True]
+
+    bots[0].get_settings()
+    assert pool.stats()['hits'] == 2
+
+
+def test_failed_connection_is_not_kept(sims):
+    pool = _pool(sims)
+    bot = _bots(pool)[0]
+    bot.enable_retry(RetryPolicy(max_attempts=1, timeout_sec=0.05))
+    sims[0].drop_probability = 1.0
+    with pytest.raises(SwitchbotError):
+        bot.get_settings()
+    stats = pool.stats()
+    assert stats['idle'] == 0 and stats['leased'] == 0
+    assert not sims[0].connected
+
+    sims[0].drop_probability = 0.0
+    bot.get_settings()
+    assert pool.stats()['misses'] == 2
+
+
+def test_expired_connection_is_not_reused(sims):
+    pool = _pool(sims, idle_timeout_sec=0.05)
+    bot = _bots(pool)[0]
+    bot.get_settings()
+    time.sleep(0.1)
+    bot.get_settings()
+    assert pool.stats()['misses'] == 2 and pool.stats()['adapters'] == 1
+
+
+def test_default_idle_timeout_is_finite():
+    assert AdapterPool(adapter_factory=lambda: SimulatedTransport([])).idle_timeout_sec
+
+
+def test_dropped_warm_connection_is_reconnected(sims):
+    pool = _pool(sims)
+    bot = _bots(pool)[0]
+    bot.get_settings()
+    _drop_idle_connection(pool, MACS[0])
+    assert bot.get_settings()['battery'] == sims[0].battery
+    assert pool.stats()['misses'] == 2
+
+
+def test_press_on_dropped_warm_connection_is_not_repeated(sims):
+    pool = _pool(sims)
+    bot = _bots(pool)[0]
+    bot.get_settings()
+    _drop_idle_connection(pool, MACS[0])
+    with pytest.raises(WriteError):
+        bot.press()
+    assert sims[0].presses == 0
+    assert pool.stats()['idle'] == 0
+
+    bot.press()
+    assert sims[0].presses == 1
+
+
+def test_acquire_times_out_when_all_connections_are_leased(sims):
+    pool = _pool(sims, max_connections=1, acquire_timeout_sec=0.1)
+    bots = _bots(pool)
+    bots[0].open()
+    try:
+        with pytest.raises(SwitchbotError):
+            bots[1].get_settings()
+    finally:
+        bots[0].close()
+    bots[1].get_settings()
@@ -0,0 +1,109 @@
+"""priority of the commands of a bot (see Bot.priority())"""
+
+import threading
+import time
+
+from switchbotpy import Action, Priority, StandardTimer
+from switchbotpy.switchbot_priority import PriorityLock
+
+
+def _wait_queued(lock, priority, n=1):
+    while lock.stats()['queue_depth'][priority.name] < n:
+        time.sleep(0.001)
+
+
+def _start(func, *args):
+    thread = threading.Thread(target=func, args=args)
+    thread.start()
+    return thread
+
+
+def test_waiters_are_served_by_priority():
+    lock = PriorityLock()
+    order = []
+
+    def run(name, priority):
+        with lock.priority(priority), lock:
+            order.append(name)
+
+    with lock:
+        threads = []
+        for name, priority in [('background', Priority.background), ('normal', Priority.normal),
+                               ('interactive', Priority.interactive),
+                               ('normal2', Priority.normal)]:
+            threads.append(_start(run, name, priority))
+            _wait_queued(lock, priority, n=2 if name == 'normal2' else 1)
+    for thread in threads:
+        thread.join()
+
+    assert order == ['interactive', 'normal', 'normal2', 'background']
+
+
+def test_yield_keeps_place_in_queue():
+    lock = PriorityLock()
+    order = []
+
+    def run(name, priority):
+        with lock.priority(priority), lock:
+            order.append(name)
+
+    with lock.priority(Priority.background), lock:
+        later = _start(run, 'later background', Priority.background)
+        _wait_queued(lock, Priority.background)
+        assert not lock.preempted()
+        interactive = _start(run, 'interactive', Priority.interactive)
+        _wait_queued(lock, Priority.interactive)
+        assert lock.preempted()
+
+        lock.yield_to_higher_priority()
+        order.append('resumed')
+    later.join()
+    interactive.join()
+
+    assert order == ['interactive', 'resumed', 'later background']
+
+
+def test_interactive_press_preempts_background_reads(sim, bot):
+    timers = [StandardTimer(enabled=True, weekdays=[1], hour=8, min=i, action=Action.press)
+              for i in range(5)]
+    bot.set_timers(timers)
+    sim.latency_sec = 0.1
+    done = {}
+
+    def read():
+        with bot.priority(Priority.background):
+            done['timers'] = bot.get_timers()
+        done['read'] = time.monotonic()
+
+    reader = _start(read)
+    time.sleep(0.15)
+    with bot.priority(Priority.interactive):
+        bot.press()
+    done['press'] = time.monotonic()
+    reader.join()
+
+    assert done['press'] < done['read']
+    assert [t.to_dict() for t in done['timers']] == [t.to_dict() for t in timers]
+
+
+def test_multi_step_writes_are_not_interleaved(sim, bot):
+    sim.latency_sec = 0.05
+    timers = {name: [StandardTimer(enabled=True, weekdays=[day], hour=8, min=i,
+                                   action=Action.press) for i in range(4)]
+              for name, day in [('a', 1), ('b', 2)]}
+
+    def write(name):
+        with bot.priority(Priority.background):
+            bot.set_timers(timers[name])
+
+    writers = [_start(write, 'a')]
+    time.sleep(0.02)
+    writers.append(_start(write, 'b'))
+    _wait_queued(bot._session_lock, Priority.background)
+    with bot.priority(Priority.interactive):
+        bot.press()
+    for writer in writers:
+        writer.join()
+
+    assert sim.presses == 1
+    assert [t.to_dict() for t in bot.get_timers()] == [t.to_dict() for t in timers['b']]
@@ -0,0 +1,148 @@
+"""declarative configuration of many bots (see Reconciler)"""
+
+import pytest
+
+from switchbotpy import Action, Bot, DesiredState, Reconciler, StandardTimer
+from switchbotpy.switchbot import BotSnapshot
+from switchbotpy.switchbot_reconcile import Step, plan_changes
+from switchbotpy.switchbot_sim import SimulatedSwitchbot, SimulatedTransport
+
+# opcodes of get settings and get timer
+READS = {0x02, 0x08}
+
+
+class _RecordingSwitchbot(SimulatedSwitchbot):
+    """records the opcodes of the commands it receives"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.opcodes = []
+
+    def handle_command(self, cmd: bytes):
+        self.opcodes.append(cmd[1] & 0x0f)
+        return super().handle_command(cmd)
+
+
+def _timer(hour):
+    return StandardTimer(enabled=True, weekdays=[1, 2], hour=hour, min=30, action=Action.press)
+
+
+def _snapshot(timers=(), dual_state=False, hold_seconds=0):
+    return BotSnapshot(mac="AA:BB:CC:DD:EE:FF", battery=100, firmware=4.5, n_timers=len(timers),
+                       dual_state_mode=dual_state, inverse_direction=False,
+                       hold_seconds=hold_seconds, timers=list(timers), time=0)
+
+
+def _names(steps):
+    return [step.name for step in steps]
+
+
+def test_plan_without_drift_is_empty():
+    current = _snapshot(timers=[_timer(7)], hold_seconds=5)
+    assert plan_changes(current, DesiredState()) == []
+    assert plan_changes(current, DesiredState(hold_seconds=5, dual_state=False,
+                                              timers=[_timer(7)])) == []
+
+
+def test_plan_mode_change_restores_unmanaged_timers():
+    current = _snapshot(timers=[_timer(7), _timer(8)])
+    steps = plan_changes(current, DesiredState(dual_state=True))
+    assert _names(steps) == ['set_mode', 'sync_timers']
+    assert steps[0].kwargs == {'dual_state': True, 'inverse': False}
+    # set_mode deletes the timers: all of them are written again
+    assert [t.hour for t in steps[1].kwargs['timers']] == [7, 8]
+    assert steps[1].kwargs['current'] == []
+
+
+def test_plan_mode_change_writes_managed_timers():
+    current = _snapshot(timers=[_timer(7), _timer(8)])
+    steps = plan_changes(current, DesiredState(dual_state=True, timers=[_timer(8)]))
+    assert _names(steps) == ['set_mode', 'sync_timers']
+    assert [t.hour for t in steps[1].kwargs['timers']] == [8]
+    assert steps[1].kwargs['current'] == []
+
+
+def test_plan_mode_change_without_timers():
+    assert _names(plan_changes(_snapshot(), DesiredState(dual_state=True))) == ['set_mode']
+
+
+def test_plan_only_changed_settings():
+    current = _snapshot(timers=[_timer(7)], hold_seconds=5)
+    steps = plan_changes(current, DesiredState(hold_seconds=3, timers=[_timer(7), _timer(9)]))
+    assert _names(steps) == ['set_hold_time', 'sync_timers']
+    assert steps[0] == Step('set_hold_time', {'sec': 3})
+    assert [t.hour for t in steps[1].kwargs['current']] == [7]
+
+
+def test_plan_sync_time_after_first_timers():
+    # a bot without timers needs the current time to run the new timers
+    steps = plan_changes(_snapshot(), DesiredState(timers=[_timer(7)]))
+    assert _names(steps) == ['sync_timers', 'sync_time']
+    # the time is only synced on request if the bot already had timers
+    current = _snapshot(timers=[_timer(7)])
+    assert _names(plan_changes(current, DesiredState(timers=[_timer(8)]))) == ['sync_timers']
+    assert _names(plan_changes(current, DesiredState(sync_time=True))) == ['sync_time']
+
+
+@pytest.fixture
+def sims():
+    sims = [_RecordingSwitchbot(mac="AA:BB:CC:DD:EE:%02X" % i, seed=i) for i in range(3)]
+    # bot 1 has a timer that is not managed
+    Bot(bot_id=1, mac=sims[1].mac, name="sim", adapter=SimulatedTransport(sims)).set_timers(
+        [_timer(6)])
+    sims[2].hold_seconds = 3
+    for sim in sims:
+        sim.opcodes.clear()
+    return sims
+
+
+@pytest.fixture
+def reconciler(sims):
+    desired = {sims[0].mac: DesiredState(hold_seconds=5, timers=[_timer(7), _timer(8)]),
+               sims[1].mac: DesiredState(dual_state=True),
+               sims[2].mac: DesiredState(hold_seconds=3)}
+    return Reconciler(desired, max_workers=3,
+                      adapter_factory=lambda hci_device: SimulatedTransport(sims))
+
+
+def _results(results):
+    return {result.mac: result for result in results}
+
+
+def test_dry_run_only_reads(sims, reconciler):
+    results = _results(reconciler.plan())
+    assert all(result.ok and result.results == [] for result in results.values())
+    assert [results[sim.mac].drifted for sim in sims] == [True, True, False]
+    assert _names(results[sims[0].mac].plan) == ['set_hold_time', 'sync_timers', 'sync_time']
+    assert _names(results[sims[1].mac].plan) == ['set_mode', 'sync_timers']
+
+    assert all(set(sim.opcodes) <= READS for sim in sims)
+    assert sims[0].hold_seconds == 0 and sims[0].num_timer == 0
+    assert not sims[1].dual_state_mode
+
+
+def test_apply_writes_the_plan(sims, reconciler):
+    results = _results(reconciler.apply())
+    assert all(result.ok for result in results.values())
+    assert [result.step for result in results[sims[0].mac].results] == \
+        ['set_hold_time', 'sync_timers', 'set_current_timestamp']
+
+    assert sims[0].hold_seconds == 5 and sims[0].num_timer == 2
+    assert sims[0].timestamp is not None
+    # the unmanaged timer survived the mode change
+    assert sims[1].dual_state_mode and sims[1].num_timer == 1
+    bot = Bot(bot_id=1, mac=sims[1].mac, name="sim", adapter=SimulatedTransport(sims))
+    assert [t.hour for t in bot.get_timers()] == [6]
+
+    # nothing is left to do
+    assert not any(result.drifted for result in reconciler.plan())
+
+
+def test_apply_without_drift_only_reads(sims, reconciler):
+    reconciler.apply()
+    for sim in sims:
+        sim.opcodes.clear()
+
+    results = reconciler.apply()
+    assert all(result.ok and not result.drifted and result.results == [] for result in results)
+    assert all(sim.opcodes and set(sim.opcodes) <= READS for sim in sims)
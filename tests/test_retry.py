@@ -0,0 +1,155 @@
+"""retry policy and circuit breaker of a bot (see Bot.enable_retry(), Bot.enable_circuit_breaker())"""
+
+import time
+
+import pygatt
+import pytest
+
+from switchbotpy import (Action, Bot, CircuitBreaker, InMemoryMetrics, RetryPolicy, StandardTimer,
+                         SwitchbotError)
+from switchbotpy.switchbot_sim import SimulatedSwitchbot, SimulatedTransport
+from switchbotpy.switchbot_util import (ActionStatus, CircuitOpenError, NotificationTimeout,
+                                       WriteError)
+
+
+class _FailingWriteSwitchbot(SimulatedSwitchbot):
+    """executes the commands, but the writes fail (e.g. the connection drops before the ack)"""
+
+    def handle_command(self, cmd: bytes):
+        super().handle_command(cmd)
+        raise pygatt.BLEError("simulated write failure")
+
+
+def _failing_write_bot():
+    sim = _FailingWriteSwitchbot(mac="AA:BB:CC:DD:EE:FF", seed=0)
+    return sim, Bot(bot_id=0, mac=sim.mac, name="sim", adapter=SimulatedTransport([sim]))
+
+
+def test_busy_is_retried_until_deadline(sim, bot):
+    bot.enable_retry(RetryPolicy(max_attempts=10, backoff_sec=0.2, jitter=0, deadline_sec=0.5))
+    sim.busy_probability = 1.0
+    with pytest.raises(SwitchbotError) as err:
+        bot.get_settings()
+    assert err.value.switchbot_action_status == ActionStatus.device_busy
+    # backoff 0.2 sec, the next one (0.4 sec) would end after the deadline
+    assert sim.commands == 2
+
+
+def test_busy_is_retried_up_to_max_attempts(sim, bot):
+    bot.enable_retry(RetryPolicy(max_attempts=3, backoff_sec=0.01))
+    sim.busy_probability = 1.0
+    with pytest.raises(SwitchbotError):
+        bot.get_settings()
+    assert sim.commands == 3
+
+
+def test_timeout_of_press_is_not_retried(sim, bot):
+    bot.enable_retry(RetryPolicy(max_attempts=3, timeout_sec=0.1, backoff_sec=0.01))
+    sim.latency_sec = 0.3
+    with pytest.raises(NotificationTimeout):
+        bot.press()
+    assert sim.presses == 1
+
+
+def test_failed_write_of_press_is_not_retried():
+    sim, bot = _failing_write_bot()
+    bot.enable_retry(RetryPolicy(max_attempts=3, backoff_sec=0.01))
+    with pytest.raises(WriteError):
+        bot.press()
+    assert sim.presses == 1
+
+
+def test_failed_write_of_read_is_retried():
+    sim, bot = _failing_write_bot()
+    bot.enable_retry(RetryPolicy(max_attempts=3, backoff_sec=0.01))
+    with pytest.raises(WriteError):
+        bot.get_settings()
+    assert sim.commands == 3
+
+
+def test_connect_failure_of_press_is_retried():
+    # seed 1: the first connect fails, the second succeeds
+    sim = SimulatedSwitchbot(mac="AA:BB:CC:DD:EE:FF", connect_failure_probability=0.5, seed=1)
+    metrics = InMemoryMetrics()
+    bot = Bot(bot_id=0, mac=sim.mac, name="sim", adapter=SimulatedTransport([sim]),
+              metrics=metrics)
+    bot.enable_retry(RetryPolicy(max_attempts=2, backoff_sec=0.01))
+    bot.press()
+    assert sim.presses == 1
+    assert metrics.counter('switchbot_retries_total', labels={'reason': 'connection'}) == 1
+
+
+def test_deadline_does_not_cut_attempt(sim, bot):
+    bot.enable_retry(RetryPolicy(timeout_sec=1, deadline_sec=0.1))
+    sim.latency_sec = 0.3
+    assert bot.get_settings()['battery'] == sim.battery
+
+
+def test_deadline_applies_per_command(sim, bot):
+    bot.enable_retry(RetryPolicy(timeout_sec=1, deadline_sec=1))
+    sim.latency_sec = 0.3
+    # 5 round-trips (clear all timer slots) take longer than the deadline
+    bot.set_timers([])
+
+    batch = bot.batch()
+    for _ in range(4):
+        batch.get_settings()
+    assert all(result.ok for result in batch.execute())
+
+
+def test_batch_failures_open_circuit(sim, bot):
+    bot.enable_retry(RetryPolicy(max_attempts=1, timeout_sec=0.05))
+    bot.enable_circuit_breaker(failure_threshold=3)
+    sim.drop_probability = 1.0
+
+    batch = bot.batch()
+    for _ in range(5):
+        batch.get_settings()
+    errors = [type(result.error) for result in batch.execute(stop_on_error=False)]
+
+    assert errors == [NotificationTimeout] * 3 + [CircuitOpenError] * 2
+    assert bot.circuit_breaker.state == CircuitBreaker.open
+    assert sim.commands == 3
+
+
+def test_illegal_argument_does_not_open_circuit(sim, bot):
+    bot.enable_circuit_breaker(failure_threshold=1)
+    timer = StandardTimer(enabled=True, weekdays=[1], hour=8, min=0, action=Action.press)
+    with pytest.raises(ValueError):
+        bot.set_timers([timer] * 6)
+    assert bot.circuit_breaker.state == CircuitBreaker.closed
+    bot.get_settings()
+
+
+def test_error_status_does_not_open_circuit(sim, bot):
+    bot.enable_circuit_breaker(failure_threshold=1)
+    sim.busy_probability = 1.0
+    with pytest.raises(SwitchbotError):
+        bot.get_settings()
+    assert bot.circuit_breaker.state == CircuitBreaker.closed
+
+
+def test_connect_failures_open_circuit(sim, bot):
+    bot.enable_circuit_breaker(failure_threshold=2)
+    sim.connect_failure_probability = 1.0
+    for _ in range(2):
+        with pytest.raises(SwitchbotError):
+            bot.get_settings()
+    with pytest.raises(CircuitOpenError):
+        bot.get_settings()
+
+
+def test_probe_closes_circuit(sim, bot):
+    bot.enable_retry(RetryPolicy(max_attempts=1, timeout_sec=0.05))
+    bot.enable_circuit_breaker(failure_threshold=1, reset_timeout_sec=0.1)
+    sim.drop_probability = 1.0
+    with pytest.raises(NotificationTimeout):
+        bot.get_settings()
+    with pytest.raises(CircuitOpenError):
+        bot.get_settings()
+
+    sim.drop_probability = 0.0
+    time.sleep(0.15)
+    assert bot.circuit_breaker.state == CircuitBreaker.half_open
+    bot.get_settings()
+    assert bot.circuit_breaker.state == CircuitBreaker.closed
@@ -0,0 +1,100 @@
+"""index of the timers of many bots (see ScheduleIndex)"""
+
+from datetime import datetime
+
+from switchbotpy import Action, Fire, ScheduleIndex, StandardTimer
+from switchbotpy.switchbot_timer import IntervalTimer, Mode
+
+A = "AA:BB:CC:DD:EE:01"
+B = "AA:BB:CC:DD:EE:02"
+
+
+def _t(day, hour, minute=0):
+    """local time in the first week of 2024 (Monday 1 January)"""
+    return datetime(2024, 1, day, hour, minute).timestamp()
+
+
+def _timer(weekdays, hour, minute=0, action=Action.press, enabled=True):
+    return StandardTimer(enabled=enabled, weekdays=list(weekdays), hour=hour, min=minute,
+                         action=action)
+
+
+def _index():
+    index = ScheduleIndex()
+    # A: Monday and Wednesday 08:00 on, Friday 22:30 off
+    index.update(A, [_timer([1, 3], 8, action=Action.turn_on),
+                     _timer([5], 22, 30, action=Action.turn_off)], reference_time=_t(1, 0))
+    # B: every day 07:00 press, one disabled timer
+    index.update(B, [_timer(range(1, 8), 7), _timer([1], 9, enabled=False)],
+                 reference_time=_t(1, 0))
+    return index
+
+
+def test_next_fires():
+    fires = _index().next_fires(after=_t(1, 7, 30), limit=4)
+    assert fires == [Fire(time=_t(1, 8), mac=A, timer_idx=0, action=Action.turn_on),
+                     Fire(time=_t(2, 7), mac=B, timer_idx=0, action=Action.press),
+                     Fire(time=_t(3, 7), mac=B, timer_idx=0, action=Action.press),
+                     Fire(time=_t(3, 8), mac=A, timer_idx=0, action=Action.turn_on)]
+
+
+def test_next_fires_includes_fire_at_time():
+    assert _index().next_fires(after=_t(1, 8), limit=1)[0].time == _t(1, 8)
+
+
+def test_fires_between():
+    fires = _index().fires_between(_t(5, 0), _t(6, 12))
+    assert [(fire.time, fire.mac) for fire in fires] == [
+        (_t(5, 7), B), (_t(5, 22, 30), A), (_t(6, 7), B)]
+
+
+def test_next_fires_wrap_to_next_week():
+    # Sunday evening: the next fires are in the next week
+    fires = _index().next_fires(after=_t(7, 22), limit=2)
+    assert [(fire.time, fire.mac) for fire in fires] == [(_t(8, 7), B), (_t(8, 8), A)]
+
+
+def test_disabled_timers_do_not_fire():
+    index = _index()
+    assert len(index) == 3
+    assert all(fire.timer_idx == 0 for fire in index.fires_between(_t(1, 0), _t(8, 0))
+               if fire.mac == B)
+
+
+def test_timer_without_repeat_fires_once():
+    index = ScheduleIndex()
+    index.update(A, [_timer([], 6)], reference_time=_t(2, 12))
+    # 06:00 has passed at the reference time: the timer fires the next day
+    assert index.fires_between(_t(1, 0), _t(15, 0)) == [
+        Fire(time=_t(3, 6), mac=A, timer_idx=0, action=Action.press)]
+    assert index.next_fires(after=_t(3, 7)) == []
+
+
+def test_interval_timer_fires_from_midnight():
+    index = ScheduleIndex()
+    timer = IntervalTimer(enabled=True, mode=Mode.interval, action=Action.press, timer_sum=0,
+                          hour=8, min=0)
+    index.update(A, [timer], reference_time=_t(1, 0))
+    fires = index.next_fires(after=_t(1, 9), limit=3)
+    assert [fire.time for fire in fires] == [_t(1, 16), _t(2, 0), _t(2, 8)]
+
+
+def test_update_replaces_only_the_timers_of_the_bot():
+    index = _index()
+    index.update(A, [_timer([2], 12)], reference_time=_t(1, 0))
+    fires = index.fires_between(_t(1, 0), _t(3, 0))
+    assert [(fire.time, fire.mac) for fire in fires] == [
+        (_t(1, 7), B), (_t(2, 7), B), (_t(2, 12), A)]
+    assert len(index) == 2
+
+
+def test_remove_only_the_timers_of_the_bot():
+    index = _index()
+    index.remove(B)
+    fires = index.fires_between(_t(1, 0), _t(8, 0))
+    assert {fire.mac for fire in fires} == {A}
+    assert len(fires) == 3 and len(index) == 2
+
+    index.remove(B)
+    index.remove(A)
+    assert len(index) == 0 and index.next_fires(after=_t(1, 0)) == []
@@ -0,0 +1,81 @@
+"""sessions of a bot (see Bot.open(), Bot.close())"""
+
+import time
+
+import pytest
+
+from switchbotpy import Bot, InMemoryMetrics, RetryPolicy, SwitchbotError
+from switchbotpy.switchbot_sim import SimulatedTransport
+
+
+@pytest.fixture
+def metrics():
+    return InMemoryMetrics()
+
+
+@pytest.fixture
+def bot(sim, metrics):
+    return Bot(bot_id=0, mac=sim.mac, name="sim", adapter=SimulatedTransport([sim]),
+               metrics=metrics)
+
+
+def _connects(metrics):
+    return metrics.histogram('switchbot_connect_seconds')['count']
+
+
+def test_command_without_session_disconnects(sim, bot, metrics):
+    bot.get_settings()
+    bot.press()
+    assert _connects(metrics) == 2
+    assert not bot.connected and not sim.connected
+    assert not bot.adapter._running
+
+
+def test_session_keeps_connection(sim, bot, metrics):
+    with bot:
+        bot.get_settings()
+        bot.set_hold_time(3)
+        bot.press()
+        assert bot.connected and sim.connected
+    assert _connects(metrics) == 1
+    assert not bot.connected and not sim.connected
+    assert not bot.adapter._running
+
+
+def test_idle_session_disconnects_and_reconnects(sim, bot, metrics):
+    bot.open(idle_timeout_sec=0.1)
+    try:
+        bot.press()
+        time.sleep(0.25)
+        assert not bot.connected and not sim.connected
+        bot.press()
+        assert bot.connected
+    finally:
+        bot.close()
+    assert _connects(metrics) == 2
+    assert sim.presses == 2
+
+
+def test_failed_open_leaves_no_session(sim, bot):
+    sim.connect_failure_probability = 1.0
+    with pytest.raises(SwitchbotError):
+        with bot:
+            pass
+    sim.connect_failure_probability = 0.0
+
+    bot.press()
+    assert not bot.connected and not sim.connected
+    assert not bot.adapter._running
+
+
+def test_session_reconnects_after_failure(sim, bot, metrics):
+    bot.enable_retry(RetryPolicy(max_attempts=1, timeout_sec=0.05))
+    with bot:
+        sim.drop_probability = 1.0
+        with pytest.raises(SwitchbotError):
+            bot.get_settings()
+        assert not bot.connected
+        sim.drop_probability = 0.0
+        assert bot.get_settings()['battery'] == sim.battery
+        assert bot.connected
+    assert _connects(metrics) == 2
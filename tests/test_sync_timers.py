@@ -0,0 +1,69 @@
+"""diff-based synchronisation of the timers (see Bot.sync_timers())"""
+
+import pytest
+
+from switchbotpy import Action, StandardTimer
+from switchbotpy.switchbot_timer import diff_timers
+
+
+def _timer(hour, enabled=True, weekdays=(1,)):
+    return StandardTimer(enabled=enabled, weekdays=list(weekdays), hour=hour, min=0,
+                         action=Action.press)
+
+
+def test_diff_unchanged():
+    assert diff_timers([_timer(8), _timer(9)], [_timer(8), _timer(9)]) == ([], [], [0, 1])
+
+
+def test_diff_changed_slots():
+    current = [_timer(8), _timer(9), _timer(10)]
+    desired = [_timer(8), _timer(9, enabled=False), _timer(10, weekdays=(1, 2))]
+    assert diff_timers(current, desired) == ([1, 2], [], [0])
+
+
+def test_diff_fewer_and_more_timers():
+    current = [_timer(8), _timer(9), _timer(10)]
+    assert diff_timers(current, current[:1]) == ([], [1, 2], [0])
+    assert diff_timers(current[:1], current) == ([1, 2], [], [0])
+    assert diff_timers(current, []) == ([], [0, 1, 2], [])
+
+
+def test_diff_too_many_timers():
+    with pytest.raises(ValueError):
+        diff_timers([], [_timer(8)] * 6)
+
+
+def test_sync_writes_only_changed_slots(sim, bot):
+    bot.set_timers([_timer(8), _timer(9), _timer(10)])
+    n_commands = sim.commands
+
+    result = bot.sync_timers([_timer(8), _timer(11), _timer(10)])
+    assert result == {'written': [1], 'deleted': [], 'unchanged': [0, 2]}
+    # read the 3 timers, write 1
+    assert sim.commands - n_commands == 4
+    assert [t.hour for t in bot.get_timers()] == [8, 11, 10]
+
+
+def test_sync_without_changes_only_reads(sim, bot):
+    timers = [_timer(8), _timer(9)]
+    bot.set_timers(timers)
+    n_commands = sim.commands
+    assert bot.sync_timers(timers, current=bot.get_timers())['written'] == []
+    assert sim.commands - n_commands == 2
+
+
+def test_sync_fewer_timers_writes_num_timer(sim, bot):
+    bot.set_timers([_timer(8), _timer(9), _timer(10)])
+    result = bot.sync_timers([_timer(8), _timer(9)])
+    assert result == {'written': [], 'deleted': [2], 'unchanged': [0, 1]}
+    # the delete command carries the new number of timers
+    assert sim.num_timer == 2
+    assert bot.get_settings()['n_timers'] == 2
+    assert [t.hour for t in bot.get_timers()] == [8, 9]
+
+
+def test_sync_more_timers_writes_num_timer(sim, bot):
+    bot.set_timers([_timer(8)])
+    assert bot.sync_timers([_timer(8), _timer(9)])['written'] == [1]
+    assert sim.num_timer == 2
+    assert [t.hour for t in bot.get_timers()] == [8, 9]
@@ -0,0 +1,47 @@
+"""timer codec (struct based) compared to the previous byte-by-byte codec"""
+
+import itertools
+
+from benchmarks.bench_timer_codec import all_timers, ref_parse, ref_to_cmd
+from switchbotpy import Action, Mode
+from switchbotpy.switchbot_timer import (TIMER_RECORD, IntervalTimer, decode_timers,
+                                         delete_timer_cmd, encode_timers, parse_timer_cmd)
+
+
+def test_encoding_matches_reference():
+    for timer in all_timers():
+        for num_timer in range(1, 6):
+            for idx in range(num_timer):
+                assert timer.to_cmd(idx=idx, num_timer=num_timer) == \
+                    ref_to_cmd(timer, idx, num_timer), (timer.to_dict(), idx)
+
+
+def test_decoding_matches_reference():
+    for timer in all_timers():
+        cmd = timer.to_cmd(idx=1, num_timer=3)
+        parsed, num_timer = parse_timer_cmd(cmd)
+        ref, ref_num = ref_parse(cmd)
+        assert num_timer == ref_num == 3
+        assert parsed.to_dict() == ref.to_dict() == timer.to_dict()
+
+
+def test_interval_timer_roundtrip():
+    timer = IntervalTimer(enabled=True, mode=Mode.interval, action=Action.turn_on,
+                          timer_sum=3, hour=1, min=30)
+    parsed, _ = parse_timer_cmd(timer.to_cmd(idx=0, num_timer=1))
+    assert parsed.to_dict() == timer.to_dict()
+
+
+def test_empty_slot():
+    assert parse_timer_cmd(delete_timer_cmd(idx=4, num_timer=2)) == (None, 2)
+
+
+def test_bulk_encoding_matches_single_records():
+    timers = list(itertools.islice(all_timers(), 100, 105))
+    for n in range(1, 6):
+        buffer = encode_timers(timers[:n], buffer=bytearray(3 + n * TIMER_RECORD.size), offset=3)
+        assert bytes(buffer[3:]) == b''.join(timer.to_cmd(idx=i, num_timer=n)
+                                             for i, timer in enumerate(timers[:n]))
+        decoded = decode_timers(buffer, offset=3)
+        assert [(t.to_dict(), num) for t, num in decoded] == \
+            [(t.to_dict(), n) for t in timers[:n]]